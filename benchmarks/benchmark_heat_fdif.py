@@ -0,0 +1,132 @@
+"""
+Benchmarks of the heat_fdif solvers across grid sizes and step counts.
+
+Each solver is run on Simulation1D grids of increasing size and the wall
+time, time per step, and peak memory are written to a json file so runs on
+different commits can be compared:
+
+    python benchmarks/benchmark_heat_fdif.py --output before.json
+    python benchmarks/benchmark_heat_fdif.py --output after.json --compare before.json
+"""
+import sys
+import tracemalloc
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import scipy
+from harness import format_result, get_metadata, get_parser, save_results, time_call
+
+# heat_fdif isn't part of the package, it is imported from the homework
+HEAT_FDIF_PATH = Path(__file__).absolute().parent.parent / "homework" / "assignment_1"
+sys.path.insert(0, str(HEAT_FDIF_PATH))
+
+from heat_fdif import (  # noqa: E402
+    Simulation1D,
+    heat_btcs,
+    heat_crank_nicolson,
+    heat_fast_forward,
+    heat_ftcs,
+    make_A,
+)
+
+POINTS = (100, 1_000, 10_000, 100_000)
+STEPS = (100, 1_000)
+# The dense solve allocates points**2 floats so it is only run on small grids.
+MAX_DENSE_POINTS = 2_000
+DT = 0.4
+# The fields which identify a case and the format of a result.
+KEYS = ("solver", "points", "steps")
+TEMPLATE = (
+    "{solver:>15} {points:>7d} points {steps:>6d} steps {wall_time:10.4f} s "
+    "{time_per_step:10.3e} s/step {peak_memory:>12,d} B"
+)
+
+
+def heat_btcs_dense(sim, thermal_conductivity=1.0):
+    """The BTCS scheme with an inverted dense matrix, for reference."""
+    temp_current = sim.get_initial_values()
+    C = thermal_conductivity * sim.dt / sim.dx**2
+    A_inv = np.linalg.inv(make_A(C, sim.x_grid))
+    for step in range(len(sim.t_grid)):
+        sim.maybe_store_results(step, temp_current)
+        temp_current = A_inv @ temp_current
+    return sim.results_
+
+
+SOLVERS = {
+    "ftcs": heat_ftcs,
+    "ftcs_numpy": partial(heat_ftcs, use_numba=False),
+    "btcs": heat_btcs,
+    "crank_nicolson": heat_crank_nicolson,
+    "fast_forward": heat_fast_forward,
+    "btcs_dense": heat_btcs_dense,
+}
+
+
+def gaussian(x):
+    """A gaussian in the middle of x which is zero at the ends."""
+    center, width = x.mean(), (x.max() - x.min()) / 20
+    out = np.exp(-(((x - center) / width) ** 2))
+    out[0], out[-1] = 0, 0
+    return out
+
+
+def make_simulation(points, steps):
+    """Make a simulation with points grid points and steps time steps."""
+    return Simulation1D(
+        x_min=0,
+        x_max=points - 1,
+        dx=1,
+        time_min=0,
+        time_max=DT * (steps - 1),
+        dt=DT,
+        initial_func=gaussian,
+        times_to_save=[0, DT * (steps - 1)],
+    )
+
+
+def run_case(solver, points, steps, repeat=3):
+    """Time one solver on one grid, return a dict of the measurements."""
+    func = SOLVERS[solver]
+    wall_time = time_call(func, repeat, setup=partial(make_simulation, points, steps))
+    # the memory is measured in a separate run since tracing slows it down
+    sim = make_simulation(points, steps)
+    tracemalloc.start()
+    func(sim)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dict(
+        solver=solver,
+        points=points,
+        steps=steps,
+        wall_time=wall_time,
+        time_per_step=wall_time / steps,
+        peak_memory=peak,
+    )
+
+
+def run_benchmarks(solvers, points, steps, repeat=3, verbose=True):
+    """Run all the combinations of solvers, points, and steps."""
+    results = []
+    for solver in solvers:
+        for num_points in points:
+            if solver == "btcs_dense" and num_points > MAX_DENSE_POINTS:
+                continue
+            for num_steps in steps:
+                result = run_case(solver, num_points, num_steps, repeat=repeat)
+                results.append(result)
+                if verbose:
+                    print(format_result(result, TEMPLATE))
+    return dict(metadata=get_metadata([scipy]), results=results)
+
+
+if __name__ == "__main__":
+    parser = get_parser(__doc__.splitlines()[1], "heat_fdif_benchmarks.json")
+    parser.add_argument("--solvers", nargs="+", default=list(SOLVERS))
+    parser.add_argument("--points", nargs="+", type=int, default=POINTS)
+    parser.add_argument("--steps", nargs="+", type=int, default=STEPS)
+    args = parser.parse_args()
+
+    out = run_benchmarks(args.solvers, args.points, args.steps, args.repeat)
+    save_results(out, args, KEYS, TEMPLATE)
@@ -0,0 +1,139 @@
+"""
+Benchmarks of the fullwave readers and writers on synthetic specfem trees.
+
+A synthetic run directory (see synthetic.make_synthetic_tree) is written to
+a temporary directory for each size so no specfem binaries or outputs are
+needed. The results are written to a json file so runs on different
+commits can be compared:
+
+    python benchmarks/benchmark_io.py --output before.json
+    python benchmarks/benchmark_io.py --output after.json --compare before.json
+"""
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import obspy
+from harness import format_result, get_metadata, get_parser, save_results, time_call
+from synthetic import make_synthetic_tree
+
+import fullwave
+from fullwave.core import grid
+from fullwave.interpolate import clear_interpolators
+
+# (n_stations, nx, nz) of the synthetic trees
+SIZES = {
+    "small": (20, 40, 30),
+    "medium": (100, 120, 90),
+    "large": (400, 240, 180),
+}
+# The max number of points passed to the (slow, cubic) grid function.
+MAX_GRID_POINTS = 50_000
+# The fields which identify a case and the format of a result.
+KEYS = ("name", "size")
+TEMPLATE = (
+    "{name:>25} {size:>7} {n_stations:>5d} stations {nspec:>7d} elements "
+    "{wall_time:10.4f} s"
+)
+
+
+def read_traces_loadtxt(paths):
+    """Read traces with one np.loadtxt per file, as read_traces used to."""
+    out = []
+    for path in paths:
+        data = np.loadtxt(path)
+        net, sta, comp, *_ = Path(path).name.split(".")
+        headers = dict(network=net, station=sta, channel=comp, b=data[0, 0])
+        headers["delta"] = data[1, 0] - data[0, 0]
+        out.append(obspy.Trace(data[:, 1], headers))
+    return obspy.Stream(out)
+
+
+def _benchmarks(paths, tmp):
+    """Get {name: callable} of the benchmarks for one synthetic tree."""
+    output, data = paths["output"], paths["data"]
+    st = fullwave.read_traces(output)
+    model = fullwave.read_model(data)
+    x, z, vs = (np.asarray(model[x]) for x in ("x", "z", "vs"))
+    sub = slice(None, None, max(1, len(x) // MAX_GRID_POINTS))
+    out_dir = Path(tmp) / "out"
+    out_dir.mkdir()
+    par_file = Path(tmp) / "Par_file"
+    par_file.write_text(paths["par_file"].read_text())
+    parameters = {"SIMULATION_TYPE": 3, "SAVE_FORWARD": ".false.", "NSTEP": 2000}
+
+    return {
+        "read_trace": lambda: fullwave.read_trace(paths["traces"][0]),
+        "read_traces": lambda: fullwave.read_traces(output),
+        "read_traces_serial": lambda: fullwave.read_traces(output, max_workers=1),
+        "read_traces_processes": lambda: fullwave.read_traces(
+            output, use_processes=True
+        ),
+        "read_traces_loadtxt": lambda: read_traces_loadtxt(paths["traces"]),
+        "save_trace": lambda: fullwave.save_trace(st[0], out_dir / "trace.semd"),
+        "save_traces": lambda: [
+            fullwave.save_trace(tr, out_dir / f"{tr.id}.semd") for tr in st
+        ],
+        "write_adjoint_sources": lambda: fullwave.write_adjoint_sources(
+            st, out_dir / "SEM"
+        ),
+        "specfem_write_parameters": lambda: fullwave.specfem_write_parameters(
+            par_file, parameters
+        ),
+        "read_fortran": lambda: np.array(fullwave.read_fortran(paths["model"][0])),
+        "read_model": lambda: fullwave.read_model(data),
+        "read_kernels": lambda: fullwave.read_kernels(output),
+        "mesh2grid": lambda: (clear_interpolators(), fullwave.mesh2grid(vs, x, z)),
+        "mesh2grid_cached": lambda: fullwave.mesh2grid(vs, x, z),
+        "grid": lambda: grid(x[sub], z[sub], vs[sub]),
+    }
+
+
+def run_benchmarks(sizes, names=None, repeat=3, ascii_kernels=True, verbose=True):
+    """Run the benchmarks on synthetic trees of each size."""
+    results = []
+    for size in sizes:
+        n_stations, nx, nz = SIZES[size]
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            paths = make_synthetic_tree(
+                Path(tmp) / "tree",
+                n_stations=n_stations,
+                nx=nx,
+                nz=nz,
+                ascii_kernels=ascii_kernels,
+            )
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print(f"wrote {size} tree in {elapsed:.2f} s")
+            benchmarks = _benchmarks(paths, tmp)
+            for name in names or benchmarks:
+                wall_time = time_call(benchmarks[name], repeat=repeat)
+                result = dict(
+                    name=name,
+                    size=size,
+                    n_stations=n_stations,
+                    nspec=nx * nz,
+                    wall_time=wall_time,
+                )
+                results.append(result)
+                if verbose:
+                    print(format_result(result, TEMPLATE))
+    return dict(metadata=get_metadata([obspy]), results=results)
+
+
+if __name__ == "__main__":
+    parser = get_parser(__doc__.splitlines()[1], "io_benchmarks.json")
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=SIZES)
+    parser.add_argument("--names", nargs="+", help="the benchmarks to run")
+    parser.add_argument("--binary-kernels", action="store_true")
+    args = parser.parse_args()
+
+    out = run_benchmarks(
+        args.sizes,
+        names=args.names,
+        repeat=args.repeat,
+        ascii_kernels=not args.binary_kernels,
+    )
+    save_results(out, args, KEYS, TEMPLATE)
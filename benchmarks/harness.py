@@ -0,0 +1,111 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Each script turns its measurements into a list of dicts (one per case)
+which is written to a json file with metadata about the commit and machine,
+so runs on different commits can be compared.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+
+def time_call(func, repeat=3, setup=None):
+    """
+    Get the best wall time of repeat calls of func.
+
+    If setup is given it is called (untimed) before each call and its
+    output is passed to func.
+    """
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def get_metadata(modules=()):
+    """
+    Get information about the code and machine the benchmarks ran on.
+
+    Parameters
+    ----------
+    modules
+        Modules whose versions are recorded along with numpy's.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    out = dict(
+        commit=commit,
+        date=datetime.now(timezone.utc).isoformat(),
+        machine=platform.machine(),
+        processor=platform.processor(),
+        python=platform.python_version(),
+        numpy=np.__version__,
+    )
+    out.update({x.__name__: x.__version__ for x in modules})
+    return out
+
+
+def format_result(result, template, reference=None):
+    """
+    Format one result as a line of text, with the ratio to reference.
+
+    Parameters
+    ----------
+    result
+        The dict of one case.
+    template
+        A format string which is filled in with the items of result.
+    reference
+        The result of the same case in an earlier run, if any.
+    """
+    out = template.format(**result)
+    if reference is not None:
+        ratio = result["wall_time"] / reference["wall_time"]
+        out += f" {ratio:6.2f}x time"
+    return out
+
+
+def compare(new, old, keys, template):
+    """Print the results of new with their time relative to old."""
+
+    def get_key(result):
+        return tuple(result[x] for x in keys)
+
+    old_results = {get_key(x): x for x in old["results"]}
+    print(f"compared to {old['metadata'].get('commit')}")
+    for result in new["results"]:
+        print(format_result(result, template, old_results.get(get_key(result))))
+
+
+def get_parser(description, output):
+    """Get a parser with the --output, --repeat and --compare options."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--output", default=output)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", help="a previous output to compare to")
+    return parser
+
+
+def save_results(out, args, keys, template):
+    """Write out to args.output and compare it to args.compare, if given."""
+    Path(args.output).write_text(json.dumps(out, indent=2))
+    if args.compare:
+        compare(out, json.loads(Path(args.compare).read_text()), keys, template)
@@ -0,0 +1,544 @@
+"""
+Synthetic specfem2d run directories for the benchmarks.
+
+The files have the names, formats, and sizes specfem2d writes but their
+contents are made up (a layered model and ricker wavelets), so the readers
+and writers can be exercised without the specfem binaries.
+"""
+from pathlib import Path
+
+import numpy as np
+import obspy
+
+from fullwave import save_trace, write_fortran
+from fullwave.core import P_SV_COMPONENTS
+from fullwave.interpolate import get_gll_points
+
+# The main parameters of a specfem2d Par_file; the tables of models and
+# regions are added when the file is written.
+PAR_FILE_TEMPLATE = """\
+#-----------------------------------------------------------
+#
+# Simulation input parameters
+#
+#-----------------------------------------------------------
+
+# title of job
+title                           = synthetic run
+
+# forward or adjoint simulation
+# 1 = forward, 2 = adjoint, 3 = both simultaneously
+SIMULATION_TYPE                 = 1
+# 0 = regular wave propagation simulation, 1/2/3 = noise simulation
+NOISE_TOMOGRAPHY                = 0
+# save the last frame, needed for adjoint simulation
+SAVE_FORWARD                    = .false.
+
+# parameters concerning partitioning
+NPROC                           = {nproc}              # number of processes
+
+# time step parameters
+# total number of time steps
+NSTEP                           = {nt}
+# duration of a time step (see section "How to choose the time step")
+DT                              = {dt}
+
+# time stepping
+# 1 = Newmark (2nd order), 2 = LDDRK4-6 (4th order), 3 = RK4 (4th order)
+time_stepping_scheme            = 1
+
+# set the type of calculation (P-SV or SH/membrane waves)
+P_SV                            = .true.
+
+# axisymmetric (2.5D) or Cartesian planar (2D) simulation
+AXISYM                          = .false.
+
+#-----------------------------------------------------------
+#
+# Mesh
+#
+#-----------------------------------------------------------
+
+# Partitioning algorithm for decompose_mesh
+PARTITIONING_TYPE               = 3              # SCOTCH = 3, ascending order = 1
+
+# number of control nodes per element (4 or 9)
+NGNOD                           = 4
+
+# creates/reads a binary database that allows to skip all time consuming
+# setup steps in initialization
+setup_with_binary_database      = 0
+
+# available models
+MODEL                           = default
+
+# Output the model with the requested type, does not save if turn to default
+SAVE_MODEL                      = binary
+
+#-----------------------------------------------------------
+#
+# Attenuation
+#
+#-----------------------------------------------------------
+
+# attenuation parameters
+ATTENUATION_VISCOELASTIC        = .false.
+ATTENUATION_VISCOACOUSTIC       = .false.
+
+# number of standard linear solids for attenuation
+N_SLS                           = 3
+
+# reference attenuation frequency, put a negative value if you want SPECFEM
+# to automatically center the frequency band
+ATTENUATION_f0_REFERENCE        = 5.196152422706633
+
+#-----------------------------------------------------------
+#
+# Sources
+#
+#-----------------------------------------------------------
+
+# source parameters
+NSOURCES                        = 1
+force_normal_to_surface         = .false.
+
+# use an existing initial wave field as source or start from zero
+initialfield                    = .false.
+
+#-----------------------------------------------------------
+#
+# Receivers
+#
+#-----------------------------------------------------------
+
+# receiver set parameters for recording stations (i.e. recording points)
+# 1 = displ, 2 = veloc, 3 = accel, 4 = pressure, 5 = curl of displ
+seismotype                      = 1
+
+# interval in time steps for writing of seismograms
+NTSTEP_BETWEEN_OUTPUT_SEISMOS   = {nt}
+
+# set to n to reduce the sampling rate of output seismograms by a factor n
+NTSTEP_BETWEEN_OUTPUT_SAMPLE    = 1
+
+# so far, this option can only be used if all the receivers are in acoustic
+# elements
+USE_TRICK_FOR_BETTER_PRESSURE   = .false.
+
+# use this t0 as earliest starting time rather than the automatically
+# calculated one
+USER_T0                         = 0.0d0
+
+# seismogram formats
+save_ASCII_seismograms          = .true.
+save_binary_seismograms_single  = .true.
+save_binary_seismograms_double  = .false.
+SU_FORMAT                       = .false.
+
+# use an existing STATION file found in ./DATA or create a new one from the
+# receiver positions below in this Par_file
+use_existing_STATIONS           = .true.
+
+# number of receiver sets (i.e. number of receiver lines to create below)
+nreceiversets                   = 1
+
+# orientation
+anglerec                        = 0.d0
+rec_normal_to_surface           = .false.
+
+# first receiver set
+nrec                            = {n_stations}             # number of receivers
+xdeb                            = {xmin}          # first receiver x in meters
+zdeb                            = {zmax}          # first receiver z in meters
+xfin                            = {xmax}          # last receiver x in meters
+zfin                            = {zmax}          # last receiver z in meters
+record_at_surface_same_vertical = .true.
+
+#-----------------------------------------------------------
+#
+# adjoint kernel outputs
+#
+#-----------------------------------------------------------
+
+# save sensitivity kernels in ASCII format (much bigger files, but
+# compatible with current GMT scripts) or in binary format
+save_ASCII_kernels              = {ascii_kernels}
+
+# since the accuracy of kernel integration may not need to respect the CFL,
+# this option permits to save computing time
+NTSTEP_BETWEEN_COMPUTE_KERNELS  = 1
+
+#-----------------------------------------------------------
+#
+# Boundary conditions
+#
+#-----------------------------------------------------------
+
+# Perfectly Matched Layer (PML) boundaries
+PML_BOUNDARY_CONDITIONS         = .false.
+NELEM_PML_THICKNESS             = 3
+
+# Stacey ABC
+STACEY_ABSORBING_CONDITIONS     = .true.
+
+#-----------------------------------------------------------
+#
+# Velocity and density models
+#
+#-----------------------------------------------------------
+
+# number of model materials
+nbmodels                        = {n_models}
+{models}
+#-----------------------------------------------------------
+#
+# PARAMETERS FOR INTERNAL MESHING
+#
+#-----------------------------------------------------------
+
+# use a mesh read from files (.true.) or the internal mesher (.false.)
+read_external_mesh              = .false.
+
+# file containing interfaces for internal mesh
+interfacesfile                  = interfaces.dat
+
+# geometry of the model (origin lower-left corner = 0,0) and mesh description
+xmin                            = {xmin}           # abscissa of left side
+xmax                            = {xmax}        # abscissa of right side
+nx                              = {nx}             # number of elements along X
+
+# absorbing boundary parameters (see absorbing_conditions above)
+absorbbottom                    = .true.
+absorbright                     = .true.
+absorbtop                       = .false.
+absorbleft                      = .true.
+
+# define the different regions of the model in the (nx,nz) spectral-element
+# mesh
+nbregions                       = {n_models}
+{regions}
+#-----------------------------------------------------------
+#
+# Display parameters
+#
+#-----------------------------------------------------------
+
+# interval at which we output time step info and max of norm of displacement
+NTSTEP_BETWEEN_OUTPUT_INFO      = 100
+
+# every how many time steps we draw JPEG or PostScript pictures of the
+# simulation and/or we dump results of the simulation as ASCII or binary
+# files (costly, do not use a very small value)
+NTSTEP_BETWEEN_OUTPUT_IMAGES    = 100
+
+# compute and output acoustic and elastic energy curves (slows down the code
+# significantly)
+OUTPUT_ENERGY                   = .false.
+
+#-----------------------------------------------------------
+#
+# Simultaneous runs
+#
+#-----------------------------------------------------------
+
+NUMBER_OF_SIMULTANEOUS_RUNS     = 1
+BROADCAST_SAME_MESH_AND_MODEL   = .true.
+
+#-----------------------------------------------------------
+#
+# GPU
+#
+#-----------------------------------------------------------
+
+GPU_MODE                        = .false.
+"""
+
+
+def _get_layers(nz, n_layers):
+    """Get the (first, last) element rows (1 based) of each layer."""
+    edges = np.linspace(0, nz, n_layers + 1).astype(int)
+    return [(edges[i] + 1, edges[i + 1]) for i in range(n_layers)]
+
+
+def get_layer_velocities(n_layers):
+    """Get (rho, vp, vs) of the layers, increasing with depth."""
+    vp = np.linspace(3000.0, 5000.0, n_layers)[::-1]
+    return 2700.0 * np.ones(n_layers), vp, vp / np.sqrt(3)
+
+
+def write_par_file(path, nx, nz, nt=1600, dt=1.1e-3, n_stations=20, **kwargs):
+    """
+    Write a specfem2d Par_file for a layered model.
+
+    Parameters
+    ----------
+    path
+        The path of the file.
+    nx
+        The number of elements along x.
+    nz
+        The number of elements along z.
+    nt
+        The number of time steps.
+    dt
+        The time step.
+    n_stations
+        The number of receivers.
+    kwargs
+        Other values of PAR_FILE_TEMPLATE; xmin, xmax, zmax, nproc,
+        n_layers, and ascii_kernels.
+    """
+    values = dict(xmin=0.0, xmax=4000.0, zmax=3000.0, nproc=1, n_layers=4)
+    values.update(ascii_kernels=True)
+    values.update(kwargs)
+    n_layers = values.pop("n_layers")
+    rho, vp, vs = get_layer_velocities(n_layers)
+    models = "".join(
+        f"{num + 1} 1 {rho[num]:.1f}d0 {vp[num]:.1f}d0 {vs[num]:.3f}d0 "
+        "0 0 9999 9999 0 0 0 0 0 0\n"
+        for num in range(n_layers)
+    )
+    regions = "".join(
+        f"1 {nx} {first} {last} {num + 1}\n"
+        for num, (first, last) in enumerate(_get_layers(nz, n_layers))
+    )
+    for key in ("xmin", "xmax", "zmax"):
+        values[key] = f"{values[key]:.1f}d0"
+    values["ascii_kernels"] = ".true." if values["ascii_kernels"] else ".false."
+    text = PAR_FILE_TEMPLATE.format(
+        nt=nt,
+        dt=f"{dt}".replace("e", "d"),
+        n_stations=n_stations,
+        nx=nx,
+        n_models=n_layers,
+        models=models,
+        regions=regions,
+        **values,
+    )
+    path = Path(path)
+    path.write_text(text)
+    return path
+
+
+def write_stations(path, n_stations, xmin=0.0, xmax=4000.0, z=3000.0):
+    """Write a STATIONS file with evenly spaced receivers along a line."""
+    x = np.linspace(xmin, xmax, n_stations + 2)[1:-1]
+    lines = [
+        f"S{num + 1:04d}    AA {x[num]:20.7f} {z:20.7f}       0.0         0.0\n"
+        for num in range(n_stations)
+    ]
+    path = Path(path)
+    path.write_text("".join(lines))
+    return path
+
+
+def make_element_coordinates(nx, nz, ngll=5, xmax=4000.0, zmax=3000.0):
+    """
+    Get the coordinates of the GLL points of a regular mesh.
+
+    The points are in the order of specfem's model files, (NGLLX, NGLLZ,
+    nspec) in Fortran order, with the elements numbered along x first.
+    """
+    gll = (get_gll_points(ngll) + 1) / 2
+    x_el = (np.arange(nx)[:, None] + gll[None, :]) * (xmax / nx)
+    z_el = (np.arange(nz)[:, None] + gll[None, :]) * (zmax / nz)
+    # index (element z, element x, gll z, gll x)
+    x = np.broadcast_to(x_el[None, :, None, :], (nz, nx, ngll, ngll))
+    z = np.broadcast_to(z_el[:, None, :, None], (nz, nx, ngll, ngll))
+    return x.ravel(), z.ravel()
+
+
+def _split_elements(values, nproc, ngll):
+    """Split values of all GLL points into contiguous pieces for each proc."""
+    nspec = len(values) // ngll**2
+    edges = np.linspace(0, nspec, nproc + 1).astype(int) * ngll**2
+    return [values[edges[i] : edges[i + 1]] for i in range(nproc)]
+
+
+def write_model(
+    directory,
+    nx,
+    nz,
+    ngll=5,
+    nproc=1,
+    n_layers=4,
+    dtype="single",
+    xmax=4000.0,
+    zmax=3000.0,
+):
+    """
+    Write the binary model files (proc*_{x,z,vp,vs,rho}.bin) of a mesh.
+
+    Returns the dict of {name: array} for all processors and the paths.
+    """
+    directory = Path(directory)
+    directory.mkdir(exist_ok=True, parents=True)
+    x, z = make_element_coordinates(nx, nz, ngll=ngll, xmax=xmax, zmax=zmax)
+    rho, vp, vs = get_layer_velocities(n_layers)
+    # layers are numbered from the bottom as in the Par_file
+    layer = np.minimum((z / zmax * n_layers).astype(int), n_layers - 1)
+    model = dict(x=x, z=z, vp=vp[layer], vs=vs[layer], rho=rho[layer])
+    paths = []
+    for name, values in model.items():
+        for proc, piece in enumerate(_split_elements(values, nproc, ngll)):
+            path = directory / f"proc{proc:06d}_{name}.bin"
+            paths.append(write_fortran(path, piece, dtype=dtype))
+    return model, paths
+
+
+def get_kernels(model):
+    """Make kernels (smooth blobs) on the points of a model."""
+    x, z = model["x"], model["z"]
+    x0, z0 = x.mean(), z.mean()
+    width = (x.max() - x.min()) / 6
+    blob = np.exp(-((x - x0) ** 2 + (z - z0) ** 2) / width**2)
+    return {"rhop": -1e-9 * blob, "alpha": 2e-9 * blob, "beta": -3e-9 * blob}
+
+
+def write_kernels(directory, model, nproc=1, ngll=5, ascii=True, dtype="single"):
+    """
+    Write the kernels an adjoint run would write for model.
+
+    ASCII kernels go in proc*_rhop_alpha_beta_kernel.dat files (x, z,
+    rhop, alpha, beta columns), binary kernels in proc*_{name}_kernel.bin
+    files with the coordinates in proc*_{x,z}.bin.
+    """
+    directory = Path(directory)
+    directory.mkdir(exist_ok=True, parents=True)
+    kernels = get_kernels(model)
+    paths = []
+    if ascii:
+        columns = np.column_stack([model["x"], model["z"], *kernels.values()])
+        for proc, piece in enumerate(_split_elements(columns, nproc, ngll)):
+            path = directory / f"proc{proc:06d}_rhop_alpha_beta_kernel.dat"
+            np.savetxt(path, piece, fmt="%.7e")
+            paths.append(path)
+        return paths
+    fields = {"x": model["x"], "z": model["z"]}
+    fields.update({f"{name}_kernel": values for name, values in kernels.items()})
+    for name, values in fields.items():
+        for proc, piece in enumerate(_split_elements(values, nproc, ngll)):
+            path = directory / f"proc{proc:06d}_{name}.bin"
+            paths.append(write_fortran(path, piece, dtype=dtype))
+    return paths
+
+
+def ricker(times, f0, t0):
+    """A ricker wavelet with peak frequency f0 centered on t0."""
+    arg = (np.pi * f0 * (times - t0)) ** 2
+    return (1 - 2 * arg) * np.exp(-arg)
+
+
+def write_traces(
+    directory,
+    n_stations,
+    nt=1600,
+    dt=1.1e-3,
+    f0=5.0,
+    components=P_SV_COMPONENTS,
+    band_code="BX",
+):
+    """
+    Write ASCII seismograms (NET.STA.CHAN.semd) with ricker arrivals.
+
+    The traces start at -1.2 / f0 as specfem's do and the arrivals are
+    delayed with the station number.
+    """
+    directory = Path(directory)
+    directory.mkdir(exist_ok=True, parents=True)
+    begin = -1.2 / f0
+    times = begin + np.arange(nt) * dt
+    t_max = times[-1] * 0.8
+    delays = np.linspace(0.1 * t_max, t_max, n_stations)
+    paths = []
+    for num, delay in enumerate(delays):
+        data = 1e-9 * ricker(times, f0, delay)
+        for comp_num, comp in enumerate(components):
+            station, channel = f"S{num + 1:04d}", f"{band_code}{comp}"
+            headers = dict(station=station, channel=channel, delta=dt, b=begin)
+            path = directory / f"AA.{station}.{channel}.semd"
+            save_trace(obspy.Trace(data * (comp_num + 1), headers), path)
+            paths.append(path)
+    return paths
+
+
+def make_synthetic_tree(
+    path,
+    n_stations=20,
+    nt=1600,
+    dt=1.1e-3,
+    nx=80,
+    nz=60,
+    ngll=5,
+    nproc=1,
+    dtype="single",
+    ascii_kernels=True,
+):
+    """
+    Write a synthetic specfem2d run directory.
+
+    The directory has DATA (Par_file, STATIONS, and the model files the
+    solver writes with SAVE_MODEL = binary) and OUTPUT_FILES (seismograms
+    and kernels).
+
+    Parameters
+    ----------
+    path
+        The directory to create.
+    n_stations
+        The number of receivers.
+    nt
+        The number of samples of each seismogram.
+    dt
+        The time step.
+    nx
+        The number of elements along x.
+    nz
+        The number of elements along z, the model has nx * nz elements.
+    ngll
+        The number of GLL points along each side of an element.
+    nproc
+        The number of processors the model and kernel files are split for.
+    dtype
+        The precision of the binary files.
+    ascii_kernels
+        If True, write ASCII kernels, else binary ones.
+
+    Returns
+    -------
+    A dict of the paths of the directories and files written.
+
+    Examples
+    --------
+    >>> paths = make_synthetic_tree("synthetic", n_stations=100, nx=200, nz=150)
+    >>> st = read_traces(paths["output"])
+    >>> kernels = read_kernels(paths["output"])
+    """
+    path = Path(path)
+    data, output = path / "DATA", path / "OUTPUT_FILES"
+    data.mkdir(parents=True, exist_ok=True)
+    output.mkdir(parents=True, exist_ok=True)
+    par_file = write_par_file(
+        data / "Par_file",
+        nx,
+        nz,
+        nt=nt,
+        dt=dt,
+        n_stations=n_stations,
+        nproc=nproc,
+        ascii_kernels=ascii_kernels,
+    )
+    stations = write_stations(data / "STATIONS", n_stations)
+    model, model_paths = write_model(data, nx, nz, ngll, nproc, dtype=dtype)
+    traces = write_traces(output, n_stations, nt=nt, dt=dt)
+    kernels = write_kernels(output, model, nproc, ngll, ascii_kernels, dtype)
+    return dict(
+        path=path,
+        data=data,
+        output=output,
+        par_file=par_file,
+        stations=stations,
+        model=model_paths,
+        traces=traces,
+        kernels=kernels,
+    )
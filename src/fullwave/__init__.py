@@ -1,12 +1,34 @@
 """
 A small package for working with specfem.
 """
+from .cache import MeshCache, get_mesh_hash
 from .core import (
+    ParFile,
+    Runner,
     mesh,
+    read_binary_seismograms,
+    read_stations,
     read_trace,
+    read_traces,
+    run_bin,
     save_trace,
     specfem,
     specfem2D_prep_adjoint,
     specfem2D_prep_save_forward,
     specfem_write_parameters,
+    write_adjoint_sources,
 )
+from .database import read_fortran, read_kernels, read_model, write_fortran
+from .gradient import Gradient, compute_gradient
+from .interpolate import (
+    ElementInterpolator,
+    MeshInterpolator,
+    get_interpolator,
+    mesh2grid,
+)
+from .ledger import RunLedger, RunRecord, parse_solver_log
+from .misfit import WaveformMisfit, waveform_misfit
+from .monitor import SolverDivergedError, SolverMonitor
+from .plotting import BatchRenderer, get_continuous_cmap, render_fields
+from .scheduler import Event, EventResults, EventScheduler
+from .workspace import Workspace
@@ -0,0 +1,215 @@
+"""
+Caching of mesher outputs.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from .workspace import MESH_OUTPUT_PATTERNS, _link_or_copy
+
+# Par_file parameters which don't change the mesher's output.
+NON_MESH_PARAMETERS = frozenset(
+    {
+        "title",
+        "SIMULATION_TYPE",
+        "NOISE_TOMOGRAPHY",
+        "SAVE_FORWARD",
+        "NSTEP",
+        "DT",
+        "time_stepping_scheme",
+        "seismotype",
+        "SU_FORMAT",
+        "SAVE_MODEL",
+        "OUTPUT_ENERGY",
+        "NO_BACKWARD_RECONSTRUCTION",
+        "APPROXIMATE_HESS_KL",
+        "USE_CONSTANT_MAX_AMPLITUDE",
+        "USE_SNAPSHOT_NUMBER_IN_FILENAME",
+    }
+)
+# Parameters with these prefixes only control solver outputs.
+NON_MESH_PREFIXES = ("NTSTEP_BETWEEN_", "output_", "save_")
+# Parameters which point to files read by the mesher.
+MESH_FILE_PARAMETERS = (
+    "interfacesfile",
+    "mesh_file",
+    "nodes_coords_file",
+    "materials_file",
+    "free_surface_file",
+    "axial_elements_file",
+    "absorbing_surface_file",
+    "acoustic_forcing_surface_file",
+    "absorbing_cpml_file",
+    "tangential_detection_curve_file",
+)
+# Files the mesher writes to DATA and the Par_file parameter which makes
+# it write them when false.
+MESH_DATA_OUTPUTS = {"STATIONS": "use_existing_STATIONS"}
+
+
+def _is_mesh_parameter(key):
+    """Return True if the parameter may change the mesh."""
+    return key not in NON_MESH_PARAMETERS and not key.startswith(NON_MESH_PREFIXES)
+
+
+def _get_data_outputs(workspace):
+    """Get the names of the files the mesher writes to DATA of workspace."""
+    par = workspace.par_file
+    return [x for x, key in MESH_DATA_OUTPUTS.items() if par.get(key, True) is False]
+
+
+def _copy(source, destination):
+    """Copy source to a new file at destination, replacing it atomically."""
+    fd, temp = tempfile.mkstemp(dir=destination.parent, prefix=f".{destination.name}.")
+    os.close(fd)
+    try:
+        shutil.copy2(source, temp)
+        os.replace(temp, destination)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
+def _find_input_file(workspace, value):
+    """Find a file referenced by the Par_file, None if it doesnt exist."""
+    for base in (workspace.path, workspace.data_path):
+        path = base / str(value)
+        if path.is_file():
+            return path
+    return None
+
+
+def get_mesh_hash(workspace):
+    """
+    Return a hash of everything in a workspace which affects the mesh.
+
+    This includes the mesh related parameters of the Par_file (including
+    the model and region tables) and the content of the interfaces and
+    external mesh files it references.
+    """
+    par = workspace.par_file
+    hasher = hashlib.sha256()
+    for key, value in par.items():
+        if _is_mesh_parameter(key):
+            hasher.update(f"{key}={value!r}\n".encode())
+    for name in ("nbmodels", "nbregions"):
+        for row in par.get_table(name):
+            hasher.update(f"{name}:{' '.join(row)}\n".encode())
+    for key in MESH_FILE_PARAMETERS:
+        if key not in par:
+            continue
+        # external mesh files are only read when asked for
+        if key != "interfacesfile" and not par.get("read_external_mesh", False):
+            continue
+        path = _find_input_file(workspace, par[key])
+        if path is None:
+            continue
+        hasher.update(f"{key}:".encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2**20), b""):
+                hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class MeshCache:
+    """
+    A content addressed cache of mesher outputs.
+
+    Entries are keyed on get_mesh_hash and hold the database files the
+    mesher writes. On a hit the files are hardlinked into the workspace
+    so the mesher doesn't need to run. When use_existing_STATIONS is
+    false the mesher also writes DATA/STATIONS, which is then stored in
+    the entry's DATA directory and copied back on a hit.
+
+    Parameters
+    ----------
+    path
+        The directory in which the cache is stored.
+    patterns
+        Glob patterns of the mesher outputs in OUTPUT_FILES.
+
+    Examples
+    --------
+    >>> cache = MeshCache("work/mesh_cache")
+    >>> workspace.mesh(cache=cache)
+    """
+
+    def __init__(self, path, patterns=MESH_OUTPUT_PATTERNS):
+        self.path = Path(path).absolute()
+        self.patterns = patterns
+
+    def _get_outputs(self, directory):
+        return [x for pat in self.patterns for x in sorted(directory.glob(pat))]
+
+    def _is_complete(self, key, data_names):
+        """Return True if the entry has the files the mesher wrote to DATA."""
+        return all((self.path / key / "DATA" / x).is_file() for x in data_names)
+
+    def _store_data(self, workspace, entry, data_names):
+        """Copy the files the mesher wrote to DATA into an entry."""
+        if not data_names:
+            return
+        (entry / "DATA").mkdir(exist_ok=True)
+        for name in data_names:
+            _copy(workspace.data_path / name, entry / "DATA" / name)
+
+    def __contains__(self, key):
+        return (self.path / key).is_dir()
+
+    def restore(self, workspace, key=None):
+        """
+        Link the cached outputs into workspace.
+
+        Returns True if the entry was found, else False.
+        """
+        key = key or get_mesh_hash(workspace)
+        data_names = _get_data_outputs(workspace)
+        # entries stored without the DATA files can't be used
+        if key not in self or not self._is_complete(key, data_names):
+            return False
+        workspace.clear_mesh(self.patterns)
+        workspace.output_path.mkdir(exist_ok=True, parents=True)
+        for path in self._get_outputs(self.path / key):
+            _link_or_copy(path, workspace.output_path / path.name)
+        # DATA files may be edited so they are copied rather than linked
+        for name in data_names:
+            _copy(self.path / key / "DATA" / name, workspace.data_path / name)
+        return True
+
+    def store(self, workspace, key=None):
+        """Add the mesher outputs in workspace to the cache."""
+        key = key or get_mesh_hash(workspace)
+        data_names = _get_data_outputs(workspace)
+        if key in self:
+            if not self._is_complete(key, data_names):
+                self._store_data(workspace, self.path / key, data_names)
+            return self.path / key
+        self.path.mkdir(exist_ok=True, parents=True)
+        # build the entry in a temporary directory so a partial entry is
+        # never visible to other processes
+        temp = Path(tempfile.mkdtemp(dir=self.path, prefix=".tmp_"))
+        for path in self._get_outputs(workspace.output_path):
+            _link_or_copy(path, temp / path.name)
+        self._store_data(workspace, temp, data_names)
+        try:
+            os.rename(temp, self.path / key)
+        except OSError:  # another process stored the same entry
+            shutil.rmtree(temp)
+        return self.path / key
+
+    def mesh(self, workspace, check=True, ledger=None):
+        """
+        Restore the mesh of workspace from the cache or run the mesher.
+
+        Returns the mesher's CompletedProcess or None on a cache hit.
+        """
+        key = get_mesh_hash(workspace)
+        if self.restore(workspace, key):
+            return None
+        workspace.clear_mesh(self.patterns)
+        out = workspace.mesh(check=check, ledger=ledger)
+        if out.returncode == 0:
+            self.store(workspace, key)
+        return out
@@ -4,61 +4,585 @@ Core functions for full wave.
 import contextlib
 import os
 import re
+import shlex
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
-from subprocess import run
+from subprocess import STDOUT, CompletedProcess, Popen
 
 import numpy as np
 import obspy
 
+from .ledger import (
+    RunRecord,
+    get_bytes_written,
+    get_ledger,
+    parse_solver_log,
+    scan_outputs,
+)
+from .monitor import SolverDivergedError, kill_run
+
 BASE_PATH = Path(__file__).parent.parent.parent
 BIN_PATH = BASE_PATH / "bin"
+MESHER = "xmeshfem2D"
+SOLVER = "xspecfem2D"
+# Names of the logs written to OUTPUT_FILES by run_bin
+LOG_NAMES = {MESHER: "mesher_log.txt", SOLVER: "solver_log.txt"}
+# The binaries which run on NPROC processes (the specfem2d mesher is serial).
+MPI_BINARIES = (SOLVER,)
+# The command prefix which starts a binary on {nproc} MPI processes; it can
+# be changed (eg to "srun -n {nproc}") with the environment variable.
+MPI_LAUNCHER = "mpirun -np {nproc}"
+MPI_LAUNCHER_ENV_VAR = "FULLWAVE_MPI_LAUNCHER"
+
+# Components written by specfem2d for each type of simulation.
+P_SV_COMPONENTS = ("X", "Z")
+SH_COMPONENTS = ("Y",)
+# Maps binary seismogram precision to the dtype used in the files.
+BINARY_SEISMOGRAM_DTYPES = {"single": np.float32, "double": np.float64}
+# Extensions of the ASCII seismograms for each seismotype (displacement,
+# velocity, acceleration, pressure, curl, and fluid potential).
+SEISMOTYPE_EXTENSIONS = {
+    1: "semd",
+    2: "semv",
+    3: "sema",
+    4: "semp",
+    5: "semc",
+    6: "semp",
+}
 
 
 # Some utility functions (written by Ridvan Orsvuran)
+def _parse_ascii_trace(text):
+    """
+    Parse the text of a two column (time, data) ASCII trace.
+
+    Only the data column and the first two times are converted to floats,
+    which is most of the cost of reading a trace.
+    """
+    words = text.split()
+    if len(words) % 2 or len(words) < 4:
+        raise ValueError("An ASCII trace needs two columns and two samples")
+    begin = float(words[0])
+    return np.array(words[1::2], dtype=np.float64), begin, float(words[2]) - begin
+
+
 def read_trace(filename):
     """Reads an ASCII file and returns a obspy Traces"""
-    data = np.loadtxt(filename)
-    # first column is time, second column is the data
-    times = data[:, 0]
-    disp = data[:, 1]
+    with open(filename, "rb") as f:
+        # first column is time, second column is the data
+        disp, begin, delta = _parse_ascii_trace(f.read())
     # get station name from the filename
-    net, sta, comp, *_ = filename.split("/")[-1].split(".")
-    delta = times[1] - times[0]
+    net, sta, comp, *_ = Path(filename).name.split(".")
     headers = {
         "station": sta,
         "network": net,
         "channel": comp,
         "delta": delta,
-        "b": times[0],
+        "b": begin,
     }
     return obspy.Trace(disp, headers)
 
 
-def save_trace(tr, filename):
-    """Writes out the traces as an ASCII file. Uses b value as the beginning."""
-    data = np.zeros((len(tr.data), 2))
-    data[:, 0] = tr.times() + tr.stats.b
-    data[:, 1] = tr.data
-    np.savetxt(filename, data)
+def read_traces(
+    directory,
+    pattern="*.semd",
+    stations=None,
+    max_workers=None,
+    use_processes=False,
+):
+    """
+    Read all the ASCII traces in a directory into a single stream.
+
+    The files are read concurrently in a thread pool, which overlaps the
+    I/O of the files. Parsing holds the GIL so on fast disks use_processes
+    parses the files in batches in a process pool, one batch per task.
+
+    Parameters
+    ----------
+    directory
+        The directory containing the traces, usually OUTPUT_FILES.
+    pattern
+        A glob pattern used to find the trace files.
+    stations
+        Path to a STATIONS file. If provided, the traces are ordered as
+        the stations in the file, otherwise they are sorted by network,
+        station, and channel.
+    max_workers
+        The maximum number of workers in the pool.
+    use_processes
+        If True, use a process pool rather than a thread pool.
+    """
+    paths = sorted(str(x) for x in Path(directory).glob(pattern))
+    if use_processes:
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, -(-len(paths) // (4 * workers)))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            traces = list(executor.map(read_trace, paths, chunksize=chunksize))
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            traces = list(executor.map(read_trace, paths))
+    if stations is None:
+        traces = sorted(traces, key=lambda x: x.id)
+    else:
+        station_list = read_stations(stations)
+        order = {(net, sta): num for num, (net, sta, *_) in enumerate(station_list)}
+        unknown = len(order)
+
+        def _get_station_order(tr):
+            key = (tr.stats.network, tr.stats.station)
+            return order.get(key, unknown), tr.id
+
+        traces = sorted(traces, key=_get_station_order)
+    return obspy.Stream(traces)
+
+
+def _get_ascii_template(times, fmt="%.18e"):
+    """
+    Make a format string for two column (time, data) ASCII files.
 
+    The time column is formatted once so each trace only needs a single
+    string formatting operation on its data.
+    """
+    return "".join(f"{fmt % time} {fmt}\n" for time in times)
 
-def specfem_write_parameters(filename, parameters, output_file=None):
-    """Write parameters to a specfem config file"""
 
+def save_trace(tr, filename):
+    """Writes out the traces as an ASCII file. Uses b value as the beginning."""
+    template = _get_ascii_template(tr.times() + tr.stats.b)
+    with open(filename, "w") as f:
+        f.write(template % tuple(tr.data.tolist()))
+
+
+def write_adjoint_sources(
+    st,
+    directory="SEM",
+    components=P_SV_COMPONENTS + SH_COMPONENTS,
+    fmt="%.18e",
+    extension="adj",
+):
+    """
+    Write a stream of adjoint sources to the specfem SEM directory.
+
+    All traces must share the same start time, sampling rate, and length so
+    the time column is only formatted once. Components the adjoint solver
+    expects but which are not in the stream are written as zeros.
+
+    Parameters
+    ----------
+    st
+        A stream of adjoint sources, one trace per station and component.
+    directory
+        The directory in which to write the files.
+    components
+        The components which should exist for each station.
+    fmt
+        The format used for each value.
+    extension
+        The file extension.
+
+    Returns
+    -------
+    A list of paths that were written.
+    """
+    if not len(st):
+        return []
+    first = st[0].stats
+    for tr in st:
+        stats = tr.stats
+        if (stats.npts, stats.delta, stats.b) != (first.npts, first.delta, first.b):
+            msg = "All adjoint sources must have the same npts, delta, and b"
+            raise ValueError(msg)
+    directory = Path(directory)
+    directory.mkdir(exist_ok=True, parents=True)
+    template = _get_ascii_template(st[0].times() + first.b, fmt=fmt)
+    zeros = template % ((0.0,) * first.npts)
+    traces = {(tr.stats.network, tr.stats.station, tr.stats.channel): tr for tr in st}
+    # keep the first seen band code for each station
+    stations = {}
+    for net, sta, chan in traces:
+        stations.setdefault((net, sta), chan[:-1])
+    out = []
+    for (net, sta), band in stations.items():
+        for comp in components:
+            channel = f"{band}{comp}"
+            tr = traces.get((net, sta, channel))
+            text = zeros if tr is None else template % tuple(tr.data.tolist())
+            path = directory / f"{net}.{sta}.{channel}.{extension}"
+            with open(path, "w") as f:
+                f.write(text)
+            out.append(path)
+    return out
+
+
+def read_stations(filename):
+    """
+    Read a specfem STATIONS file.
+
+    Returns a list of (network, station, x, z) tuples in the order
+    specfem numbers the receivers.
+    """
+    out = []
     with open(filename) as f:
-        pars = f.read()
+        for line in f:
+            split = line.split()
+            if not split or split[0].startswith("#"):
+                continue
+            sta, net, x, z = split[:4]
+            out.append((net, sta, float(x), float(z)))
+    return out
+
+
+def _find_binary_seismogram_file(directory, component, precision):
+    """Find the binary seismogram file specfem wrote for a component."""
+    # Depending on the specfem2d version the file name may or may not
+    # include the seismotype (eg Ux_file_single.bin or Ux_file_single_d.bin)
+    pattern = f"U{component.lower()}_file_{precision}*.bin"
+    matches = sorted(Path(directory).glob(pattern))
+    if not matches:
+        msg = f"No binary seismogram matching {pattern} in {directory}"
+        raise FileNotFoundError(msg)
+    return matches[0]
+
+
+def read_binary_seismograms(
+    directory,
+    stations=None,
+    components=P_SV_COMPONENTS,
+    precision="single",
+    delta=None,
+    b=0.0,
+    band_code="BX",
+    output="stream",
+):
+    """
+    Read the binary seismograms written by specfem2d.
+
+    Specfem writes one direct-access file per component which contains
+    all the receivers (in STATIONS order) back to back. The files are
+    memory-mapped so nothing is parsed.
+
+    Parameters
+    ----------
+    directory
+        The OUTPUT_FILES directory containing U*_file_*.bin files.
+    stations
+        Path to the STATIONS file used in the run. If None, look in the
+        OUTPUT_FILES directory then in ../DATA.
+    components
+        The components to read, ("X", "Z") for P_SV and ("Y",) for SH.
+    precision
+        Either "single" or "double".
+    delta
+        The sampling interval of the seismograms. The binary files have no
+        time column so this must be provided for the stream output.
+    b
+        The time of the first sample (specfem's -t0).
+    band_code
+        The first two letters of the channel codes.
+    output
+        If "stream" return an obspy Stream, if "array" return a dict of
+        {channel: array} where each array has shape (n_stations, n_samples)
+        and is backed by the memory-mapped file.
+    """
+    directory = Path(directory)
+    if precision not in BINARY_SEISMOGRAM_DTYPES:
+        msg = f"precision must be one of {sorted(BINARY_SEISMOGRAM_DTYPES)}"
+        raise ValueError(msg)
+    if output not in {"stream", "array"}:
+        raise ValueError("output must be either 'stream' or 'array'")
+    if stations is None:
+        candidates = [directory / "STATIONS", directory.parent / "DATA" / "STATIONS"]
+        stations = next((x for x in candidates if x.exists()), candidates[-1])
+    station_list = read_stations(stations)
+    dtype = BINARY_SEISMOGRAM_DTYPES[precision]
+    arrays = {}
+    for comp in components:
+        path = _find_binary_seismogram_file(directory, comp, precision)
+        data = np.memmap(path, dtype=dtype, mode="r")
+        if len(data) % len(station_list):
+            msg = (
+                f"{path} has {len(data)} samples which cant be split evenly "
+                f"among {len(station_list)} stations in {stations}"
+            )
+            raise ValueError(msg)
+        arrays[f"{band_code}{comp}"] = data.reshape(len(station_list), -1)
+    if output == "array":
+        return arrays
+    if delta is None:
+        raise ValueError("delta must be specified to create a stream")
+    traces = []
+    for ind, (net, sta, *_) in enumerate(station_list):
+        for channel, array in arrays.items():
+            headers = {
+                "station": sta,
+                "network": net,
+                "channel": channel,
+                "delta": delta,
+                "b": b,
+            }
+            traces.append(obspy.Trace(array[ind], headers))
+    return obspy.Stream(traces)
+
+
+# Matches key = value lines, value stops at comments.
+_PAR_LINE = re.compile(r"^(?P<key>[^\s=#]+)\s*=\s*(?P<value>[^#]*?)\s*(#.*)?$")
+_INT = re.compile(r"^[+-]?\d+$")
+_FLOAT = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eEdD][+-]?\d+)?$")
+# Keys which are followed by one table row per count.
+_PAR_TABLE_KEYS = ("nbmodels", "nbregions")
+# Position of named values in the rows of isotropic (type 1) models.
+ISOTROPIC_MODEL_FIELDS = {"rho": 2, "vp": 3, "vs": 4, "qkappa": 7, "qmu": 8}
+
+
+def _from_fortran(value):
+    """Convert a string from a specfem parameter file to a python object."""
+    lower = value.lower()
+    if lower in {".true.", ".false."}:
+        return lower == ".true."
+    if _INT.match(value):
+        return int(value)
+    if _FLOAT.match(value):
+        return float(lower.replace("d", "e"))
+    return value
+
+
+def _to_fortran(value):
+    """Convert a python object to a string for a specfem parameter file."""
+    if isinstance(value, (bool, np.bool_)):
+        return ".true." if value else ".false."
+    if isinstance(value, (float, np.floating)):
+        return repr(float(value)).replace("e", "d")
+    return str(value)
+
+
+def _get_umask():
+    """Get the umask of the process."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+class ParFile:
+    """
+    A specfem parameter file which is parsed once.
+
+    The lines are kept as they are in the file and indexed so keys and
+    table rows (models and regions) can be read or changed without
+    re-parsing. Values are converted to/from python types (bool, int,
+    float, str). Keys which appear more than once (eg nrec for several
+    receiver sets) return their first value and are all updated on set.
+
+    Parameters
+    ----------
+    lines
+        The lines of the file, including line endings.
+    path
+        The path the lines were read from, used as the default output.
+
+    Examples
+    --------
+    >>> par = ParFile.read("DATA/Par_file")
+    >>> par.update({"SIMULATION_TYPE": 1, "SAVE_FORWARD": True})
+    >>> par.set_model(1, vs=1820.0)
+    >>> par.write()
+    """
 
-    for varname, value in parameters.items():
-        pat = re.compile(
-            r"(^{varname}\s*=\s*)([^#$\s]+)".format(varname=varname), re.MULTILINE
-        )
-        pars = pat.sub(r"\g<1>{value}".format(value=value), pars)
+    def __init__(self, lines, path=None):
+        self._lines = list(lines)
+        self.path = path
+        self._index()
+
+    @classmethod
+    def read(cls, path):
+        """Read a parameter file."""
+        with open(path) as f:
+            lines = f.readlines()
+        return cls(lines, path=path)
+
+    def _index(self):
+        """Index the keys, value spans, and table rows of the lines."""
+        self._keys = {}
+        self._spans = {}
+        self._tables = {x: [] for x in _PAR_TABLE_KEYS}
+        table = None
+        for num, line in enumerate(self._lines):
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            match = _PAR_LINE.match(line.rstrip("\r\n"))
+            if match:
+                key = match.group("key")
+                self._keys.setdefault(key, []).append(num)
+                self._spans[num] = match.span("value")
+                table = key if key in self._tables else None
+            elif table is not None:
+                self._tables[table].append(num)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __getitem__(self, key):
+        return _from_fortran(self._get_raw(self._lines, key))
+
+    def __setitem__(self, key, value):
+        self._set_raw(self._lines, key, value)
+
+    def _get_raw(self, lines, key):
+        if key not in self._keys:
+            raise KeyError(f"{key} is not in the parameter file")
+        num = self._keys[key][0]
+        start, stop = self._spans[num]
+        return lines[num][start:stop]
+
+    def _set_raw(self, lines, key, value):
+        """Set value of key in lines, which share the index of self._lines."""
+        if key not in self._keys:
+            raise KeyError(f"{key} is not in the parameter file")
+        value = _to_fortran(value)
+        for num in self._keys[key]:
+            start, stop = self._spans[num]
+            line = lines[num]
+            lines[num] = line[:start] + value + line[stop:]
+            # only keep the new spans when editing our own lines
+            if lines is self._lines:
+                self._spans[num] = (start, start + len(value))
+
+    def keys(self):
+        """Return the parameter names in the file."""
+        return list(self._keys)
+
+    def items(self):
+        """Yield (key, value) for every parameter line, in file order."""
+        nums = sorted((num, key) for key, lines in self._keys.items() for num in lines)
+        for num, key in nums:
+            start, stop = self._spans[num]
+            yield key, _from_fortran(self._lines[num][start:stop])
+
+    def get(self, key, default=None):
+        """Get the value of key, or default if it doesnt exist."""
+        return self[key] if key in self else default
+
+    def update(self, parameters):
+        """Set several parameters at once from a dict."""
+        for key, value in parameters.items():
+            self[key] = value
+
+    def get_table(self, name):
+        """Return the rows following a table key (nbmodels or nbregions)."""
+        return [self._lines[num].split() for num in self._tables[name]]
+
+    def set_table(self, name, rows):
+        """
+        Replace the rows following a table key and update its count.
+
+        Each row can either be a string or a sequence of values.
+        """
+        nums = self._tables[name]
+        new = [
+            (x if isinstance(x, str) else " ".join(_to_fortran(y) for y in x))
+            for x in rows
+        ]
+        new = [x.rstrip("\r\n") + "\n" for x in new]
+        for num, line in zip(nums, new):
+            self._lines[num] = line
+        if len(new) == len(nums):
+            return
+        # only the extra (or missing) rows are added (or removed) so the
+        # comments between rows are kept, then re-index
+        if len(new) < len(nums):
+            for num in reversed(nums[len(new) :]):
+                del self._lines[num]
+        else:
+            start = nums[-1] + 1 if nums else self._keys[name][0] + 1
+            self._lines[start:start] = new[len(nums) :]
+        self._index()
+        self[name] = len(new)
+
+    @property
+    def models(self):
+        """The rows of the velocity model table."""
+        return self.get_table("nbmodels")
+
+    @property
+    def regions(self):
+        """The rows of the region table."""
+        return self.get_table("nbregions")
+
+    def set_model(self, number, row=None, **kwargs):
+        """
+        Set the row of model number.
+
+        Either pass the full row or, for isotropic models, the values to
+        change by name (rho, vp, vs, qkappa, qmu).
+        """
+        models = self.models
+        numbers = [int(x[0]) for x in models]
+        if number not in numbers:
+            raise KeyError(f"Model {number} is not in the parameter file")
+        ind = numbers.index(number)
+        if row is not None:
+            models[ind] = row
+        else:
+            values = models[ind]
+            for name, value in kwargs.items():
+                values[ISOTROPIC_MODEL_FIELDS[name.lower()]] = _to_fortran(value)
+        self.set_table("nbmodels", models)
+
+    def copy(self):
+        """Return a copy of the parameter file."""
+        return self.__class__(self._lines, path=self.path)
+
+    def render(self, parameters=None):
+        """
+        Return the text of the file with optional parameters applied.
+
+        The parameter file itself is not changed, so many variants of a
+        template can be rendered cheaply.
+        """
+        lines = self._lines
+        if parameters:
+            lines = list(lines)
+            for key, value in parameters.items():
+                self._set_raw(lines, key, value)
+        return "".join(lines)
+
+    def write(self, path=None, parameters=None):
+        """
+        Write the file, optionally with parameters applied.
+
+        The text is written to a temporary file in the same directory then
+        moved into place so readers never see a partially written file.
+        The file keeps its permissions, new files get the default ones.
+        """
+        path = Path(path or self.path)
+        text = self.render(parameters)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            # mkstemp makes the file readable by its owner only
+            if path.exists():
+                shutil.copymode(path, temp_path)
+            else:
+                os.chmod(temp_path, 0o666 & ~_get_umask())
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+        return path
 
-    if output_file is None:
-        output_file = filename
 
-    with open(output_file, "w") as f:
-        f.write(pars)
+def specfem_write_parameters(filename, parameters, output_file=None):
+    """Write parameters to a specfem config file"""
+    par = ParFile.read(filename)
+    # parameters not in the file are ignored
+    par.update({i: v for i, v in parameters.items() if i in par})
+    par.write(output_file or filename)
 
 
 def specfem2D_prep_save_forward(filename=None):
@@ -111,26 +635,264 @@ def _create_outputs(cwd):
         path.mkdir(exist_ok=True, parents=True)
 
 
-def _call_bin(cwd, name):
+def _call_bin(cwd, name, ledger=None):
     cwd = Path(cwd or Path().cwd()).absolute()
+    output = run_bin(cwd, name, check=False, ledger=ledger)
+    log = Path(output.record.log_path).read_bytes()
+    output.stdout, output.stderr = log, b""
+    print(log.decode("utf-8"))
+    return output
+
+
+def _get_returncode(status):
+    """Convert a wait status to a returncode like subprocess does."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _wait(process, monitor=None):
+    """Wait for a process and return the rusage of it (None if unknown)."""
+    if monitor is not None:
+        # wait without reaping so the monitor can't signal a reused pid
+        if hasattr(os, "waitid"):
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        else:
+            process.wait()
+        monitor.stop()
+    if not hasattr(os, "wait4") or process.returncode is not None:
+        process.wait()
+        return None
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = _get_returncode(status)
+    return usage
+
+
+def get_nproc(cwd):
+    """Get NPROC from the Par_file of the run directory cwd (1 if none)."""
+    path = Path(cwd) / "DATA" / "Par_file"
+    if not path.exists():
+        return 1
+    return int(ParFile.read(path).get("NPROC", 1))
+
+
+def get_command(exe, nproc=1, launcher=None):
+    """
+    Get the command which runs exe on nproc processes.
+
+    With more than one process the command starts with launcher, which
+    defaults to the FULLWAVE_MPI_LAUNCHER environment variable or
+    MPI_LAUNCHER; {nproc} in it is replaced by the number of processes.
+    """
+    if nproc <= 1:
+        return [str(exe)]
+    launcher = launcher or os.environ.get(MPI_LAUNCHER_ENV_VAR) or MPI_LAUNCHER
+    return [*shlex.split(launcher.format(nproc=nproc)), str(exe)]
+
+
+def _make_record(name, cwd, log_path, started, wall_time, returncode, usage):
+    """Make the RunRecord of a finished run."""
+    log = parse_solver_log(log_path)
+    n_steps = log.get("total_steps", log.get("step", (None,))[0])
+    time_per_step = log.get("time_per_step", log.get("mean_time_per_step"))
+    record = RunRecord(
+        name=name,
+        cwd=str(cwd),
+        started=started,
+        wall_time=wall_time,
+        returncode=returncode,
+        n_steps=n_steps,
+        time_per_step=time_per_step,
+        log_path=str(log_path),
+    )
+    if usage is not None:
+        record.user_time = usage.ru_utime
+        record.system_time = usage.ru_stime
+    return record
+
+
+def run_bin(
+    cwd,
+    name,
+    bin_path=None,
+    log_path=None,
+    check=True,
+    ledger=None,
+    monitor=None,
+    nproc=None,
+    launcher=None,
+):
+    """
+    Run a specfem binary in cwd and stream its output to a log file.
+
+    Unlike mesh and specfem this doesn't change the working directory of
+    the python process or hold the output in memory so it is safe to call
+    from several threads at once.
+
+    The solver is started through an MPI launcher (eg mpirun -np NPROC)
+    when NPROC in the Par_file is more than one. The binary runs in its
+    own session so stopping it also stops the processes it started.
+
+    The resource use of the run is measured (wall time, the CPU time of
+    the child process from its rusage, and the bytes written to
+    OUTPUT_FILES) along with the time per step reported in the solver's
+    log. The RunRecord is attached to the output as its record
+    attribute and appended to the ledger.
+
+    Parameters
+    ----------
+    cwd
+        The directory (containing DATA) in which to run the binary.
+    name
+        The name of the binary, eg xmeshfem2D.
+    bin_path
+        The directory containing the binary, defaults to BIN_PATH.
+    log_path
+        The file to which stdout and stderr are written, defaults to
+        OUTPUT_FILES/mesher_log.txt or OUTPUT_FILES/solver_log.txt.
+    check
+        If True, raise a CalledProcessError if the binary fails.
+    ledger
+        A RunLedger (or path to one) in which to record the run. If None,
+        the ledger in the FULLWAVE_LEDGER environment variable is used if
+        it is set.
+    monitor
+        A SolverMonitor which follows the log while the binary runs and
+        kills it if the wavefield blows up; with check a
+        SolverDivergedError is then raised.
+    nproc
+        The number of MPI processes, defaults to NPROC in the Par_file
+        for the binaries in MPI_BINARIES and 1 for the others.
+    launcher
+        The MPI launcher used if nproc is more than one, see get_command.
+    """
+    cwd = Path(cwd).absolute()
     _create_outputs(cwd)
-    with change_dir(cwd):
-        bin_path = BIN_PATH / name
-        assert bin_path.exists()
-        output = run(str(bin_path), shell=True, capture_output=True)
-        print(output.stdout.decode("utf-8"))
-        print(output.stderr.decode("utf-8"))
+    exe = Path(bin_path or BIN_PATH) / name
+    if not exe.exists():
+        raise FileNotFoundError(f"{exe} does not exist")
+    if nproc is None:
+        nproc = get_nproc(cwd) if name in MPI_BINARIES else 1
+    command = get_command(exe, nproc, launcher)
+    if log_path is None:
+        log_path = cwd / "OUTPUT_FILES" / LOG_NAMES.get(name, f"{name}.log")
+    before = scan_outputs(cwd / "OUTPUT_FILES")
+    started = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+    with open(log_path, "wb") as log:
+        process = Popen(
+            command, cwd=cwd, stdout=log, stderr=STDOUT, start_new_session=True
+        )
+        try:
+            if monitor is not None:
+                monitor.start(process, log_path)
+            usage = _wait(process, monitor)
+        except BaseException:
+            if process.poll() is None:
+                kill_run(process.pid)
+            if monitor is not None:
+                monitor.stop()
+            process.wait()
+            raise
+    wall_time = time.perf_counter() - start
+    record = _make_record(
+        name, cwd, log_path, started, wall_time, process.returncode, usage
+    )
+    record.output_bytes = get_bytes_written(before, scan_outputs(cwd / "OUTPUT_FILES"))
+    if monitor is not None:
+        record.aborted = monitor.reason
+    ledger = get_ledger(ledger)
+    if ledger is not None:
+        ledger.append(record)
+    output = CompletedProcess(process.args, process.returncode)
+    output.record = record
+    if check and record.aborted is not None:
+        raise SolverDivergedError(process.returncode, process.args, record.aborted)
+    if check:
+        output.check_returncode()
     return output
 
 
-def mesh(cwd=None):
+class Runner:
+    """
+    Run specfem binaries for many working directories concurrently.
+
+    Each call returns a future so independent simulations can keep every
+    core busy. Use as a context manager to wait for all runs on exit.
+
+    Parameters
+    ----------
+    max_workers
+        The maximum number of binaries to run at once, defaults to the
+        number of cpus.
+    bin_path
+        The directory containing the specfem binaries.
+    ledger
+        A RunLedger (or path to one) in which each run is recorded, see
+        run_bin.
+
+    Examples
+    --------
+    >>> with Runner() as runner:
+    ...     futures = [runner.simulate(path) for path in paths]
+    >>> results = [x.result() for x in futures]
+    """
+
+    def __init__(self, max_workers=None, bin_path=None, ledger=None):
+        self.bin_path = Path(bin_path or BIN_PATH)
+        self.ledger = get_ledger(ledger)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def _run(self, cwd, names, check):
+        return tuple(
+            run_bin(cwd, x, self.bin_path, check=check, ledger=self.ledger)
+            for x in names
+        )
+
+    def _run_one(self, cwd, name, check):
+        return self._executor.submit(
+            run_bin, cwd, name, self.bin_path, None, check, self.ledger
+        )
+
+    def submit(self, cwd, *names, check=True):
+        """
+        Run binaries one after the other in cwd.
+
+        The future's result is a tuple of CompletedProcess, one per name.
+        """
+        return self._executor.submit(self._run, cwd, names, check)
+
+    def mesh(self, cwd, check=True):
+        """Run the mesher, the future's result is a CompletedProcess."""
+        return self._run_one(cwd, MESHER, check)
+
+    def specfem(self, cwd, check=True):
+        """Run the solver, the future's result is a CompletedProcess."""
+        return self._run_one(cwd, SOLVER, check)
+
+    def simulate(self, cwd, check=True):
+        """Run the mesher then the solver in cwd."""
+        return self.submit(cwd, MESHER, SOLVER, check=check)
+
+    def shutdown(self, wait=True):
+        """Shutdown the pool, optionally waiting on running binaries."""
+        self._executor.shutdown(wait=wait)
+
+
+def mesh(cwd=None, ledger=None):
     """Run the mesher."""
-    return _call_bin(cwd, "xmeshfem2D")
+    return _call_bin(cwd, MESHER, ledger=ledger)
 
 
-def specfem(cwd=None):
+def specfem(cwd=None, ledger=None):
     """Run specfem."""
-    return _call_bin(cwd, "xspecfem2D")
+    return _call_bin(cwd, SOLVER, ledger=ledger)
 
 
 if __name__ == "__main__":
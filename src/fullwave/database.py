@@ -0,0 +1,196 @@
+"""
+Readers for specfem model, database and kernel files.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Matches the processor and name of files like proc000000_beta_kernel.bin
+_PROC_FILE = re.compile(r"^proc(?P<proc>\d+)_(?P<name>.+?)(?P<suffix>_kernel)?\.\w+$")
+# Names for the precision of specfem binary files.
+FORTRAN_DTYPES = {"single": np.float32, "double": np.float64}
+# Names of the model files written by the solver with SAVE_MODEL = binary.
+MODEL_NAMES = ("x", "z", "vp", "vs", "rho")
+
+
+def read_fortran(filename, dtype=np.float32):
+    """
+    Memory-map the record of a Fortran unformatted sequential file.
+
+    The record markers at the start and end of the file are validated and
+    the payload is returned as a read-only memmap, so no data are copied.
+
+    Parameters
+    ----------
+    filename
+        The path to the file, eg proc000000_vs.bin.
+    dtype
+        The type of the values, float32 unless specfem was compiled with
+        double precision (float64). Can also be "single" or "double".
+    """
+    dtype = np.dtype(FORTRAN_DTYPES.get(dtype, dtype))
+    size = os.path.getsize(filename)
+    if size < 8:
+        raise ValueError(f"{filename} is too small to be a Fortran record")
+    with open(filename, "rb") as f:
+        head = int(np.fromfile(f, dtype=np.int32, count=1)[0])
+        f.seek(size - 4)
+        tail = int(np.fromfile(f, dtype=np.int32, count=1)[0])
+    if head != size - 8 or tail != head:
+        msg = (
+            f"{filename} is not a single record Fortran file; markers are "
+            f"{head} and {tail} but the payload has {size - 8} bytes"
+        )
+        raise ValueError(msg)
+    if head % dtype.itemsize:
+        msg = f"The record of {filename} is not a multiple of {dtype} values"
+        raise ValueError(msg)
+    count = head // dtype.itemsize
+    return np.memmap(filename, dtype=dtype, mode="r", offset=4, shape=(count,))
+
+
+def write_fortran(filename, array, dtype=np.float32):
+    """
+    Write an array as a single record Fortran unformatted sequential file.
+
+    This is the layout read_fortran expects (and specfem writes for model
+    and kernel files); arrays with more than one dimension are written in
+    Fortran order.
+
+    Parameters
+    ----------
+    filename
+        The path of the file.
+    array
+        The values to write.
+    dtype
+        The type of the values in the file, see read_fortran.
+    """
+    dtype = np.dtype(FORTRAN_DTYPES.get(dtype, dtype))
+    data = np.ravel(np.asarray(array, dtype=dtype), order="F")
+    marker = np.array([data.nbytes], dtype=np.int32)
+    with open(filename, "wb") as f:
+        marker.tofile(f)
+        data.tofile(f)
+        marker.tofile(f)
+    return Path(filename)
+
+
+def _split_proc_files(paths):
+    """Return {name: [paths sorted by processor]} for proc files."""
+    out = {}
+    for path in sorted(paths):
+        match = _PROC_FILE.match(path.name)
+        if match is None:
+            continue
+        out.setdefault(match.group("name"), []).append(path)
+    return out
+
+
+def _read_proc_files(files, dtype, max_workers=None):
+    """
+    Read {name: [paths]} of proc files into {name: array}.
+
+    The pieces of each name are concatenated in a thread pool. If there
+    is only one processor the memmap is returned without a copy.
+    """
+
+    def _assemble(paths):
+        arrays = [read_fortran(x, dtype=dtype) for x in paths]
+        return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        arrays = executor.map(_assemble, files.values())
+        return dict(zip(files, arrays))
+
+
+def read_model(directory, names=MODEL_NAMES, dtype=np.float32, max_workers=None):
+    """
+    Read the binary model files of all processors.
+
+    Parameters
+    ----------
+    directory
+        The directory with the proc*_{name}.bin files (DATA after the
+        solver runs, or OUTPUT_FILES if they were moved).
+    names
+        The names of the model files to read.
+    dtype
+        The precision of the files, see read_fortran.
+    max_workers
+        The number of threads used to concatenate the pieces.
+
+    Returns
+    -------
+    A dict of {name: array} for each name.
+    """
+    directory = Path(directory)
+    files = {x: sorted(directory.glob(f"proc*_{x}.bin")) for x in names}
+    missing = [x for x, paths in files.items() if not paths]
+    if missing:
+        raise FileNotFoundError(f"No model files for {missing} in {directory}")
+    counts = {len(x) for x in files.values()}
+    if len(counts) != 1:
+        msg = f"The number of processor files differs between {names}"
+        raise ValueError(msg)
+    out = _read_proc_files(files, dtype, max_workers)
+    if len({len(x) for x in out.values()}) != 1:
+        raise ValueError(f"Inconsistent mesh dimensions in {directory}")
+    return out
+
+
+def _read_binary_kernels(directory, paths, dtype, max_workers):
+    """Read binary kernel and coordinate files into a dict of arrays."""
+    files = _split_proc_files(Path(directory).glob("proc*_[xz].bin"))
+    files.update(_split_proc_files(paths))
+    return _read_proc_files(files, dtype, max_workers)
+
+
+def _read_ascii_kernels(paths):
+    """Read ASCII kernel files (x, z, kernels...) into a dict of arrays."""
+    out = {}
+    for name, name_paths in _split_proc_files(paths).items():
+        # one np.loadtxt (numpy's C parser) per file is faster than parsing
+        # chunks in a process pool, np.fromstring, or pandas.read_csv
+        data = np.concatenate([np.loadtxt(x, ndmin=2) for x in name_paths])
+        # the name lists the kernels in each column after x and z
+        columns = ["x", "z"] + name.split("_")
+        for num, column in enumerate(columns):
+            out[column] = data[:, num]
+    return out
+
+
+def read_kernels(directory, max_workers=None, dtype=np.float32):
+    """
+    Read the sensitivity kernels written by specfem2d.
+
+    Binary kernels (save_ASCII_kernels = .false.) are memory-mapped and
+    their coordinates come from the proc*_x.bin and proc*_z.bin files
+    (which the solver writes to DATA). Otherwise, the ASCII kernel files
+    are parsed with np.loadtxt. The pieces of each processor are
+    concatenated in processor order.
+
+    Parameters
+    ----------
+    directory
+        The output directory of the adjoint simulation.
+    max_workers
+        The number of threads used to read the binary files.
+    dtype
+        The precision of binary files, see read_fortran.
+
+    Returns
+    -------
+    A dict of {name: array}, eg x, z, rhop, alpha, beta.
+    """
+    directory = Path(directory)
+    binary = sorted(directory.glob("proc*_kernel.bin"))
+    if binary:
+        return _read_binary_kernels(directory, binary, dtype, max_workers)
+    ascii_paths = sorted(directory.glob("proc*_kernel.dat"))
+    if ascii_paths:
+        return _read_ascii_kernels(ascii_paths)
+    raise FileNotFoundError(f"No kernel files found in {directory}")
@@ -0,0 +1,177 @@
+"""
+Forward + adjoint pipeline for computing gradients.
+"""
+import dataclasses
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Dict
+
+import numpy as np
+import obspy
+
+from .core import (
+    SEISMOTYPE_EXTENSIONS,
+    read_traces,
+    specfem2D_prep_adjoint,
+    specfem2D_prep_save_forward,
+    write_adjoint_sources,
+)
+from .database import read_kernels
+from .misfit import waveform_misfit
+from .workspace import FORWARD_WAVEFIELD_PATTERNS
+
+# Names of the output directories kept after each step.
+FORWARD_OUTPUT = "OUTPUT_FILES_FORWARD"
+ADJOINT_OUTPUT = "OUTPUT_FILES_ADJOINT"
+
+
+@dataclasses.dataclass
+class Gradient:
+    """
+    The outputs of a forward + adjoint simulation.
+
+    Parameters
+    ----------
+    misfit
+        The total misfit of the synthetics.
+    kernels
+        A dict of kernel name to array, includes the x and z coordinates.
+    synthetic
+        The synthetics of the forward simulation.
+    adjoint
+        The adjoint sources used in the adjoint simulation.
+    """
+
+    misfit: float
+    kernels: Dict[str, np.ndarray]
+    synthetic: obspy.Stream
+    adjoint: obspy.Stream
+
+
+def _move(source, destination, patterns):
+    """Move the files matching patterns in source to destination."""
+    for pattern in patterns:
+        for path in Path(source).glob(pattern):
+            os.replace(path, Path(destination) / path.name)
+
+
+def _scan_bin(directory):
+    """Get {path: (size, mtime_ns)} of the binary files in directory."""
+    out = {}
+    for path in Path(directory).glob("*.bin"):
+        stat = path.stat()
+        out[path] = (stat.st_size, stat.st_mtime_ns)
+    return out
+
+
+def _collect_solver_files(data_path, destination, before):
+    """
+    Move the binary files the solver wrote to DATA into destination.
+
+    Files which were in DATA before the run (before is a _scan_bin) are
+    model inputs, eg with MODEL = gll, so they are kept and only copied
+    if the solver rewrote them. Workspace.specfem copies the model files
+    before running so a rewrite doesn't reach the original DATA.
+    """
+    for path, stat in _scan_bin(data_path).items():
+        new = Path(destination) / path.name
+        if path not in before:
+            os.replace(path, new)
+        elif before[path] != stat:
+            shutil.copy2(path, new)
+
+
+def _get_trace_pattern(par):
+    """Get the glob pattern of the seismograms of the (first) seismotype."""
+    seismotype = int(str(par.get("seismotype", 1)).split(",")[0])
+    return f"*.{SEISMOTYPE_EXTENSIONS[seismotype]}"
+
+
+def _replace_dir(source, destination):
+    """Rename source to destination, removing destination if it exists."""
+    if destination.exists():
+        shutil.rmtree(destination)
+    os.replace(source, destination)
+
+
+def compute_gradient(
+    workspace,
+    observed,
+    misfit: Callable = waveform_misfit,
+    cache=None,
+    kernel_reader: Callable = read_kernels,
+    check=True,
+    ledger=None,
+    monitor=None,
+) -> Gradient:
+    """
+    Run the forward and adjoint simulations of a workspace.
+
+    The steps are:
+        1. Prepare the Par_file to save the forward wavefield, mesh and
+           run the solver. The model files in DATA, which the solver may
+           rewrite, are copied rather than shared with the original DATA.
+        2. Move the model files the solver wrote to DATA (model inputs,
+           eg for MODEL = gll, stay in DATA) to the forward outputs,
+           which are then renamed to OUTPUT_FILES_FORWARD.
+        3. Read the synthetics of the Par_file's seismotype, calculate
+           the misfit and write the adjoint sources to SEM.
+        4. Prepare the Par_file for the adjoint run, move (not copy) the
+           mesh databases and saved forward wavefield into a new
+           OUTPUT_FILES and run the solver without re-meshing.
+        5. Read the kernels and rename the outputs to OUTPUT_FILES_ADJOINT.
+
+    Parameters
+    ----------
+    workspace
+        The Workspace in which to run the simulations.
+    observed
+        A stream of observed data.
+    misfit
+        A callable which takes (observed, synthetic) streams and returns
+        the misfit and a stream of adjoint sources.
+    cache
+        A MeshCache used for the forward mesher run.
+    kernel_reader
+        A callable which takes the adjoint output directory and returns a
+        dict of kernel arrays.
+    check
+        If True, raise if one of the binaries fails.
+    ledger
+        A RunLedger in which the runs are recorded, see run_bin.
+    monitor
+        A SolverMonitor used for both solver runs.
+    """
+    ws = workspace
+    forward_path = ws.path / FORWARD_OUTPUT
+    adjoint_path = ws.path / ADJOINT_OUTPUT
+    # forward simulation
+    ws.clear_outputs()
+    specfem2D_prep_save_forward(ws.par_file_path)
+    ws.mesh(check=check, cache=cache, ledger=ledger)
+    before = _scan_bin(ws.data_path)
+    ws.specfem(check=check, ledger=ledger, monitor=monitor)
+    _collect_solver_files(ws.data_path, ws.output_path, before)
+    _replace_dir(ws.output_path, forward_path)
+    # misfit and adjoint sources
+    synthetic = read_traces(
+        forward_path,
+        pattern=_get_trace_pattern(ws.par_file),
+        stations=ws.data_path / "STATIONS",
+    )
+    total_misfit, adjoint = misfit(observed, synthetic)
+    if ws.sem_path.exists():
+        shutil.rmtree(ws.sem_path)
+    write_adjoint_sources(adjoint, ws.sem_path)
+    # adjoint simulation, the mesh doesn't change so it is reused
+    specfem2D_prep_adjoint(ws.par_file_path)
+    ws.output_path.mkdir()
+    patterns = ("Database*.bin",) + FORWARD_WAVEFIELD_PATTERNS
+    _move(forward_path, ws.output_path, patterns)
+    before = _scan_bin(ws.data_path)
+    ws.specfem(check=check, ledger=ledger, monitor=monitor)
+    _collect_solver_files(ws.data_path, ws.output_path, before)
+    _replace_dir(ws.output_path, adjoint_path)
+    kernels = kernel_reader(adjoint_path)
+    return Gradient(total_misfit, kernels, synthetic, adjoint)
@@ -0,0 +1,282 @@
+"""
+Interpolation from specfem meshes to regular grids.
+"""
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import Delaunay, cKDTree
+
+# The max number of interpolators kept by get_interpolator.
+INTERPOLATOR_CACHE_SIZE = 8
+_INTERPOLATOR_CACHE = OrderedDict()
+
+
+def _get_grid_shape(x, z, count):
+    """Get (nz, nx) of a grid with about count points and the mesh's aspect."""
+    lx = x.max() - x.min()
+    lz = z.max() - z.min()
+    nx = int(np.around(np.sqrt(count * lx / lz)))
+    nz = int(np.around(np.sqrt(count * lz / lx)))
+    return nz, nx
+
+
+def _hash_coords(x, z):
+    """Hash mesh coordinates."""
+    hasher = hashlib.sha1()
+    for array in (x, z):
+        array = np.ascontiguousarray(array)
+        hasher.update(str(array.dtype).encode())
+        hasher.update(array.tobytes())
+    return hasher.hexdigest()
+
+
+class MeshInterpolator:
+    """
+    Linear interpolation from mesh points to a regular grid.
+
+    The Delaunay triangulation and barycentric weights are computed once
+    and stored as a sparse matrix, so each field is interpolated with a
+    single sparse matrix multiply. Grid points outside the triangulation
+    take the value of the nearest mesh point (as FunctionsPlotBin.mesh2grid
+    does).
+
+    Parameters
+    ----------
+    x
+        The x coordinates of the mesh points.
+    z
+        The z coordinates of the mesh points.
+    nx
+        The number of grid points along x. If nx and nz are None they are
+        chosen so the grid has about as many points as the mesh.
+    nz
+        The number of grid points along z.
+    """
+
+    def __init__(self, x, z, nx=None, nz=None):
+        x = np.asarray(x, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        if nx is None or nz is None:
+            nz, nx = _get_grid_shape(x, z, x.size)
+        self.x = np.linspace(x.min(), x.max(), nx)
+        self.z = np.linspace(z.min(), z.max(), nz)
+        self.shape = (nz, nx)
+        self.n_points = x.size
+        X, Z = np.meshgrid(self.x, self.z)
+        grid = np.column_stack([X.ravel(), Z.ravel()])
+        self.weights = self._get_weights(np.column_stack([x, z]), grid)
+
+    @staticmethod
+    def _get_weights(points, grid):
+        """Build the (n_grid, n_points) sparse interpolation matrix."""
+        tri = Delaunay(points)
+        simplex = tri.find_simplex(grid)
+        inside = simplex >= 0
+        # barycentric coordinates of the grid points in their triangles
+        transform = tri.transform[simplex[inside]]
+        delta = grid[inside] - transform[:, 2]
+        bary = np.einsum("ijk,ik->ij", transform[:, :2], delta)
+        bary = np.column_stack([bary, 1 - bary.sum(axis=1)])
+        rows_in = np.repeat(np.flatnonzero(inside), 3)
+        cols_in = tri.simplices[simplex[inside]].ravel()
+        # points outside the convex hull use the nearest mesh point
+        outside = np.flatnonzero(~inside)
+        _, nearest = cKDTree(points).query(grid[outside])
+        rows = np.concatenate([rows_in, outside])
+        cols = np.concatenate([cols_in, nearest])
+        vals = np.concatenate([bary.ravel(), np.ones(len(outside))])
+        shape = (len(grid), len(points))
+        return csr_matrix((vals, (rows, cols)), shape=shape)
+
+    def __call__(self, values):
+        """
+        Interpolate values defined on the mesh points to the grid.
+
+        values can have shape (n_points,) or (n_points, n_fields); the
+        output has shape (nz, nx) or (nz, nx, n_fields).
+        """
+        values = np.asarray(values)
+        if values.shape[0] != self.n_points:
+            msg = f"values has {values.shape[0]} points, mesh has {self.n_points}"
+            raise ValueError(msg)
+        out = self.weights @ values
+        return out.reshape(self.shape + values.shape[1:])
+
+
+def get_gll_points(ngll):
+    """Get the Gauss-Lobatto-Legendre points in [-1, 1]."""
+    legendre = np.polynomial.legendre.Legendre.basis(ngll - 1)
+    return np.concatenate([[-1.0], np.sort(legendre.deriv().roots().real), [1.0]])
+
+
+def _get_lagrange_coefficients(nodes):
+    """
+    Get the power series coefficients of the Lagrange polynomials of nodes.
+
+    Column i holds the coefficients of the polynomial which is 1 at node i.
+    """
+    vander = np.polynomial.polynomial.polyvander(nodes, len(nodes) - 1)
+    return np.linalg.inv(vander)
+
+
+class ElementInterpolator:
+    """
+    Interpolation from the GLL points of spectral elements to a grid.
+
+    Each grid point is located in its element using a KD-tree of element
+    centers, the local coordinates are found by Newton iterations on the
+    element's own (isoparametric) mapping, and the field is evaluated with
+    the element's Lagrange basis. The cost is linear in the number of grid
+    points and no global triangulation is needed; fields aren't smeared
+    across element boundaries.
+
+    The element connectivity is implicit in the layout of specfem2d's
+    model and kernel files, which store each element's NGLLX * NGLLZ
+    points contiguously (Fortran order (NGLLX, NGLLZ, nspec)).
+
+    Parameters
+    ----------
+    x
+        The x coordinates of the GLL points in file order.
+    z
+        The z coordinates of the GLL points in file order.
+    nx
+        The number of grid points along x. If nx and nz are None they are
+        chosen so the grid has about as many points as the mesh.
+    nz
+        The number of grid points along z.
+    ngll
+        The number of GLL points in each direction (NGLLX = NGLLZ).
+    candidates
+        The number of nearest elements tested for each grid point.
+    """
+
+    def __init__(self, x, z, nx=None, nz=None, ngll=5, candidates=8):
+        x = np.asarray(x, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        if x.size % ngll**2:
+            msg = f"{x.size} points can't be split into elements of {ngll}**2"
+            raise ValueError(msg)
+        if nx is None or nz is None:
+            nz, nx = _get_grid_shape(x, z, x.size)
+        self.x = np.linspace(x.min(), x.max(), nx)
+        self.z = np.linspace(z.min(), z.max(), nz)
+        self.shape = (nz, nx)
+        self.n_points = x.size
+        self.ngll = ngll
+        self._coefs = _get_lagrange_coefficients(get_gll_points(ngll))
+        # element arrays indexed (element, j (z), i (x))
+        xe = x.reshape(-1, ngll, ngll)
+        ze = z.reshape(-1, ngll, ngll)
+        X, Z = np.meshgrid(self.x, self.z)
+        grid = np.column_stack([X.ravel(), Z.ravel()])
+        self.weights = self._get_weights(xe, ze, grid, candidates)
+
+    def _basis(self, xi):
+        """Get the Lagrange basis and its derivative at each xi."""
+        powers = np.polynomial.polynomial.polyvander(xi, self.ngll - 1)
+        dpowers = np.zeros_like(powers)
+        dpowers[:, 1:] = powers[:, :-1] * np.arange(1, self.ngll)
+        return powers @ self._coefs, dpowers @ self._coefs
+
+    def _locate(self, xe, ze, points, iterations=10):
+        """Find the local coordinates of points in elements xe, ze."""
+        xi = np.zeros(len(points))
+        gamma = np.zeros(len(points))
+        for _ in range(iterations):
+            lx, dlx = self._basis(xi)
+            lz, dlz = self._basis(gamma)
+            x = np.einsum("mj,mji,mi->m", lz, xe, lx)
+            z = np.einsum("mj,mji,mi->m", lz, ze, lx)
+            dx_dxi = np.einsum("mj,mji,mi->m", lz, xe, dlx)
+            dx_dgamma = np.einsum("mj,mji,mi->m", dlz, xe, lx)
+            dz_dxi = np.einsum("mj,mji,mi->m", lz, ze, dlx)
+            dz_dgamma = np.einsum("mj,mji,mi->m", dlz, ze, lx)
+            rx, rz = points[:, 0] - x, points[:, 1] - z
+            det = dx_dxi * dz_dgamma - dx_dgamma * dz_dxi
+            with np.errstate(divide="ignore", invalid="ignore"):
+                xi = xi + (dz_dgamma * rx - dx_dgamma * rz) / det
+                gamma = gamma + (dx_dxi * rz - dz_dxi * rx) / det
+            # keep the iterations from running away for far points
+            xi = np.clip(np.nan_to_num(xi), -2, 2)
+            gamma = np.clip(np.nan_to_num(gamma), -2, 2)
+        return xi, gamma
+
+    def _get_weights(self, xe, ze, grid, candidates, tolerance=1e-6):
+        """Build the (n_grid, n_points) sparse interpolation matrix."""
+        centers = np.column_stack([xe.mean(axis=(1, 2)), ze.mean(axis=(1, 2))])
+        candidates = min(candidates, len(centers))
+        _, nearest = cKDTree(centers).query(grid, k=candidates)
+        nearest = nearest.reshape(len(grid), candidates)
+        # default to the nearest element with clamped coordinates so points
+        # outside the mesh take the value at the closest element edge
+        element = nearest[:, 0].copy()
+        xi, gamma = self._locate(xe[element], ze[element], grid)
+        found = (np.abs(xi) <= 1 + tolerance) & (np.abs(gamma) <= 1 + tolerance)
+        best = (xi, gamma)
+        for num in range(1, candidates):
+            todo = np.flatnonzero(~found)
+            if not len(todo):
+                break
+            elem = nearest[todo, num]
+            txi, tgamma = self._locate(xe[elem], ze[elem], grid[todo])
+            inside = (np.abs(txi) <= 1 + tolerance) & (np.abs(tgamma) <= 1 + tolerance)
+            sub = todo[inside]
+            element[sub] = elem[inside]
+            best[0][sub], best[1][sub] = txi[inside], tgamma[inside]
+            found[sub] = True
+        lx, _ = self._basis(np.clip(best[0], -1, 1))
+        lz, _ = self._basis(np.clip(best[1], -1, 1))
+        ngll = self.ngll
+        vals = (lz[:, :, None] * lx[:, None, :]).reshape(len(grid), -1)
+        local = np.arange(ngll**2)
+        cols = element[:, None] * ngll**2 + local[None, :]
+        rows = np.repeat(np.arange(len(grid)), ngll**2)
+        shape = (len(grid), xe.size)
+        return csr_matrix((vals.ravel(), (rows, cols.ravel())), shape=shape)
+
+    __call__ = MeshInterpolator.__call__
+
+
+# Interpolators get_interpolator can build.
+INTERPOLATORS = {"linear": MeshInterpolator, "gll": ElementInterpolator}
+
+
+def get_interpolator(x, z, nx=None, nz=None, method="linear"):
+    """
+    Get a MeshInterpolator, reusing one built for the same coordinates.
+
+    Interpolators are kept in an LRU cache keyed on a hash of the
+    coordinates and the grid size so the triangulation of a mesh which
+    doesn't change is only done once across fields and iterations.
+
+    method is either "linear" (MeshInterpolator) or "gll"
+    (ElementInterpolator, for coordinates in specfem's element layout).
+    """
+    key = (_hash_coords(x, z), nx, nz, method)
+    if key in _INTERPOLATOR_CACHE:
+        _INTERPOLATOR_CACHE.move_to_end(key)
+        return _INTERPOLATOR_CACHE[key]
+    interpolator = INTERPOLATORS[method](x, z, nx=nx, nz=nz)
+    _INTERPOLATOR_CACHE[key] = interpolator
+    while len(_INTERPOLATOR_CACHE) > INTERPOLATOR_CACHE_SIZE:
+        _INTERPOLATOR_CACHE.popitem(last=False)
+    return interpolator
+
+
+def clear_interpolators():
+    """Empty the cache of get_interpolator, eg to time building one."""
+    _INTERPOLATOR_CACHE.clear()
+
+
+def mesh2grid(v, x, z, method="linear"):
+    """
+    Interpolate from an unstructured mesh to a structured grid.
+
+    A drop in replacement for FunctionsPlotBin.mesh2grid which reuses the
+    interpolation weights of previous calls on the same mesh. Use
+    method="gll" to interpolate with the spectral elements' basis.
+    """
+    return get_interpolator(x, z, method=method)(v)
@@ -0,0 +1,289 @@
+"""
+Records of mesher and solver runs and a ledger to keep them in.
+"""
+import dataclasses
+import json
+import math
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+
+# If set, every run of a specfem binary is appended to the ledger at this path.
+LEDGER_ENV_VAR = "FULLWAVE_LEDGER"
+
+# Patterns of the lines of the solver log with numbers in them. The solver
+# prints the norm of the solid (elastic) wavefield as "Max norm of ..." and
+# of the fluid (acoustic) one as "Max absolute value of ...", coupled runs
+# print both.
+_FLOAT = r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eEdD][-+]?\d+)?|NaN|[-+]?Infinity)"
+SOLVER_LOG_PATTERNS = {
+    "step": re.compile(r"Time step number\s+(\d+)\s+t =\s*\S+\s*s out of\s+(\d+)"),
+    "max_norm": re.compile(
+        r"Max (?:norm|absolute value) of .* =\s*" + _FLOAT, re.IGNORECASE
+    ),
+    "elapsed_time": re.compile(r"Elapsed time in seconds =\s*" + _FLOAT),
+    "mean_time_per_step": re.compile(
+        r"Mean elapsed time per time step in seconds =\s*" + _FLOAT
+    ),
+    "remaining_time": re.compile(r"Estimated remaining time in seconds =\s*" + _FLOAT),
+    "time_per_step": re.compile(
+        r"Average duration of a time step of the time loop =\s*" + _FLOAT
+    ),
+    "total_steps": re.compile(r"Total number of time steps =\s*(\d+)"),
+}
+
+
+def _to_float(value):
+    """Convert a number printed by Fortran to a float."""
+    return float(value.replace("d", "e").replace("D", "e"))
+
+
+def parse_log_line(line):
+    """
+    Parse a line of the solver's output.
+
+    Returns (name, value) for lines matching SOLVER_LOG_PATTERNS, else
+    None. The value of the step line is (step, total steps).
+    """
+    for name, pattern in SOLVER_LOG_PATTERNS.items():
+        match = pattern.search(line)
+        if match is None:
+            continue
+        if name == "step":
+            return name, (int(match.group(1)), int(match.group(2)))
+        if name == "total_steps":
+            return name, int(match.group(1))
+        return name, _to_float(match.group(1))
+    return None
+
+
+def update_log_values(values, name, value):
+    """
+    Update a dict of the latest log values with one parsed line.
+
+    The max_norm is the largest (or NaN) of the norms printed since the
+    last step line, so the solid and fluid norms of coupled runs are
+    both checked.
+    """
+    if name == "step":
+        values.pop("max_norm", None)
+    elif name == "max_norm":
+        previous = values.get("max_norm")
+        if previous is not None and (math.isnan(previous) or value <= previous):
+            return
+    values[name] = value
+
+
+def parse_solver_log(path):
+    """
+    Get the last value of each quantity in SOLVER_LOG_PATTERNS from a log.
+
+    The max_norm is the largest norm of the last step, see
+    update_log_values.
+
+    Returns a dict which is empty if the file doesn't exist (eg the
+    mesher's log has none of the solver's lines).
+    """
+    out = {}
+    if not Path(path).exists():
+        return out
+    with open(path, errors="replace") as f:
+        for line in f:
+            parsed = parse_log_line(line)
+            if parsed is not None:
+                update_log_values(out, *parsed)
+    return out
+
+
+def scan_outputs(path):
+    """Get {path: (size, mtime_ns)} of the files under path."""
+    out = {}
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            out[file_path] = (stat.st_size, stat.st_mtime_ns)
+    return out
+
+
+def get_bytes_written(before, after):
+    """Get the size of the files which were created or modified."""
+    return sum(x[0] for path, x in after.items() if before.get(path) != x)
+
+
+@dataclasses.dataclass
+class RunRecord:
+    """
+    The resource use of one run of a specfem binary.
+
+    Parameters
+    ----------
+    name
+        The name of the binary.
+    cwd
+        The directory it ran in.
+    started
+        The start time (UTC, ISO format).
+    wall_time
+        The elapsed time in seconds.
+    user_time
+        The CPU time spent in user mode by the binary (and its children).
+    system_time
+        The CPU time spent in the kernel by the binary.
+    returncode
+        The exit code of the binary.
+    output_bytes
+        The size of the files created or changed in OUTPUT_FILES.
+    n_steps
+        The number of time steps the solver reported.
+    time_per_step
+        The solver's time per step in seconds.
+    log_path
+        The log file of the run.
+    aborted
+        The reason a SolverMonitor stopped the run, if it did.
+    """
+
+    name: str
+    cwd: str
+    started: str
+    wall_time: float
+    user_time: Optional[float] = None
+    system_time: Optional[float] = None
+    returncode: Optional[int] = None
+    output_bytes: int = 0
+    n_steps: Optional[int] = None
+    time_per_step: Optional[float] = None
+    log_path: Optional[str] = None
+    aborted: Optional[str] = None
+
+    @property
+    def cpu_time(self):
+        """The user plus system time."""
+        if self.user_time is None or self.system_time is None:
+            return None
+        return self.user_time + self.system_time
+
+    @property
+    def failed(self):
+        """True if the binary had a non-zero exit code."""
+        return self.returncode != 0
+
+
+class RunLedger:
+    """
+    A JSON lines file of RunRecords.
+
+    Records are appended as single lines so several processes can share a
+    ledger; queries read the whole file.
+
+    Parameters
+    ----------
+    path
+        The path of the ledger file, created on the first append.
+
+    Examples
+    --------
+    >>> ledger = RunLedger("runs.jsonl")
+    >>> ws.mesh(ledger=ledger)
+    >>> ws.specfem(ledger=ledger)
+    >>> ledger.summary()["xspecfem2D"]["wall_time"]
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({str(self.path)!r})"
+
+    def __len__(self):
+        return len(self.records())
+
+    def append(self, record):
+        """Add a record to the ledger."""
+        line = json.dumps(dataclasses.asdict(record)) + "\n"
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+    def records(self):
+        """Read all the records, ignoring fields RunRecord doesn't have."""
+        if not self.path.exists():
+            return []
+        names = {x.name for x in dataclasses.fields(RunRecord)}
+        with open(self.path) as f:
+            rows = [json.loads(x) for x in f if x.strip()]
+        return [RunRecord(**{i: v for i, v in x.items() if i in names}) for x in rows]
+
+    def query(self, predicate=None, **kwargs):
+        """
+        Get the records matching all the kwargs and predicate.
+
+        kwargs are compared with the record's attributes, eg
+        query(name="xspecfem2D", returncode=0); predicate is a callable
+        taking a record.
+        """
+        out = []
+        for record in self.records():
+            if any(getattr(record, i) != v for i, v in kwargs.items()):
+                continue
+            if predicate is not None and not predicate(record):
+                continue
+            out.append(record)
+        return out
+
+    def summary(self, by="name", **kwargs):
+        """
+        Summarize the records (matching kwargs) grouped by an attribute.
+
+        Returns {group: stats} where stats has the number of runs, failures,
+        and runs aborted by a monitor, the total wall and cpu time and
+        output bytes, and the mean time per step.
+        """
+        out = {}
+        for record in self.query(**kwargs):
+            stats = out.setdefault(
+                getattr(record, by),
+                dict(
+                    runs=0,
+                    failures=0,
+                    aborted=0,
+                    wall_time=0.0,
+                    cpu_time=0.0,
+                    output_bytes=0,
+                    time_per_step=[],
+                ),
+            )
+            stats["runs"] += 1
+            stats["failures"] += int(record.failed)
+            stats["aborted"] += int(record.aborted is not None)
+            stats["wall_time"] += record.wall_time
+            stats["cpu_time"] += record.cpu_time or 0.0
+            stats["output_bytes"] += record.output_bytes
+            if record.time_per_step is not None:
+                stats["time_per_step"].append(record.time_per_step)
+        for stats in out.values():
+            steps = stats["time_per_step"]
+            stats["time_per_step"] = sum(steps) / len(steps) if steps else None
+        return out
+
+
+def get_ledger(ledger=None):
+    """
+    Get the ledger runs should be recorded in.
+
+    ledger can be a RunLedger or a path; if None the path in the
+    FULLWAVE_LEDGER environment variable is used, if set.
+    """
+    if ledger is None:
+        ledger = os.environ.get(LEDGER_ENV_VAR) or None
+    if ledger is None or isinstance(ledger, RunLedger):
+        return ledger
+    return RunLedger(ledger)
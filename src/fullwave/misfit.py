@@ -0,0 +1,188 @@
+"""
+Misfit functions and adjoint sources.
+"""
+from functools import lru_cache
+
+import numpy as np
+import obspy
+from scipy.signal import iirfilter, sosfilt, zpk2sos
+
+
+def _match_traces(observed, synthetic):
+    """Return a list of (observed, synthetic) traces with the same id."""
+    synt = {tr.id: tr for tr in synthetic}
+    pairs = [(tr, synt[tr.id]) for tr in observed if tr.id in synt]
+    if not pairs:
+        raise ValueError("No traces in observed match synthetic")
+    return pairs
+
+
+def waveform_misfit(observed, synthetic):
+    """
+    Calculate the waveform misfit and adjoint sources.
+
+    For each pair of traces the misfit is 1/2 the integral of the squared
+    difference and the adjoint source is synthetic - observed.
+
+    Parameters
+    ----------
+    observed
+        A stream of observed data.
+    synthetic
+        A stream of synthetics, traces are matched to observed by id.
+
+    Returns
+    -------
+    The total misfit and a stream of adjoint sources.
+    """
+    misfit = 0.0
+    adjoint = []
+    for obsd, synt in _match_traces(observed, synthetic):
+        residual = synt.data - obsd.data
+        misfit += 0.5 * np.sum(residual**2) * synt.stats.delta
+        adj = synt.copy()
+        adj.data = residual
+        adjoint.append(adj)
+    return misfit, obspy.Stream(adjoint)
+
+
+@lru_cache(maxsize=32)
+def _get_taper_window(npts, delta, max_percentage):
+    """Get the window obspy's Trace.taper (hann) applies to npts samples."""
+    tr = obspy.Trace(np.ones(npts), {"delta": delta})
+    tr.taper(max_percentage)
+    window = tr.data
+    window.flags.writeable = False
+    return window
+
+
+@lru_cache(maxsize=32)
+def _get_bandpass_sos(delta, freqmin, freqmax, corners):
+    """Get second order sections of a butterworth filter like obspy's."""
+    fe = 0.5 / delta
+    low, high = freqmin / fe, freqmax / fe
+    if high - 1.0 > -1e-6:
+        # upper corner at or above nyquist, obspy switches to highpass
+        z, p, k = iirfilter(corners, low, btype="highpass", output="zpk")
+    else:
+        z, p, k = iirfilter(corners, [low, high], btype="band", output="zpk")
+    return zpk2sos(z, p, k)
+
+
+def _stack(traces):
+    """Stack the data of traces into a (n_traces, n_samples) array."""
+    lengths = {len(tr.data) for tr in traces}
+    if len(lengths) != 1:
+        raise ValueError("All traces must have the same number of samples")
+    return np.stack([tr.data for tr in traces]).astype(np.float64)
+
+
+class WaveformMisfit:
+    """
+    Batched processing, waveform misfit and adjoint sources.
+
+    Works on (n_stations, n_samples) arrays so each processing step is a
+    single vectorized call for all the traces. The processing matches
+    obspy's detrend("simple"), taper(taper) and
+    filter("bandpass", freqmin=freqmin, freqmax=freqmax) and is applied to
+    the observed data, the synthetics and the adjoint sources. The taper
+    windows and filter coefficients are cached.
+
+    Parameters
+    ----------
+    freqmin
+        The lower corner of the bandpass filter, no filter if None.
+    freqmax
+        The upper corner of the bandpass filter.
+    taper
+        The max percentage of the hann taper applied to each end, no taper
+        if 0 or None.
+    corners
+        The number of corners of the filter.
+    zerophase
+        If True, filter forwards and backwards.
+
+    Examples
+    --------
+    >>> misfit = WaveformMisfit(freqmin=0.01, freqmax=20)
+    >>> total, adjoint = misfit(observed, synthetic)
+    >>> gradient = compute_gradient(workspace, observed, misfit=misfit)
+    """
+
+    def __init__(
+        self,
+        freqmin=None,
+        freqmax=None,
+        taper=0.05,
+        corners=4,
+        zerophase=False,
+    ):
+        if (freqmin is None) != (freqmax is None):
+            raise ValueError("freqmin and freqmax must be specified together")
+        self.freqmin = freqmin
+        self.freqmax = freqmax
+        self.taper = taper
+        self.corners = corners
+        self.zerophase = zerophase
+
+    def process(self, data, delta):
+        """
+        Detrend, taper and filter each row of data.
+
+        Returns a new array.
+        """
+        data = np.array(data, dtype=np.float64, ndmin=2)
+        npts = data.shape[-1]
+        # remove the line between the first and last samples
+        ramp = np.linspace(0.0, 1.0, npts)
+        start, stop = data[..., :1], data[..., -1:]
+        data -= start + (stop - start) * ramp
+        if self.taper:
+            data *= _get_taper_window(npts, float(delta), self.taper)
+        if self.freqmin is not None:
+            sos = _get_bandpass_sos(
+                float(delta), self.freqmin, self.freqmax, self.corners
+            )
+            data = sosfilt(sos, data, axis=-1)
+            if self.zerophase:
+                data = sosfilt(sos, data[..., ::-1], axis=-1)[..., ::-1]
+        return data
+
+    def compute(self, observed, synthetic, delta):
+        """
+        Calculate the misfit and adjoint sources from arrays.
+
+        Parameters
+        ----------
+        observed
+            A (n_stations, n_samples) array of observed data.
+        synthetic
+            A (n_stations, n_samples) array of synthetics.
+        delta
+            The sampling interval.
+
+        Returns
+        -------
+        The total misfit, the misfit of each station, and an array of
+        adjoint sources.
+        """
+        residual = self.process(synthetic, delta) - self.process(observed, delta)
+        station_misfit = 0.5 * np.sum(residual**2, axis=-1) * delta
+        adjoint = self.process(residual, delta)
+        return float(station_misfit.sum()), station_misfit, adjoint
+
+    def __call__(self, observed, synthetic):
+        """
+        Calculate the misfit and adjoint sources from streams.
+
+        Traces are matched by id and must all share the same sampling.
+        """
+        pairs = _match_traces(observed, synthetic)
+        obsd = _stack([x[0] for x in pairs])
+        synt = _stack([x[1] for x in pairs])
+        delta = pairs[0][1].stats.delta
+        total, _, adjoint = self.compute(obsd, synt, delta)
+        traces = []
+        for (_, tr), data in zip(pairs, adjoint):
+            traces.append(obspy.Trace(data, tr.stats.copy()))
+        return total, obspy.Stream(traces)
@@ -0,0 +1,195 @@
+"""
+Live monitoring of the solver's output.
+"""
+import math
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from subprocess import CalledProcessError
+
+from .ledger import parse_log_line, update_log_values
+
+
+def kill_run(pid):
+    """
+    Kill a binary started by run_bin, and the processes it started.
+
+    run_bin starts binaries in their own session, so the whole process
+    group is killed (eg mpirun and its ranks).
+    """
+    if hasattr(os, "killpg") and os.getpgid(pid) == pid:
+        os.killpg(pid, signal.SIGKILL)
+    else:
+        os.kill(pid, signal.SIGKILL)
+
+
+class SolverDivergedError(CalledProcessError):
+    """Raised when a SolverMonitor kills a run which has diverged."""
+
+    def __init__(self, returncode, cmd, reason):
+        super().__init__(returncode, cmd)
+        self.reason = reason
+
+    def __str__(self):
+        return f"Command '{self.cmd}' was stopped because {self.reason}."
+
+
+class SolverMonitor:
+    """
+    Follow the log of a running solver and stop it if it blows up.
+
+    The log is read as the solver writes it and the periodic time step
+    info (step number, max norm of the elastic and/or acoustic wavefield,
+    elapsed and remaining time) is parsed. The process is killed as soon
+    as the norm is NaN or exceeds max_norm, so an unstable run (eg DT too
+    large or a bad model update) doesn't use up the whole simulation time.
+
+    Pass a monitor to run_bin or Workspace.specfem; a monitor follows one
+    run at a time.
+
+    Parameters
+    ----------
+    max_norm
+        The largest allowed norm of the wavefield; None only checks for
+        NaN (and infinite) values.
+    interval
+        The time in seconds between reads of the log.
+    callback
+        Called with the monitor each time the solver reports its progress,
+        eg to print monitor.status().
+
+    Examples
+    --------
+    >>> monitor = SolverMonitor(max_norm=1e10, callback=lambda x: print(x.status()))
+    >>> ws.specfem(monitor=monitor)
+    """
+
+    def __init__(self, max_norm=None, interval=1.0, callback=None):
+        self.max_norm = max_norm
+        self.interval = interval
+        self.callback = callback
+        self._thread = None
+        self._reset()
+
+    def _reset(self):
+        self.state = {}
+        self.reason = None
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._buffer = b""
+
+    @property
+    def aborted(self):
+        """True if the monitor killed the run."""
+        return self.reason is not None
+
+    @property
+    def eta(self):
+        """
+        Get the estimated remaining time of the run in seconds.
+
+        The solver's estimate is used if it was reported for the current
+        step, else it is extrapolated from the elapsed time.
+        """
+        if "remaining_time" in self.state:
+            return self.state["remaining_time"]
+        if "step" not in self.state:
+            return None
+        step, total = self.state["step"]
+        if step <= 0:
+            return None
+        elapsed = self.state.get("elapsed_time", time.monotonic() - self._started)
+        return elapsed / step * (total - step)
+
+    def status(self):
+        """Get a line describing the progress of the run."""
+        if "step" not in self.state:
+            return "waiting for the first time step"
+        step, total = self.state["step"]
+        out = f"step {step} of {total}"
+        if "max_norm" in self.state:
+            out += f", max norm {self.state['max_norm']:.3e}"
+        eta = self.eta
+        if eta is not None:
+            out += f", {eta:.0f} s remaining"
+        if self.reason:
+            out += f", aborted: {self.reason}"
+        return out
+
+    def check(self, norm):
+        """Return the reason to abort a run with this norm (None if ok)."""
+        if math.isnan(norm) or math.isinf(norm):
+            return f"the norm of the wavefield is {norm}"
+        if self.max_norm is not None and norm > self.max_norm:
+            return f"the norm of the wavefield ({norm:e}) exceeds {self.max_norm:e}"
+        return None
+
+    def feed(self, line):
+        """
+        Parse one line of the log.
+
+        Returns the reason to abort the run if the line shows it has
+        diverged, else None.
+        """
+        parsed = parse_log_line(line)
+        if parsed is None:
+            return None
+        name, value = parsed
+        if name == "step":
+            # the times belong to the previous step
+            self.state.pop("remaining_time", None)
+            self.state.pop("elapsed_time", None)
+        update_log_values(self.state, name, value)
+        if name == "max_norm":
+            return self.check(value)
+        # the remaining time is the last line of the solver's progress info
+        if name == "remaining_time" and self.callback is not None:
+            self.callback(self)
+        return None
+
+    def _read(self, f):
+        """Read and parse the new complete lines of the log."""
+        data = self._buffer + f.read()
+        *lines, self._buffer = data.split(b"\n")
+        for line in lines:
+            reason = self.feed(line.decode(errors="replace"))
+            if reason is not None:
+                return reason
+        return None
+
+    def _follow(self, process, log_path):
+        """Read the log until stopped, killing process if it diverges."""
+        with open(log_path, "rb") as f:
+            while True:
+                stopping = self._stop.wait(self.interval)
+                reason = self._read(f)
+                if reason is not None and self.reason is None:
+                    self.reason = reason
+                    # not process.kill(), which would reap the process
+                    # before run_bin gets its resource use
+                    kill_run(process.pid)
+                if stopping:
+                    return
+
+    def start(self, process, log_path):
+        """Start following the log of process in a thread."""
+        self._reset()
+        self._thread = threading.Thread(
+            target=self._follow, args=(process, Path(log_path)), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop following the log after reading what is left of it.
+
+        This must be called before the process is reaped so it can't be
+        sent a signal after its pid is reused.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,196 @@
+"""
+Headless batch rendering of model and kernel figures.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.figure import Figure
+from matplotlib.tri import Triangulation
+
+# The colors used by FunctionsPlotBin.plotbin
+HEX_COLORS = (
+    "#e44c2e",
+    "#e68f3e",
+    "#efef5c",
+    "#eefeff",
+    "#75fbfe",
+    "#53b7f9",
+    "#050df5",
+)
+# State shared by all the frames rendered in a worker process.
+_WORKER_STATE = {}
+
+
+@lru_cache(maxsize=16)
+def _get_continuous_cmap(hex_colors, positions):
+    """Make the colormap of get_continuous_cmap from (hashable) tuples."""
+    if positions is None:
+        positions = np.linspace(0, 1, len(hex_colors))
+    colors = list(zip(positions, hex_colors))
+    return LinearSegmentedColormap.from_list("fullwave", colors, N=256)
+
+
+def get_continuous_cmap(hex_colors=HEX_COLORS, positions=None):
+    """
+    Make a colormap which graduates between hex colors.
+
+    Colormaps are cached so the same colors only build one colormap.
+
+    Parameters
+    ----------
+    hex_colors
+        A sequence of hex color strings.
+    positions
+        A sequence of floats between 0 and 1 (starting with 0 and ending
+        with 1) which give the position of each color. Evenly spaced if
+        None.
+    """
+    if positions is not None:
+        positions = tuple(float(x) for x in positions)
+    return _get_continuous_cmap(tuple(hex_colors), positions)
+
+
+def _init_worker(x, z, triangles, cmap, settings):
+    """Store the triangulation and colormap once per worker."""
+    _WORKER_STATE["triangulation"] = Triangulation(x, z, triangles)
+    _WORKER_STATE["cmap"] = cmap
+    _WORKER_STATE["settings"] = settings
+
+
+def _render_frame(frame):
+    """Render one frame using the worker's shared state."""
+    values, filename, label = frame
+    settings = _WORKER_STATE["settings"]
+    vmin, vmax = settings["vmin"], settings["vmax"]
+    if vmin is None or vmax is None:
+        # same padding as FunctionsPlotBin.plotbin
+        vmin = np.min(values) - 0.1 * np.max(values)
+        vmax = np.max(values) + 0.1 * np.max(values)
+    if vmin == vmax:
+        vmin, vmax = vmin - 1, vmax + 1
+    fig = Figure(figsize=settings["figsize"], dpi=settings["dpi"])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    contours = ax.tricontourf(
+        _WORKER_STATE["triangulation"],
+        values,
+        cmap=_WORKER_STATE["cmap"],
+        vmin=vmin,
+        vmax=vmax,
+        levels=np.linspace(vmin, vmax, settings["levels"]),
+        extend="both",
+        rasterized=True,
+    )
+    ax.axis("equal")
+    ax.set_adjustable("box")
+    fontsize = settings["fontsize"]
+    ax.set_xlabel("x-coord, m", fontsize=fontsize)
+    ax.set_ylabel("z-coord, m", fontsize=fontsize)
+    ax.tick_params(axis="both", which="major", labelsize=fontsize)
+    cbar = fig.colorbar(contours, ax=ax, orientation="horizontal", fraction=0.05)
+    cbar.set_label(label, rotation=0, fontsize=fontsize)
+    cbar.ax.tick_params(labelsize=fontsize)
+    fig.savefig(filename, bbox_inches="tight")
+    return Path(filename)
+
+
+class BatchRenderer:
+    """
+    Render many fields defined on the same mesh to PNG files.
+
+    The triangulation of the mesh and the colormap are built once and
+    shared by every frame; frames are drawn on figures with the Agg
+    canvas (no pyplot or display needed) in a process pool.
+
+    Parameters
+    ----------
+    x
+        The x coordinates of the mesh points.
+    z
+        The z coordinates of the mesh points.
+    cmap
+        The colormap, defaults to the plotbin colors.
+    vmin
+        The lower limit of the colorbar. If vmin or vmax is None the
+        limits are set from each frame's values as in plotbin.
+    vmax
+        The upper limit of the colorbar.
+    figsize
+        The size of each figure in inches.
+    dpi
+        The resolution of the PNG files.
+    levels
+        The number of contour levels.
+    fontsize
+        The size of the labels.
+    max_workers
+        The number of processes used to render frames.
+
+    Examples
+    --------
+    >>> renderer = BatchRenderer(model["x"], model["z"])
+    >>> frames = [(vs, f"vs_{num:03d}.png", "Vs m/s") for num, vs in history]
+    >>> renderer.render(frames)
+    """
+
+    def __init__(
+        self,
+        x,
+        z,
+        cmap=None,
+        vmin=None,
+        vmax=None,
+        figsize=(3, 3),
+        dpi=250,
+        levels=25,
+        fontsize=4,
+        max_workers=None,
+    ):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.z = np.asarray(z, dtype=np.float64)
+        self.triangles = Triangulation(self.x, self.z).triangles
+        self.cmap = cmap or get_continuous_cmap()
+        self.settings = dict(
+            vmin=vmin,
+            vmax=vmax,
+            figsize=figsize,
+            dpi=dpi,
+            levels=levels,
+            fontsize=fontsize,
+        )
+        self.max_workers = max_workers
+
+    def render(self, frames):
+        """
+        Render frames, an iterable of (values, filename, label).
+
+        Returns the paths of the PNG files in the order of frames.
+        """
+        frames = [(np.asarray(v), str(f), label) for v, f, label in frames]
+        initargs = (self.x, self.z, self.triangles, self.cmap, self.settings)
+        if self.max_workers == 1 or len(frames) <= 1:
+            _init_worker(*initargs)
+            return [_render_frame(x) for x in frames]
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=initargs,
+        )
+        with executor:
+            return list(executor.map(_render_frame, frames))
+
+
+def render_fields(x, z, fields, directory, **kwargs):
+    """
+    Render a dict of {name: values} to directory/name.png.
+
+    kwargs are passed to BatchRenderer.
+    """
+    directory = Path(directory)
+    directory.mkdir(exist_ok=True, parents=True)
+    frames = [(v, directory / f"{name}.png", name) for name, v in fields.items()]
+    return BatchRenderer(x, z, **kwargs).render(frames)
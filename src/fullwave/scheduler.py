@@ -0,0 +1,278 @@
+"""
+Running the forward and adjoint simulations of many events.
+"""
+import dataclasses
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+import numpy as np
+import obspy
+
+from .core import ParFile, read_traces
+from .gradient import Gradient, compute_gradient
+from .misfit import waveform_misfit
+from .monitor import SolverDivergedError
+from .workspace import Workspace
+
+# Kernel entries which are coordinates rather than kernels.
+COORDINATE_NAMES = ("x", "z")
+
+
+@dataclasses.dataclass
+class Event:
+    """
+    A source and the data it was recorded in.
+
+    Parameters
+    ----------
+    name
+        The name of the event, also used for its workspace directory.
+    source
+        The path to a specfem SOURCE file, or a dict of parameters which
+        are applied to the SOURCE file of the data directory.
+    observed
+        The observed data, a stream or a directory of ASCII traces.
+    """
+
+    name: str
+    source: Union[str, Path, Dict[str, Any]]
+    observed: Union[obspy.Stream, str, Path]
+
+
+@dataclasses.dataclass
+class EventResults:
+    """
+    The combined outputs of the simulations of many events.
+
+    Parameters
+    ----------
+    misfit
+        The sum of the misfits of the events.
+    kernels
+        The sum of the kernels of the events, with the x and z coordinates.
+    gradients
+        The Gradient of each event which finished, by name.
+    failed
+        The exception of each event which failed, by name.
+    """
+
+    misfit: float
+    kernels: Dict[str, np.ndarray]
+    gradients: Dict[str, Gradient]
+    failed: Dict[str, BaseException]
+
+
+class CoreBudget:
+    """
+    Share a number of cores between runs which each need several.
+
+    Runs wait until enough cores are free, so smaller runs fill the gaps
+    left by larger ones.
+    """
+
+    def __init__(self, cores):
+        self.cores = cores
+        self.free = cores
+        self._condition = threading.Condition()
+
+    def check(self, count):
+        """Raise a ValueError if a run of count cores can never start."""
+        if count > self.cores:
+            msg = f"a run needs {count} cores but the budget is {self.cores}"
+            raise ValueError(msg)
+
+    def acquire(self, count):
+        """Wait for count cores to be free and take them."""
+        self.check(count)
+        with self._condition:
+            self._condition.wait_for(lambda: self.free >= count)
+            self.free -= count
+
+    def release(self, count):
+        """Give count cores back."""
+        with self._condition:
+            self.free += count
+            self._condition.notify_all()
+
+
+def sum_kernels(kernels):
+    """
+    Sum the kernels of several events which share a mesh.
+
+    The coordinates are taken from the first event.
+    """
+    kernels = list(kernels)
+    if not kernels:
+        return {}
+    sizes = {len(x[name]) for x in kernels for name in x}
+    if len(sizes) != 1:
+        raise ValueError("The kernels of the events aren't on the same mesh")
+    out = {}
+    for name, values in kernels[0].items():
+        if name in COORDINATE_NAMES:
+            out[name] = np.array(values)
+            continue
+        total = np.array(values, dtype=np.float64)
+        for other in kernels[1:]:
+            total += other[name]
+        out[name] = total
+    return out
+
+
+class EventScheduler:
+    """
+    Compute the gradient of many events, running them concurrently.
+
+    A workspace is created for each event from a shared DATA directory
+    with the event's SOURCE. The forward and adjoint simulations of the
+    events run at the same time as long as the sum of their NPROC doesn't
+    exceed the core budget. Events that fail are retried, then the
+    kernels are summed into one gradient.
+
+    The inputs are hardlinked into the workspaces but the model files the
+    solver may write are copied before each run (see Workspace), so
+    concurrent events never write to the shared DATA.
+
+    Solvers with NPROC more than one are started through the MPI launcher
+    (see run_bin); set FULLWAVE_MPI_LAUNCHER if mpirun -np {nproc} isn't
+    the right command.
+
+    Parameters
+    ----------
+    data
+        The DATA directory shared by all events (Par_file, STATIONS, ...).
+    path
+        The directory in which the workspaces are created.
+    cores
+        The number of cores the simulations can use, defaults to the
+        number of cpus.
+    bin_path
+        The directory of the specfem binaries.
+    misfit
+        The misfit function, see compute_gradient.
+    cache
+        A MeshCache so events with the same mesh only mesh once.
+    retries
+        The number of times a failed event is run again. Events stopped
+        by a SolverMonitor aren't retried since they would diverge again.
+    ledger
+        A RunLedger in which all the runs are recorded.
+    monitor_factory
+        A callable returning a new SolverMonitor, called for each event.
+
+    Examples
+    --------
+    >>> events = [Event(f"event_{num}", path, obs) for num, (path, obs) in ...]
+    >>> scheduler = EventScheduler("DATA", "work", cores=16, cache=cache)
+    >>> results = scheduler.run(events)
+    >>> results.kernels["beta"]
+    """
+
+    def __init__(
+        self,
+        data,
+        path,
+        cores=None,
+        bin_path=None,
+        misfit: Callable = waveform_misfit,
+        cache=None,
+        retries=1,
+        ledger=None,
+        monitor_factory: Optional[Callable] = None,
+    ):
+        self.data = Path(data)
+        self.path = Path(path)
+        self.budget = CoreBudget(cores or os.cpu_count())
+        self.bin_path = bin_path
+        self.misfit = misfit
+        self.cache = cache
+        self.retries = retries
+        self.ledger = ledger
+        self.monitor_factory = monitor_factory
+
+    def create_workspace(self, event):
+        """Create (or refresh) the workspace of an event."""
+        ws = Workspace.create(
+            self.path / event.name,
+            self.data,
+            bin_path=self.bin_path,
+            exist_ok=True,
+        )
+        source_path = ws.data_path / "SOURCE"
+        if isinstance(event.source, dict):
+            ParFile.read(source_path).write(parameters=event.source)
+        else:
+            shutil.copy2(event.source, source_path)
+        return ws
+
+    def _get_observed(self, event):
+        observed = event.observed
+        if isinstance(observed, obspy.Stream):
+            return observed
+        return read_traces(observed)
+
+    def _run_event(self, event):
+        """Run the simulations of an event, retrying failures."""
+        ws = self.create_workspace(event)
+        nproc = ws.par_file.get("NPROC", 1)
+        # not retried, the event would never fit in the budget
+        self.budget.check(nproc)
+        observed = self._get_observed(event)
+        for attempt in range(self.retries + 1):
+            monitor = self.monitor_factory() if self.monitor_factory else None
+            self.budget.acquire(nproc)
+            try:
+                return compute_gradient(
+                    ws,
+                    observed,
+                    misfit=self.misfit,
+                    cache=self.cache,
+                    ledger=self.ledger,
+                    monitor=monitor,
+                )
+            except SolverDivergedError:
+                raise
+            except Exception:
+                if attempt == self.retries:
+                    raise
+            finally:
+                self.budget.release(nproc)
+
+    def run(self, events, raise_on_failure=True):
+        """
+        Compute the gradients of events and sum them.
+
+        Parameters
+        ----------
+        events
+            A sequence of Event.
+        raise_on_failure
+            If True, raise a RuntimeError if any event failed after all
+            have finished, else the kernels of the events which finished
+            are summed and the failures are in the results.
+        """
+        events = list(events)
+        names = [x.name for x in events]
+        if len(set(names)) != len(names):
+            raise ValueError("Event names must be unique")
+        gradients, failed = {}, {}
+        workers = max(1, min(len(events), self.budget.cores))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {x.name: executor.submit(self._run_event, x) for x in events}
+            for name, future in futures.items():
+                try:
+                    gradients[name] = future.result()
+                except Exception as e:
+                    failed[name] = e
+        if failed and raise_on_failure:
+            msg = f"{len(failed)} events failed: " + ", ".join(
+                f"{name} ({error!r})" for name, error in failed.items()
+            )
+            raise RuntimeError(msg)
+        misfit = sum(x.misfit for x in gradients.values())
+        kernels = sum_kernels(x.kernels for x in gradients.values())
+        return EventResults(misfit, kernels, gradients, failed)
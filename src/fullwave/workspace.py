@@ -0,0 +1,238 @@
+"""
+Lightweight specfem run directories.
+"""
+import os
+import shutil
+from pathlib import Path
+
+from .core import BIN_PATH, MESHER, SOLVER, ParFile, run_bin
+
+# Files in DATA which are edited per event/iteration so they are copied.
+# STATIONS is included because the mesher rewrites it when receiver sets
+# are used, which would change the original through a hardlink.
+MUTABLE_DATA_FILES = ("Par_file", "SOURCE", "STATIONS")
+# Files in DATA which the solver may write in place: the model files are
+# read with MODEL = gll/binary and written when SAVE_MODEL isn't default.
+# They are linked like the other inputs and copied before each solver run.
+SOLVER_DATA_PATTERNS = ("proc*",)
+# Files written by a forward run with SAVE_FORWARD which the adjoint run
+# only reads.
+FORWARD_WAVEFIELD_PATTERNS = ("lastframe_*.bin", "absorb_*.bin")
+# Files written to OUTPUT_FILES by the mesher.
+MESH_OUTPUT_PATTERNS = ("Database*.bin",)
+
+
+def _link_or_copy(source, destination):
+    """Hardlink source to destination, copy if linking isn't possible."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _unshare(directory, patterns):
+    """Replace the hardlinked files matching patterns by copies."""
+    out = []
+    for pattern in patterns:
+        for path in sorted(Path(directory).glob(pattern)):
+            if not path.is_file() or path.stat().st_nlink < 2:
+                continue
+            temp_path = path.with_name(f".{path.name}.tmp")
+            shutil.copy2(path, temp_path)
+            os.replace(temp_path, path)
+            out.append(path)
+    return out
+
+
+def _populate(source, destination, copy_names):
+    """Fill destination with links (or copies) of the files in source."""
+    destination.mkdir(exist_ok=True, parents=True)
+    for path in Path(source).iterdir():
+        new = destination / path.name
+        if path.is_dir():
+            _populate(path, new, copy_names)
+            continue
+        if new.exists():
+            new.unlink()
+        if path.name in copy_names:
+            shutil.copy2(path, new)
+        else:
+            _link_or_copy(path, new)
+
+
+class Workspace:
+    """
+    A specfem run directory.
+
+    The binaries are symlinked and the read-only inputs are hardlinked so
+    creating a workspace for a new event or iteration costs almost no disk
+    space or I/O. Only files which change (Par_file, SOURCE, STATIONS)
+    are copied and SEM is created empty. The model files in DATA, which
+    the solver may write, are copied before the solver runs so the
+    original DATA and other workspaces are never changed.
+
+    Parameters
+    ----------
+    path
+        The directory of the workspace.
+
+    Examples
+    --------
+    >>> ws = Workspace.create("work/event_001", "DATA_Example01")
+    >>> ws.par_file.write(parameters={"SIMULATION_TYPE": 1})
+    >>> ws.mesh()
+    >>> ws.specfem()
+    """
+
+    def __init__(self, path):
+        self.path = Path(path).absolute()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({str(self.path)!r})"
+
+    @classmethod
+    def create(
+        cls,
+        path,
+        data,
+        bin_path=None,
+        copy_names=MUTABLE_DATA_FILES,
+        exist_ok=False,
+    ):
+        """
+        Create a new workspace.
+
+        Parameters
+        ----------
+        path
+            The directory of the new workspace.
+        data
+            The DATA directory from which the inputs are linked.
+        bin_path
+            The directory of specfem binaries to symlink, defaults to
+            fullwave.core.BIN_PATH.
+        copy_names
+            The names of files in data which are copied rather than linked.
+        exist_ok
+            If False, raise a FileExistsError if path already exists.
+        """
+        ws = cls(path)
+        ws.path.mkdir(parents=True, exist_ok=exist_ok)
+        bin_link = ws.bin_path
+        if not bin_link.exists():
+            bin_link.symlink_to(Path(bin_path or BIN_PATH).absolute())
+        _populate(Path(data), ws.data_path, set(copy_names))
+        ws.output_path.mkdir(exist_ok=True)
+        ws.sem_path.mkdir(exist_ok=True)
+        return ws
+
+    @property
+    def bin_path(self):
+        """The symlink to the specfem binaries."""
+        return self.path / "bin"
+
+    @property
+    def data_path(self):
+        """The DATA directory."""
+        return self.path / "DATA"
+
+    @property
+    def output_path(self):
+        """The OUTPUT_FILES directory."""
+        return self.path / "OUTPUT_FILES"
+
+    @property
+    def sem_path(self):
+        """The SEM directory where adjoint sources are written."""
+        return self.path / "SEM"
+
+    @property
+    def par_file_path(self):
+        """The path to the Par_file."""
+        return self.data_path / "Par_file"
+
+    @property
+    def par_file(self):
+        """Read the Par_file of the workspace."""
+        return ParFile.read(self.par_file_path)
+
+    def clone(self, path, **kwargs):
+        """Create a new workspace from the DATA and binaries of this one."""
+        bin_path = self.bin_path.resolve()
+        return self.create(path, self.data_path, bin_path=bin_path, **kwargs)
+
+    def link_forward(self, source, patterns=FORWARD_WAVEFIELD_PATTERNS):
+        """
+        Hardlink saved forward wavefield files from source to OUTPUT_FILES.
+
+        This replaces copying the outputs of the forward run before
+        running the adjoint simulation.
+        """
+        self.output_path.mkdir(exist_ok=True)
+        out = []
+        for pattern in patterns:
+            for path in sorted(Path(source).glob(pattern)):
+                new = self.output_path / path.name
+                if new.exists():
+                    new.unlink()
+                _link_or_copy(path, new)
+                out.append(new)
+        return out
+
+    def unshare_data(self, patterns=SOLVER_DATA_PATTERNS):
+        """
+        Replace the hardlinked files of DATA matching patterns by copies.
+
+        The solver writes the model files in place, which would change the
+        original DATA and every workspace linked to it. Files which aren't
+        linked are left alone. Returns the paths of the copied files.
+        """
+        return _unshare(self.data_path, patterns)
+
+    def clear_outputs(self):
+        """Remove and recreate the OUTPUT_FILES directory."""
+        if self.output_path.exists():
+            shutil.rmtree(self.output_path)
+        self.output_path.mkdir()
+
+    def clear_mesh(self, patterns=MESH_OUTPUT_PATTERNS):
+        """
+        Remove the mesher outputs from OUTPUT_FILES.
+
+        They may be hardlinks to the entries of a MeshCache which the
+        mesher would otherwise overwrite in place.
+        """
+        for pattern in patterns:
+            for path in self.output_path.glob(pattern):
+                path.unlink()
+
+    def mesh(self, check=True, cache=None, ledger=None):
+        """
+        Run the mesher in the workspace.
+
+        If a MeshCache is provided, the mesher only runs when the cache
+        doesn't have an entry for the workspace's mesh; None is returned on
+        a cache hit. The run is recorded in ledger, see run_bin.
+        """
+        if cache is not None:
+            return cache.mesh(self, check=check, ledger=ledger)
+        self.clear_mesh()
+        bin_path = self.bin_path
+        return run_bin(self.path, MESHER, bin_path, check=check, ledger=ledger)
+
+    def specfem(self, check=True, ledger=None, monitor=None):
+        """
+        Run the solver in the workspace, see run_bin.
+
+        The model files in DATA are copied first, see unshare_data. A
+        SolverMonitor can be passed to stop the run early if it diverges.
+        """
+        self.unshare_data()
+        return run_bin(
+            self.path,
+            SOLVER,
+            self.bin_path,
+            check=check,
+            ledger=ledger,
+            monitor=monitor,
+        )
@@ -0,0 +1,108 @@
+"""
+Fixtures shared by the fullwave tests.
+"""
+import shutil
+from pathlib import Path
+
+import pytest
+
+TEST_PATH = Path(__file__).absolute().parent
+BASE_PATH = TEST_PATH.parent
+# A complete specfem2d DATA directory from the homework.
+DATA_PATH = BASE_PATH / "homework" / "assignment_2" / "DATA"
+
+
+@pytest.fixture()
+def data_path(tmp_path):
+    """A copy of the example DATA directory."""
+    return Path(shutil.copytree(DATA_PATH, tmp_path / "DATA"))
+
+
+@pytest.fixture()
+def par_file_path(data_path):
+    """The path to a copy of the example Par_file."""
+    return data_path / "Par_file"
+
+
+@pytest.fixture()
+def stations_path(data_path):
+    """The path to a copy of the example STATIONS file."""
+    return data_path / "STATIONS"
+
+
+# Fake specfem binaries which write the files the real ones would.
+FAKE_MESHER = """#!/bin/sh
+echo "meshing in $(pwd)"
+echo "database" > OUTPUT_FILES/Database00000.bin
+if grep -q "^use_existing_STATIONS *= *.false." DATA/Par_file; then
+  xdeb=$(awk '$1 == "xdeb" {print $3; exit}' DATA/Par_file)
+  echo "S0001 AA $xdeb 0.0 0.0 0.0" > DATA/STATIONS
+fi
+"""
+FAKE_SOLVER = """#!/bin/sh
+echo "solving in $(pwd)"
+test -f OUTPUT_FILES/Database00000.bin || { echo "no database"; exit 1; }
+if grep -q "^MODEL *= *gll" DATA/Par_file; then
+  test -f DATA/proc000000_vs.bin || { echo "no gll model"; exit 1; }
+fi
+case $(awk '$1 == "seismotype" {print $3}' DATA/Par_file) in
+  2) ext=semv ;;
+  3) ext=sema ;;
+  4) ext=semp ;;
+  *) ext=semd ;;
+esac
+if grep -q "^SIMULATION_TYPE *= *3" DATA/Par_file; then
+  test -f OUTPUT_FILES/lastframe_elastic000000.bin || { echo "no wavefield"; exit 1; }
+  ls SEM/*.adj > /dev/null || { echo "no adjoint sources"; exit 1; }
+  kernel=OUTPUT_FILES/proc000000_rhop_alpha_beta_kernel.dat
+  printf "0.0 0.0 1.0 2.0 3.0\\n1.0 0.0 4.0 5.0 6.0\\n" > $kernel
+else
+  while read sta net rest; do
+    printf "0.0 0.0\\n0.1 1.0\\n0.2 0.0\\n" > OUTPUT_FILES/$net.$sta.BXY.$ext
+  done < DATA/STATIONS
+  echo "wavefield" > OUTPUT_FILES/lastframe_elastic000000.bin
+fi
+if ! grep -q "^SAVE_MODEL *= *default" DATA/Par_file; then
+  echo "coordinates" > DATA/proc000000_x.bin
+fi
+echo " Time step number      100   t =    0.1000 s out of    100"
+echo " Max norm of vector field in solid (elastic) =    1.5E-03"
+echo " Average duration of a time step of the time loop =    1.0E-03  s"
+"""
+
+
+# A fake MPI launcher which records its arguments then runs the binary.
+FAKE_LAUNCHER = """#!/bin/sh
+echo "$@" >> launcher_args.txt
+shift 2
+exec "$@"
+"""
+
+
+def write_script(path, text):
+    """Write an executable shell script."""
+    path.write_text(text)
+    path.chmod(0o755)
+    return path
+
+
+@pytest.fixture()
+def bin_path(tmp_path_factory):
+    """A directory with fake specfem binaries."""
+    path = tmp_path_factory.mktemp("bin")
+    write_script(path / "xmeshfem2D", FAKE_MESHER)
+    write_script(path / "xspecfem2D", FAKE_SOLVER)
+    return path
+
+
+@pytest.fixture()
+def launcher(tmp_path_factory):
+    """The command of a fake MPI launcher, see fullwave.core.get_command."""
+    path = write_script(tmp_path_factory.mktemp("mpi") / "mpirun", FAKE_LAUNCHER)
+    return f"{path} -np {{nproc}}"
+
+
+@pytest.fixture()
+def run_path(data_path):
+    """A run directory (containing DATA) for the fake binaries."""
+    return data_path.parent
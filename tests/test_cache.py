@@ -0,0 +1,117 @@
+"""
+Tests for the mesher output cache.
+"""
+import os
+
+import pytest
+
+from fullwave import MeshCache, RunLedger, Workspace, get_mesh_hash
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    """An empty mesh cache."""
+    return MeshCache(tmp_path / "cache")
+
+
+@pytest.fixture()
+def workspace(tmp_path, data_path, bin_path):
+    """A workspace using the fake binaries."""
+    return Workspace.create(tmp_path / "ws", data_path, bin_path=bin_path)
+
+
+@pytest.fixture()
+def other_workspace(workspace, tmp_path):
+    """A second workspace with the same mesh."""
+    return workspace.clone(tmp_path / "ws_2")
+
+
+def _database(workspace):
+    return workspace.output_path / "Database00000.bin"
+
+
+class TestMeshHash:
+    """Tests for the hash of the mesh inputs."""
+
+    def test_solver_parameters(self, workspace):
+        """Parameters which only affect the solver don't change the hash."""
+        key = get_mesh_hash(workspace)
+        workspace.par_file.write(parameters={"NSTEP": 10, "SIMULATION_TYPE": 3})
+        assert get_mesh_hash(workspace) == key
+
+    def test_mesh_parameters(self, workspace):
+        """Mesh parameters and the model table change the hash."""
+        key = get_mesh_hash(workspace)
+        workspace.par_file.write(parameters={"nx": 81})
+        new_key = get_mesh_hash(workspace)
+        assert new_key != key
+        par = workspace.par_file
+        par.set_model(1, vs=1000.0)
+        par.write()
+        assert get_mesh_hash(workspace) not in {key, new_key}
+
+
+class TestMeshCache:
+    """Tests for meshing with the cache."""
+
+    def test_miss_then_hit(self, workspace, other_workspace, cache, tmp_path):
+        """The mesher only runs for the first workspace with a mesh."""
+        ledger = RunLedger(tmp_path / "ledger.jsonl")
+        assert workspace.mesh(cache=cache, ledger=ledger) is not None
+        assert get_mesh_hash(workspace) in cache
+        assert other_workspace.mesh(cache=cache, ledger=ledger) is None
+        assert len(ledger) == 1
+        assert _database(other_workspace).read_text() == "database\n"
+
+    def test_different_mesh(self, workspace, other_workspace, cache):
+        """A workspace with a different mesh is a miss."""
+        workspace.mesh(cache=cache)
+        other_workspace.par_file.write(parameters={"nx": 81})
+        assert other_workspace.mesh(cache=cache) is not None
+        assert len(list(cache.path.iterdir())) == 2
+
+    def test_mesh_without_cache_keeps_entry(self, workspace, other_workspace, cache):
+        """Meshing a restored workspace doesn't write through to the cache."""
+        workspace.mesh(cache=cache)
+        other_workspace.mesh(cache=cache)
+        entry = cache.path / get_mesh_hash(workspace) / "Database00000.bin"
+        inode = os.stat(entry).st_ino
+        assert os.stat(_database(other_workspace)).st_ino == inode
+        other_workspace.mesh()
+        assert os.stat(_database(other_workspace)).st_ino != inode
+        assert entry.read_text() == "database\n"
+
+    def test_stations_restored(self, workspace, other_workspace, cache):
+        """The STATIONS written by the mesher are restored on a hit."""
+        stations = other_workspace.data_path / "STATIONS"
+        original = stations.read_text()
+        workspace.mesh(cache=cache)
+        written = (workspace.data_path / "STATIONS").read_text()
+        assert written != original
+        assert other_workspace.mesh(cache=cache) is None
+        assert stations.read_text() == written
+        # the restored file is a copy so editing it leaves the entry alone
+        stations.write_text("edited")
+        entry = cache.path / get_mesh_hash(workspace) / "DATA" / "STATIONS"
+        assert entry.read_text() == written
+
+    def test_existing_stations_not_stored(self, workspace, other_workspace, cache):
+        """STATIONS isn't cached when the mesher doesn't write it."""
+        for ws in (workspace, other_workspace):
+            ws.par_file.write(parameters={"use_existing_STATIONS": True})
+        original = (other_workspace.data_path / "STATIONS").read_text()
+        workspace.mesh(cache=cache)
+        assert not (cache.path / get_mesh_hash(workspace) / "DATA").exists()
+        assert other_workspace.mesh(cache=cache) is None
+        assert (other_workspace.data_path / "STATIONS").read_text() == original
+
+    def test_entry_without_stations(self, workspace, other_workspace, cache):
+        """An entry stored without STATIONS is completed by the next run."""
+        workspace.mesh(cache=cache)
+        entry = cache.path / get_mesh_hash(workspace)
+        (entry / "DATA" / "STATIONS").unlink()
+        # a hit would leave the workspace with stale STATIONS
+        assert other_workspace.mesh(cache=cache) is not None
+        assert (entry / "DATA" / "STATIONS").exists()
+        new = workspace.clone(workspace.path.parent / "ws_3")
+        assert new.mesh(cache=cache) is None
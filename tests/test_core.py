@@ -0,0 +1,422 @@
+"""
+Tests for the core functions of fullwave.
+"""
+import os
+import shutil
+from subprocess import CalledProcessError
+
+import numpy as np
+import obspy
+import pytest
+
+from fullwave import (
+    ParFile,
+    Runner,
+    read_binary_seismograms,
+    read_stations,
+    read_trace,
+    read_traces,
+    run_bin,
+    save_trace,
+    specfem_write_parameters,
+    write_adjoint_sources,
+)
+from fullwave.core import MPI_LAUNCHER_ENV_VAR, get_command
+
+
+@pytest.fixture()
+def stream(stations_path):
+    """A stream with one trace per station."""
+    traces = []
+    for num, (net, sta, *_) in enumerate(read_stations(stations_path)):
+        headers = dict(network=net, station=sta, channel="BXY", delta=0.01, b=-0.1)
+        traces.append(obspy.Trace(np.sin(np.arange(100) / (num + 1)), headers))
+    return obspy.Stream(traces)
+
+
+@pytest.fixture()
+def trace_path(tmp_path, stream):
+    """A directory of ASCII traces."""
+    path = tmp_path / "OUTPUT_FILES"
+    path.mkdir()
+    for tr in stream:
+        stats = tr.stats
+        save_trace(tr, path / f"{stats.network}.{stats.station}.{stats.channel}.semd")
+    return path
+
+
+class TestReadBinarySeismograms:
+    """Tests for reading specfem's binary seismograms."""
+
+    npts = 50
+
+    @pytest.fixture()
+    def output_path(self, data_path, stations_path):
+        """An OUTPUT_FILES directory with single precision X and Z files."""
+        path = data_path.parent / "OUTPUT_FILES"
+        path.mkdir()
+        n_stations = len(read_stations(stations_path))
+        for num, comp in enumerate("xz"):
+            data = np.arange(n_stations * self.npts, dtype=np.float32) + num
+            data.tofile(path / f"U{comp}_file_single_d.bin")
+        return path
+
+    def test_array(self, output_path, stations_path):
+        """The arrays have one row per station, in STATIONS order."""
+        out = read_binary_seismograms(output_path, output="array")
+        n_stations = len(read_stations(stations_path))
+        assert set(out) == {"BXX", "BXZ"}
+        assert out["BXX"].shape == (n_stations, self.npts)
+        assert out["BXX"].dtype == np.float32
+        assert out["BXZ"][1, 0] == self.npts + 1
+        assert isinstance(out["BXX"], np.memmap)
+
+    def test_stream(self, output_path, stations_path):
+        """A stream has a trace per station and component."""
+        st = read_binary_seismograms(output_path, delta=0.01, b=-0.1)
+        stations = read_stations(stations_path)
+        assert isinstance(st, obspy.Stream)
+        assert len(st) == 2 * len(stations)
+        net, sta, *_ = stations[1]
+        tr = st.select(station=sta, channel="BXZ")[0]
+        assert tr.stats.network == net
+        assert tr.stats.delta == 0.01
+        assert tr.stats.b == -0.1
+        assert tr.data[0] == self.npts + 1
+
+    def test_stream_needs_delta(self, output_path):
+        """The files have no time column so delta is required."""
+        with pytest.raises(ValueError, match="delta"):
+            read_binary_seismograms(output_path)
+
+    def test_bad_size(self, output_path):
+        """A file which can't be split among the stations raises."""
+        path = output_path / "Ux_file_single_d.bin"
+        np.ones(7, dtype=np.float32).tofile(path)
+        with pytest.raises(ValueError, match="split evenly"):
+            read_binary_seismograms(output_path, output="array")
+
+    def test_missing_file(self, output_path):
+        """A clear error is raised if a component wasn't written."""
+        with pytest.raises(FileNotFoundError):
+            read_binary_seismograms(output_path, components=("Y",), output="array")
+
+    def test_bad_precision(self, output_path):
+        """Only single and double precision exist."""
+        with pytest.raises(ValueError, match="precision"):
+            read_binary_seismograms(output_path, precision="half")
+
+
+class TestReadTraces:
+    """Tests for reading a directory of ASCII traces."""
+
+    def test_round_trip(self, trace_path, stream):
+        """The traces saved by save_trace are read back."""
+        st = read_traces(trace_path)
+        assert len(st) == len(stream)
+        expected = {tr.id: tr for tr in stream}
+        for tr in st:
+            np.testing.assert_allclose(tr.data, expected[tr.id].data)
+            assert tr.stats.delta == pytest.approx(0.01)
+            assert tr.stats.b == pytest.approx(-0.1)
+
+    def test_matches_read_trace(self, trace_path):
+        """The pool gives the same traces as reading one at a time."""
+        paths = sorted(trace_path.glob("*.semd"))
+        st = read_traces(trace_path)
+        for path, tr in zip(paths, st):
+            np.testing.assert_array_equal(read_trace(path).data, tr.data)
+
+    def test_matches_loadtxt(self, trace_path):
+        """Only parsing the data column gives what np.loadtxt does."""
+        path = sorted(trace_path.glob("*.semd"))[0]
+        times, data = np.loadtxt(path).T
+        tr = read_trace(path)
+        np.testing.assert_array_equal(tr.data, data)
+        assert tr.stats.b == times[0]
+        assert tr.stats.delta == times[1] - times[0]
+
+    def test_malformed(self, tmp_path):
+        """Files which aren't two columns raise."""
+        path = tmp_path / "AA.S0001.BXY.semd"
+        path.write_text("0.0 1.0\n0.1 2.0\n0.2\n")
+        with pytest.raises(ValueError, match="two columns"):
+            read_trace(path)
+        path.write_text("0.0 1.0\n0.1 nope\n")
+        with pytest.raises(ValueError):
+            read_trace(path)
+
+    def test_station_order(self, trace_path, stations_path):
+        """The traces can be ordered as the STATIONS file."""
+        st = read_traces(trace_path, stations=stations_path)
+        stations = [x[1] for x in read_stations(stations_path)]
+        assert [tr.stats.station for tr in st] == stations
+
+    def test_processes(self, trace_path):
+        """The traces can be read in a process pool."""
+        st = read_traces(trace_path, use_processes=True, max_workers=2)
+        assert len(st) == len(read_traces(trace_path))
+
+    def test_empty(self, tmp_path):
+        """A directory without traces gives an empty stream."""
+        assert len(read_traces(tmp_path)) == 0
+
+
+class TestWriteAdjointSources:
+    """Tests for writing the adjoint sources to SEM."""
+
+    def test_files(self, tmp_path, stream):
+        """Every component of every station is written, missing ones as 0."""
+        paths = write_adjoint_sources(stream, tmp_path / "SEM")
+        assert len(paths) == 3 * len(stream)
+        names = {x.name for x in (tmp_path / "SEM").iterdir()}
+        assert names == {x.name for x in paths}
+        tr = stream[0]
+        stats = tr.stats
+        base = tmp_path / "SEM" / f"{stats.network}.{stats.station}.BX"
+        data = np.loadtxt(f"{base}Y.adj")
+        np.testing.assert_allclose(data[:, 0], tr.times() + stats.b)
+        np.testing.assert_allclose(data[:, 1], tr.data)
+        assert not np.loadtxt(f"{base}X.adj")[:, 1].any()
+
+    def test_matches_save_trace(self, tmp_path, stream):
+        """The files are the same as those written by save_trace."""
+        tr = stream[0]
+        path = write_adjoint_sources(stream[:1], tmp_path, components=("Y",))[0]
+        save_trace(tr, tmp_path / "expected.adj")
+        assert path.read_text() == (tmp_path / "expected.adj").read_text()
+
+    def test_empty(self, tmp_path):
+        """Nothing is written for an empty stream."""
+        assert write_adjoint_sources(obspy.Stream(), tmp_path / "SEM") == []
+
+    def test_different_lengths_raise(self, tmp_path, stream):
+        """The time column is shared so all traces must line up."""
+        stream[0].data = stream[0].data[:10]
+        with pytest.raises(ValueError, match="same npts"):
+            write_adjoint_sources(stream, tmp_path / "SEM")
+
+
+class TestParFile:
+    """Tests for the parse-once parameter file."""
+
+    @pytest.fixture()
+    def par(self, par_file_path):
+        """The example Par_file."""
+        return ParFile.read(par_file_path)
+
+    @pytest.fixture()
+    def commented_par(self, par_file_path):
+        """A Par_file with a comment between the rows of the model table."""
+        lines = par_file_path.read_text().splitlines(keepends=True)
+        ind = next(num for num, x in enumerate(lines) if x.startswith("2 1 2500"))
+        lines.insert(ind, "# the second layer\n")
+        par_file_path.write_text("".join(lines))
+        return ParFile.read(par_file_path)
+
+    def test_round_trip(self, par, par_file_path, tmp_path):
+        """Writing an unchanged file gives the same text."""
+        text = par_file_path.read_text()
+        assert par.render() == text
+        assert par.write(tmp_path / "Par_file").read_text() == text
+
+    def test_values(self, par):
+        """Values are converted to python types."""
+        assert par["NPROC"] == 1
+        assert par["DT"] == pytest.approx(1.1e-3)
+        assert par["MODEL"] == "default"
+        assert par["use_existing_STATIONS"] is False
+        assert par.get("NOT_A_KEY", 2) == 2
+        with pytest.raises(KeyError):
+            par["NOT_A_KEY"]
+
+    def test_set(self, par, tmp_path):
+        """Only the values of changed keys are edited."""
+        par.update({"NSTEP": 10, "SAVE_FORWARD": True, "DT": 2e-3})
+        new = ParFile.read(par.write(tmp_path / "Par_file"))
+        assert new["NSTEP"] == 10
+        assert new["SAVE_FORWARD"] is True
+        assert new["DT"] == pytest.approx(2e-3)
+        old = [x for x in par.render().splitlines() if "NSTEP" in x]
+        assert old[0].endswith("= 10")
+
+    def test_render_doesnt_change(self, par):
+        """Rendering with parameters leaves the file as it was."""
+        text = par.render({"NSTEP": 10})
+        assert "NSTEP                           = 10" in text
+        assert par["NSTEP"] == 1600
+
+    def test_tables(self, par):
+        """The model and region tables are parsed."""
+        assert len(par.models) == par["nbmodels"] == 4
+        assert len(par.regions) == par["nbregions"] == 5
+        assert par.models[1][:4] == ["2", "1", "2500.d0", "2700.d0"]
+
+    def test_set_model(self, par):
+        """Isotropic model values can be set by name."""
+        par.set_model(2, vs=1500.0)
+        assert par.models[1][4] == "1500.0"
+        with pytest.raises(KeyError):
+            par.set_model(10, vs=1.0)
+
+    def test_set_table_same_rows(self, commented_par):
+        """Changing rows in place keeps the comments between them."""
+        rows = commented_par.models
+        rows[0][2] = "2800.d0"
+        commented_par.set_table("nbmodels", rows)
+        assert "# the second layer\n" in commented_par.render()
+        assert commented_par.models[0][2] == "2800.d0"
+
+    @pytest.mark.parametrize("count", [1, 3, 6])
+    def test_set_table_row_count(self, commented_par, tmp_path, count):
+        """Changing the number of rows keeps the comments and the count."""
+        models = commented_par.models
+        rows = [models[num % len(models)] for num in range(count)]
+        commented_par.set_table("nbmodels", rows)
+        new = ParFile.read(commented_par.write(tmp_path / "Par_file"))
+        assert new["nbmodels"] == count
+        assert new.models == rows
+        assert new.render().count("# the second layer\n") == 1
+        # the file after the table is unchanged
+        assert new["TOMOGRAPHY_FILE"] == "./DATA/tomo_file.xyz"
+        assert new.regions == commented_par.regions
+
+    @pytest.mark.parametrize("count", [3, 6])
+    def test_set_table_undo(self, commented_par, count):
+        """Adding or removing the last rows then undoing it is lossless."""
+        text = commented_par.render()
+        models = commented_par.models
+        rows = [models[num % len(models)] for num in range(count)]
+        commented_par.set_table("nbmodels", rows)
+        commented_par.set_table("nbmodels", models)
+        assert commented_par.render() == text
+
+    def test_write_is_atomic(self, par, par_file_path, monkeypatch):
+        """A failed write leaves the old file and no temporary files."""
+        text = par_file_path.read_text()
+
+        def _fail(*args):
+            raise OSError("disk full")
+
+        monkeypatch.setattr("os.replace", _fail)
+        with pytest.raises(OSError):
+            par.write(parameters={"NSTEP": 10})
+        assert par_file_path.read_text() == text
+        assert [x.name for x in par_file_path.parent.glob(".Par_file*")] == []
+
+    @pytest.mark.parametrize("mode", [0o644, 0o640])
+    def test_write_keeps_mode(self, par, par_file_path, mode):
+        """Writing the file keeps its permissions."""
+        par_file_path.chmod(mode)
+        specfem_write_parameters(par_file_path, {"NSTEP": 10})
+        assert par_file_path.stat().st_mode & 0o777 == mode
+        assert ParFile.read(par_file_path)["NSTEP"] == 10
+
+    def test_write_new_mode(self, par, tmp_path):
+        """New files get the default permissions."""
+        umask = os.umask(0o022)
+        try:
+            path = par.write(tmp_path / "Par_file_new")
+        finally:
+            os.umask(umask)
+        assert path.stat().st_mode & 0o777 == 0o644
+
+
+class TestRunBin:
+    """Tests for running the specfem binaries."""
+
+    def test_run(self, run_path, bin_path):
+        """The binary runs in cwd and its output goes to the log."""
+        cwd = os.getcwd()
+        out = run_bin(run_path, "xmeshfem2D", bin_path)
+        assert out.returncode == 0
+        assert os.getcwd() == cwd
+        log = run_path / "OUTPUT_FILES" / "mesher_log.txt"
+        assert f"meshing in {run_path}" in log.read_text()
+        assert (run_path / "OUTPUT_FILES" / "Database00000.bin").exists()
+
+    def test_missing_binary(self, run_path, tmp_path):
+        """A missing binary raises before anything runs."""
+        with pytest.raises(FileNotFoundError):
+            run_bin(run_path, "xmeshfem2D", tmp_path)
+
+    def test_check(self, run_path, bin_path):
+        """A failed binary raises only if check is True."""
+        # the solver fails without the mesher's database
+        with pytest.raises(CalledProcessError):
+            run_bin(run_path, "xspecfem2D", bin_path)
+        out = run_bin(run_path, "xspecfem2D", bin_path, check=False)
+        assert out.returncode == 1
+
+
+class TestMPILauncher:
+    """Tests for running the solver on several processes."""
+
+    @pytest.fixture()
+    def mpi_run_path(self, run_path, bin_path):
+        """A meshed run directory with NPROC = 2."""
+        ParFile.read(run_path / "DATA" / "Par_file").write(parameters={"NPROC": 2})
+        run_bin(run_path, "xmeshfem2D", bin_path)
+        return run_path
+
+    def test_command(self, monkeypatch):
+        """The launcher is only used for more than one process."""
+        monkeypatch.delenv(MPI_LAUNCHER_ENV_VAR, raising=False)
+        assert get_command("xspecfem2D") == ["xspecfem2D"]
+        assert get_command("xspecfem2D", 4) == ["mpirun", "-np", "4", "xspecfem2D"]
+        out = get_command("xspecfem2D", 2, launcher="srun -n {nproc} --exact")
+        assert out == ["srun", "-n", "2", "--exact", "xspecfem2D"]
+
+    def test_solver_launched(self, mpi_run_path, bin_path, launcher):
+        """The solver runs through the launcher with NPROC processes."""
+        out = run_bin(mpi_run_path, "xspecfem2D", bin_path, launcher=launcher)
+        assert out.args[-1] == str(bin_path / "xspecfem2D")
+        args = (mpi_run_path / "launcher_args.txt").read_text().split()
+        assert args == ["-np", "2", str(bin_path / "xspecfem2D")]
+        assert list((mpi_run_path / "OUTPUT_FILES").glob("*.semd"))
+
+    def test_mesher_serial(self, mpi_run_path, bin_path, launcher):
+        """The mesher isn't launched with MPI, unless nproc is given."""
+        assert not (mpi_run_path / "launcher_args.txt").exists()
+        run_bin(mpi_run_path, "xmeshfem2D", bin_path, nproc=3, launcher=launcher)
+        args = (mpi_run_path / "launcher_args.txt").read_text().split()
+        assert args[:2] == ["-np", "3"]
+
+    def test_environment(self, mpi_run_path, bin_path, launcher, monkeypatch):
+        """The launcher can be set with an environment variable."""
+        monkeypatch.setenv(MPI_LAUNCHER_ENV_VAR, launcher)
+        run_bin(mpi_run_path, "xspecfem2D", bin_path)
+        assert (mpi_run_path / "launcher_args.txt").exists()
+        run_bin(mpi_run_path, "xspecfem2D", bin_path, nproc=1)
+        assert len((mpi_run_path / "launcher_args.txt").read_text().splitlines()) == 1
+
+
+class TestRunner:
+    """Tests for running binaries in many directories at once."""
+
+    @pytest.fixture()
+    def run_paths(self, run_path, tmp_path):
+        """Several run directories."""
+        out = []
+        for num in range(3):
+            path = tmp_path / f"run_{num}"
+            shutil.copytree(run_path / "DATA", path / "DATA")
+            out.append(path)
+        return out
+
+    def test_simulate(self, run_paths, bin_path):
+        """Each directory is meshed then solved."""
+        with Runner(max_workers=2, bin_path=bin_path) as runner:
+            futures = [runner.simulate(x) for x in run_paths]
+        for path, future in zip(run_paths, futures):
+            mesher, solver = future.result()
+            assert mesher.returncode == solver.returncode == 0
+            assert list((path / "OUTPUT_FILES").glob("*.semd"))
+
+    def test_failure(self, run_paths, bin_path):
+        """A failure is raised by the result of its future."""
+        with Runner(bin_path=bin_path) as runner:
+            future = runner.specfem(run_paths[0])
+            with pytest.raises(CalledProcessError):
+                future.result()
+            assert runner.specfem(run_paths[1], check=False).result().returncode
@@ -0,0 +1,156 @@
+"""
+Tests for reading specfem model, database and kernel files.
+"""
+import numpy as np
+import pytest
+
+from fullwave import read_fortran, read_kernels, read_model, write_fortran
+
+
+@pytest.fixture()
+def kernel_values():
+    """The x, z and kernel values of two processors."""
+    rng = np.random.default_rng(0)
+    return [rng.normal(size=(n, 5)) for n in (6, 4)]
+
+
+@pytest.fixture()
+def ascii_kernel_path(tmp_path, kernel_values):
+    """A directory with ASCII kernel files of two processors."""
+    for num, values in enumerate(kernel_values):
+        path = tmp_path / f"proc{num:06d}_rhop_alpha_beta_kernel.dat"
+        np.savetxt(path, values, fmt="%15.5e")
+    return tmp_path
+
+
+@pytest.fixture()
+def binary_kernel_path(tmp_path, kernel_values):
+    """A directory with binary kernel and coordinate files."""
+    names = ["x", "z", "rhop_kernel", "alpha_kernel", "beta_kernel"]
+    for num, values in enumerate(kernel_values):
+        for col, name in enumerate(names):
+            write_fortran(tmp_path / f"proc{num:06d}_{name}.bin", values[:, col])
+    return tmp_path
+
+
+class TestReadKernels:
+    """Tests for reading the kernels of an adjoint run."""
+
+    names = ("x", "z", "rhop", "alpha", "beta")
+
+    def test_ascii(self, ascii_kernel_path, kernel_values):
+        """The columns of the ASCII files are split by name."""
+        out = read_kernels(ascii_kernel_path)
+        expected = np.concatenate(kernel_values)
+        assert tuple(out) == self.names
+        for num, name in enumerate(self.names):
+            np.testing.assert_allclose(out[name], expected[:, num], rtol=1e-5)
+
+    def test_binary(self, binary_kernel_path, kernel_values):
+        """Binary kernels are assembled in processor order."""
+        out = read_kernels(binary_kernel_path)
+        expected = np.concatenate(kernel_values).astype(np.float32)
+        assert set(out) == set(self.names)
+        for num, name in enumerate(self.names):
+            np.testing.assert_array_equal(out[name], expected[:, num])
+
+    def test_binary_preferred(self, binary_kernel_path, ascii_kernel_path):
+        """The binary kernels are read if there are both."""
+        out = read_kernels(binary_kernel_path, max_workers=1)
+        assert out["beta"].dtype == np.float32
+
+    def test_single_row(self, tmp_path):
+        """A file with a single point is still a table."""
+        path = tmp_path / "proc000000_rhop_alpha_beta_kernel.dat"
+        np.savetxt(path, np.ones((1, 5)))
+        assert len(read_kernels(tmp_path)["beta"]) == 1
+
+    def test_missing(self, tmp_path):
+        """A clear error is raised if there are no kernels."""
+        with pytest.raises(FileNotFoundError):
+            read_kernels(tmp_path)
+
+
+class TestReadFortran:
+    """Tests for reading Fortran unformatted records."""
+
+    def test_round_trip(self, tmp_path):
+        """Arrays written by write_fortran are read back without copies."""
+        data = np.arange(10, dtype=np.float32)
+        path = write_fortran(tmp_path / "proc000000_vs.bin", data)
+        out = read_fortran(path)
+        assert isinstance(out, np.memmap)
+        np.testing.assert_array_equal(out, data)
+
+    def test_double(self, tmp_path):
+        """Double precision files can be read by name or dtype."""
+        data = np.linspace(0, 1, 7)
+        path = write_fortran(tmp_path / "vs.bin", data, dtype="double")
+        np.testing.assert_array_equal(read_fortran(path, "double"), data)
+        np.testing.assert_array_equal(read_fortran(path, np.float64), data)
+
+    def test_bad_markers(self, tmp_path):
+        """A file whose markers don't match its size raises."""
+        path = write_fortran(tmp_path / "vs.bin", np.ones(4))
+        with open(path, "r+b") as f:
+            f.seek(-4, 2)
+            np.array([8], dtype=np.int32).tofile(f)
+        with pytest.raises(ValueError, match="markers"):
+            read_fortran(path)
+
+    def test_wrong_dtype(self, tmp_path):
+        """A record which isn't a whole number of values raises."""
+        path = write_fortran(tmp_path / "vs.bin", np.ones(3), dtype=np.float32)
+        with pytest.raises(ValueError, match="multiple"):
+            read_fortran(path, dtype=np.float64)
+
+    def test_too_small(self, tmp_path):
+        """A file without markers raises."""
+        path = tmp_path / "vs.bin"
+        path.write_bytes(b"abc")
+        with pytest.raises(ValueError, match="too small"):
+            read_fortran(path)
+
+
+class TestReadModel:
+    """Tests for reading the model files of all processors."""
+
+    @pytest.fixture()
+    def model_path(self, tmp_path):
+        """A model split over three processors."""
+        for proc, size in enumerate((5, 3, 4)):
+            for num, name in enumerate(("x", "z", "vp", "vs", "rho")):
+                data = np.full(size, 10 * proc + num)
+                write_fortran(tmp_path / f"proc{proc:06d}_{name}.bin", data)
+        return tmp_path
+
+    def test_assembly(self, model_path):
+        """The pieces are concatenated in processor order."""
+        out = read_model(model_path)
+        assert len(out["vs"]) == 12
+        np.testing.assert_array_equal(out["vs"][[0, 5, 8]], [3, 13, 23])
+
+    def test_single_proc_memmap(self, tmp_path):
+        """A single processor model isn't copied."""
+        for name in ("x", "z", "vp", "vs", "rho"):
+            write_fortran(tmp_path / f"proc000000_{name}.bin", np.ones(3))
+        assert isinstance(read_model(tmp_path)["vs"], np.memmap)
+
+    def test_missing_name(self, model_path):
+        """A missing model file raises."""
+        for path in model_path.glob("proc*_rho.bin"):
+            path.unlink()
+        with pytest.raises(FileNotFoundError, match="rho"):
+            read_model(model_path)
+
+    def test_missing_processor(self, model_path):
+        """All names must have the same processors."""
+        (model_path / "proc000002_vs.bin").unlink()
+        with pytest.raises(ValueError, match="number of processor files"):
+            read_model(model_path)
+
+    def test_inconsistent_sizes(self, model_path):
+        """All names must have the same number of points."""
+        write_fortran(model_path / "proc000002_vs.bin", np.ones(2))
+        with pytest.raises(ValueError, match="Inconsistent"):
+            read_model(model_path)
@@ -0,0 +1,87 @@
+"""
+Tests for the forward + adjoint pipeline.
+"""
+import numpy as np
+import obspy
+import pytest
+
+from fullwave import Workspace, compute_gradient
+from fullwave.gradient import ADJOINT_OUTPUT, FORWARD_OUTPUT
+
+
+@pytest.fixture()
+def workspace(tmp_path, data_path, bin_path):
+    """A workspace using the fake binaries."""
+    return Workspace.create(tmp_path / "ws", data_path, bin_path=bin_path)
+
+
+@pytest.fixture()
+def observed():
+    """Observed data at the station the fake mesher writes."""
+    headers = dict(network="AA", station="S0001", channel="BXY", delta=0.1)
+    return obspy.Stream([obspy.Trace(np.zeros(3), headers)])
+
+
+class TestComputeGradient:
+    """Tests for running the forward and adjoint simulations."""
+
+    def test_gradient(self, workspace, observed):
+        """The misfit, synthetics and kernels are returned."""
+        out = compute_gradient(workspace, observed)
+        assert out.misfit == pytest.approx(0.5 * 0.1)
+        assert [tr.id for tr in out.synthetic] == ["AA.S0001..BXY"]
+        np.testing.assert_allclose(out.adjoint[0].data, [0, 1, 0])
+        assert set(out.kernels) == {"x", "z", "rhop", "alpha", "beta"}
+        np.testing.assert_allclose(out.kernels["beta"], [3, 6])
+
+    def test_outputs(self, workspace, observed):
+        """The outputs of each run are kept and the inputs moved."""
+        compute_gradient(workspace, observed)
+        forward = workspace.path / FORWARD_OUTPUT
+        adjoint = workspace.path / ADJOINT_OUTPUT
+        assert list(forward.glob("*.semd"))
+        # the mesh and wavefield are moved to the adjoint run
+        assert not list(forward.glob("*.bin"))
+        assert (adjoint / "Database00000.bin").exists()
+        assert (adjoint / "lastframe_elastic000000.bin").exists()
+        assert list(adjoint.glob("*_kernel.dat"))
+        assert len(list(workspace.sem_path.glob("*.adj"))) == 3
+
+    def test_model_inputs_stay(self, workspace, observed):
+        """The model files of a gll model stay in DATA for the adjoint run."""
+        model = workspace.data_path / "proc000000_vs.bin"
+        model.write_text("model")
+        workspace.par_file.write(parameters={"MODEL": "gll"})
+        compute_gradient(workspace, observed)
+        assert model.read_text() == "model"
+        assert not (workspace.path / ADJOINT_OUTPUT / model.name).exists()
+
+    def test_solver_files_moved(self, workspace, observed):
+        """The model files the solver writes to DATA are moved to outputs."""
+        workspace.par_file.write(parameters={"SAVE_MODEL": "binary"})
+        compute_gradient(workspace, observed)
+        assert not (workspace.data_path / "proc000000_x.bin").exists()
+        for name in (FORWARD_OUTPUT, ADJOINT_OUTPUT):
+            assert (workspace.path / name / "proc000000_x.bin").exists()
+
+    def test_rewritten_inputs_copied(self, tmp_path, data_path, bin_path, observed):
+        """Inputs the solver rewrites are copied, leaving DATA unchanged."""
+        (data_path / "proc000000_x.bin").write_text("old")
+        workspace = Workspace.create(tmp_path / "ws", data_path, bin_path=bin_path)
+        other = Workspace.create(tmp_path / "other", data_path, bin_path=bin_path)
+        workspace.par_file.write(parameters={"SAVE_MODEL": "binary"})
+        compute_gradient(workspace, observed)
+        coords = workspace.data_path / "proc000000_x.bin"
+        assert coords.read_text() == "coordinates\n"
+        assert (workspace.path / ADJOINT_OUTPUT / coords.name).exists()
+        for path in (data_path, other.data_path):
+            assert (path / coords.name).read_text() == "old"
+
+    @pytest.mark.parametrize("seismotype, extension", [(2, "semv"), (4, "semp")])
+    def test_seismotype(self, workspace, observed, seismotype, extension):
+        """The synthetics of the Par_file's seismotype are used."""
+        workspace.par_file.write(parameters={"seismotype": seismotype})
+        out = compute_gradient(workspace, observed)
+        assert len(out.synthetic) == 1
+        forward = workspace.path / FORWARD_OUTPUT
+        assert list(forward.glob(f"*.{extension}"))
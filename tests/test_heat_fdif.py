@@ -0,0 +1,546 @@
+"""
+Tests for the heat equation solvers of the first assignment.
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# heat_fdif isn't part of the package, it is imported from the homework
+HEAT_FDIF_PATH = Path(__file__).absolute().parent.parent / "homework" / "assignment_1"
+sys.path.insert(0, str(HEAT_FDIF_PATH))
+
+import heat_fdif  # noqa: E402
+from heat_fdif import (  # noqa: E402
+    BatchedTridiagonalSolver,
+    Simulation1D,
+    Simulation2D,
+    TridiagonalSolver,
+    heat_adi,
+    heat_btcs,
+    heat_btcs_2d,
+    heat_crank_nicolson,
+    heat_fast_forward,
+    heat_ftcs,
+    make_A,
+    make_D,
+    make_E,
+    make_sparse_A,
+    make_tridiagonals,
+    moving_window,
+    run_ensemble,
+    tridiagonal_matvec,
+)
+
+DT = 0.4
+
+
+def gaussian(x):
+    """A gaussian in the middle of x which is zero at the ends."""
+    out = np.exp(-(((x - x.mean()) / 3) ** 2))
+    out[0], out[-1] = 0, 0
+    return out
+
+
+def _make_simulation(points=21, steps=11, dx=1, **kwargs):
+    """Make a simulation with points grid points and steps time steps."""
+    return Simulation1D(
+        x_min=0,
+        x_max=(points - 1) * dx,
+        dx=dx,
+        time_min=0,
+        time_max=DT * (steps - 1),
+        dt=DT,
+        initial_func=kwargs.pop("initial_func", gaussian),
+        **kwargs,
+    )
+
+
+def _make_simulation_2d(initial_func, **kwargs):
+    """Make a 2D simulation with a 9 x 12 grid."""
+    return Simulation2D(
+        x_min=0,
+        x_max=11,
+        dx=1,
+        y_min=0,
+        y_max=4,
+        dy=0.5,
+        time_min=0,
+        time_max=DT * 5,
+        dt=DT,
+        initial_func=initial_func,
+        **kwargs,
+    )
+
+
+def _separable(x, y):
+    """A product of gaussians in x and y."""
+    return gaussian(x[0])[None, :] * gaussian(y[:, 0])[:, None]
+
+
+def zero_ends(array):
+    """Hold both ends at zero."""
+    array[0], array[-1] = 0, 0
+    return array
+
+
+def _ftcs_reference(sim, conductivity):
+    """Run FTCS as first written, with moving_window derivatives."""
+    thermal = np.broadcast_to(conductivity, np.shape(sim.x_grid))
+    dk_dx = moving_window(thermal, [-1, 0, 1])
+    coef_A = thermal * (sim.dt / sim.dx**2)
+    coef_B = dk_dx * (sim.dt / (4 * sim.dx**2))
+    return _run_dense(
+        sim,
+        lambda x: x
+        + coef_A * moving_window(x, [1, -2, 1])
+        + coef_B * moving_window(x, [-1, 0, 1]),
+    )
+
+
+def _to_dense(lower, diag, upper):
+    """Make the dense matrix of the diagonals."""
+    return np.diag(diag) + np.diag(lower, -1) + np.diag(upper, 1)
+
+
+def _to_dense_2d(C, scale, axis):
+    """Make the dense operator along one axis of a raveled (y, x) grid."""
+    index = np.arange(C.size).reshape(C.shape)
+    out = np.zeros((C.size, C.size))
+    for line, coefs in zip(np.moveaxis(index, axis, -1), np.moveaxis(C, axis, -1)):
+        out[np.ix_(line, line)] = _to_dense(*make_tridiagonals(coefs, scale))
+    return out
+
+
+def _run_dense(sim, step_func):
+    """Run sim by applying step_func to the values, saving every step."""
+    temp = np.ravel(sim.get_initial_values())
+    out = [temp]
+    for _ in range(len(sim.t_grid) - 1):
+        temp = step_func(temp)
+        out.append(temp)
+    return np.stack(out, axis=1)
+
+
+@pytest.fixture()
+def diagonals():
+    """The diagonals of a diagonally dominant tridiagonal matrix."""
+    rng = np.random.default_rng(0)
+    n = 12
+    lower, upper = rng.uniform(-1, 1, n - 1), rng.uniform(-1, 1, n - 1)
+    return lower, rng.uniform(2.5, 4, n), upper
+
+
+class TestTridiagonals:
+    """Tests for the diagonals of the diffusion operators."""
+
+    @pytest.mark.parametrize(
+        "scale, make_dense", [(1.0, make_A), (0.5, make_D), (-0.5, make_E)]
+    )
+    def test_constant(self, scale, make_dense):
+        """Constant coefficients give the homework's dense matrices."""
+        x = np.arange(8)
+        diags = make_tridiagonals(np.full(8, 0.3), scale=scale)
+        np.testing.assert_allclose(_to_dense(*diags), make_dense(0.3, x))
+
+    def test_batched(self):
+        """Each row of a 2D C gets its own diagonals."""
+        C = np.array([np.full(5, 0.1), np.linspace(0.1, 0.5, 5)])
+        out = make_tridiagonals(C)
+        for num, row in enumerate(C):
+            for batched, single in zip(out, make_tridiagonals(row)):
+                np.testing.assert_allclose(batched[num], single)
+
+    def test_matvec(self, diagonals):
+        """The product matches the dense one, for several rows at once."""
+        array = np.random.default_rng(1).normal(size=(3, 12))
+        expected = array @ _to_dense(*diagonals).T
+        np.testing.assert_allclose(tridiagonal_matvec(*diagonals, array), expected)
+
+
+class TestTridiagonalSolver:
+    """Tests for the factored LAPACK solver."""
+
+    def test_solve(self, diagonals):
+        """The solution matches a dense solve, for one or many vectors."""
+        solver = TridiagonalSolver(*diagonals)
+        dense = _to_dense(*diagonals)
+        rhs = np.random.default_rng(1).normal(size=(12, 3))
+        np.testing.assert_allclose(solver.solve(rhs), np.linalg.solve(dense, rhs))
+        np.testing.assert_allclose(
+            solver.solve(rhs[:, 0]), np.linalg.solve(dense, rhs[:, 0])
+        )
+
+    def test_singular(self):
+        """A singular matrix raises."""
+        with pytest.raises(np.linalg.LinAlgError):
+            TridiagonalSolver(np.ones(2), np.zeros(3), np.zeros(2))
+
+
+class TestBatchedTridiagonalSolver:
+    """Tests for solving many systems at once."""
+
+    def test_solve(self):
+        """Each system's solution matches a dense solve."""
+        rng = np.random.default_rng(2)
+        C = rng.uniform(0.1, 1, size=(4, 10))
+        diags = make_tridiagonals(C)
+        rhs = rng.normal(size=(4, 10))
+        out = BatchedTridiagonalSolver(*diags).solve(rhs)
+        for num in range(len(C)):
+            dense = _to_dense(*(x[num] for x in diags))
+            np.testing.assert_allclose(out[num], np.linalg.solve(dense, rhs[num]))
+
+    def test_shared_matrix(self, diagonals):
+        """1D diagonals are used for every row of the right hand side."""
+        rhs = np.random.default_rng(3).normal(size=(5, 12))
+        out = BatchedTridiagonalSolver(*diagonals).solve(rhs)
+        expected = np.linalg.solve(_to_dense(*diagonals), rhs.T).T
+        np.testing.assert_allclose(out, expected)
+
+
+class TestImplicitSolvers:
+    """Tests for the 1D implicit schemes against the dense formulation."""
+
+    def test_btcs(self):
+        """Each step solves the make_A system."""
+        sim = _make_simulation()
+        A = make_A(DT, sim.x_grid)
+        expected = _run_dense(sim, lambda x: np.linalg.solve(A, x))
+        np.testing.assert_allclose(heat_btcs(sim).values, expected, atol=1e-12)
+
+    def test_crank_nicolson(self):
+        """Each step solves the make_D system with make_E applied."""
+        sim = _make_simulation()
+        D, E = make_D(DT, sim.x_grid), make_E(DT, sim.x_grid)
+        expected = _run_dense(sim, lambda x: np.linalg.solve(D, E @ x))
+        out = heat_crank_nicolson(sim)
+        np.testing.assert_allclose(out.values, expected, atol=1e-12)
+        np.testing.assert_allclose(out.columns, sim.t_grid)
+
+    def test_conductivity_array(self):
+        """A constant conductivity array is the same as a scalar."""
+        out = heat_btcs(_make_simulation(), thermal_conductivity=np.full(21, 2.0))
+        expected = heat_btcs(_make_simulation(), thermal_conductivity=2.0)
+        np.testing.assert_allclose(out.values, expected.values)
+
+
+class TestSimulation2D:
+    """Tests for the 2D geometry and its results."""
+
+    def test_results(self):
+        """Each column is a raveled (y, x) snapshot."""
+        sim = _make_simulation_2d(_separable, times_to_save=[0, DT * 2])
+        out = heat_btcs_2d(sim)
+        assert out.index.names == ["y", "x"]
+        assert list(out.columns) == pytest.approx([0, DT * 2])
+        snapshot = out[0.0].unstack()
+        assert snapshot.shape == sim.shape == (9, 12)
+        X, Y = np.meshgrid(sim.x_grid, sim.y_grid)
+        np.testing.assert_allclose(snapshot.values, _separable(X, Y))
+
+    def test_zeros(self):
+        """Without an initial function the values start at zero."""
+        sim = _make_simulation_2d(None)
+        assert not np.any(sim.get_initial_values())
+
+
+class TestHeat2D:
+    """Tests for the 2D implicit schemes."""
+
+    @pytest.fixture()
+    def conductivity(self):
+        """A conductivity which varies in x and y."""
+        X, Y = np.meshgrid(np.arange(12), np.arange(9))
+        return 1 + 0.05 * X + 0.1 * Y
+
+    def test_sparse_A(self):
+        """Constant coefficients give make_A along each axis."""
+        Cx, Cy = np.full((9, 12), 0.3), np.full((9, 12), 0.2)
+        A_x = np.kron(np.eye(9), make_A(0.3, np.arange(12)))
+        A_y = np.kron(make_A(0.2, np.arange(9)), np.eye(12))
+        expected = A_x + A_y - np.eye(9 * 12)
+        np.testing.assert_allclose(make_sparse_A(Cx, Cy).toarray(), expected)
+
+    def test_btcs_2d(self, conductivity):
+        """Each step solves the sparse system."""
+        sim = _make_simulation_2d(_separable)
+        Cx, Cy = conductivity * DT / 1**2, conductivity * DT / 0.5**2
+        A = make_sparse_A(Cx, Cy).toarray()
+        expected = _run_dense(sim, lambda x: np.linalg.solve(A, x))
+        out = heat_btcs_2d(sim, thermal_conductivity=conductivity)
+        np.testing.assert_allclose(out.values, expected, atol=1e-12)
+
+    def test_adi_separable(self):
+        """A separable field evolves as Crank-Nicolson along each axis."""
+        out = heat_adi(_make_simulation_2d(_separable))
+        x_sim = _make_simulation(points=12, steps=6)
+        y_sim = _make_simulation(points=9, steps=6, dx=0.5)
+        along_x = heat_crank_nicolson(x_sim).values
+        along_y = heat_crank_nicolson(y_sim).values
+        expected = along_y[:, None, :] * along_x[None, :, :]
+        np.testing.assert_allclose(out.values, expected.reshape(-1, 6), atol=1e-12)
+
+    def test_adi_dense(self, conductivity):
+        """Each step is a half step implicit in x then one implicit in y."""
+        sim = _make_simulation_2d(_separable)
+        Cx, Cy = conductivity * DT / 1**2, conductivity * DT / 0.5**2
+        D_x, E_x = _to_dense_2d(Cx, 0.5, axis=1), _to_dense_2d(Cx, -0.5, axis=1)
+        D_y, E_y = _to_dense_2d(Cy, 0.5, axis=0), _to_dense_2d(Cy, -0.5, axis=0)
+
+        def step(temp):
+            half = np.linalg.solve(D_x, E_y @ temp)
+            return np.linalg.solve(D_y, E_x @ half)
+
+        expected = _run_dense(sim, step)
+        out = heat_adi(sim, thermal_conductivity=conductivity)
+        np.testing.assert_allclose(out.values, expected, atol=1e-12)
+
+    @pytest.mark.parametrize("solver", [heat_adi, heat_btcs_2d])
+    def test_bc_func(self, solver):
+        """The boundary conditions are applied after each step."""
+
+        def hot_corner(array):
+            array[0, 0] = 5.0
+            return array
+
+        sim = _make_simulation_2d(_separable, bc_func=hot_corner)
+        out = solver(sim)
+        np.testing.assert_allclose(out.iloc[0, 1:], 5.0)
+
+
+class TestHeatFTCS:
+    """Tests for the explicit scheme."""
+
+    @pytest.fixture()
+    def conductivity(self):
+        """A conductivity which varies along x."""
+        return np.linspace(0.5, 1.2, 21)
+
+    def test_reference(self, conductivity):
+        """The fused stencil matches the moving_window formulation."""
+        sim = _make_simulation()
+        expected = _ftcs_reference(sim, conductivity)
+        out = heat_ftcs(sim, thermal_conductivity=conductivity, use_numba=False)
+        np.testing.assert_allclose(out.values, expected, atol=1e-14)
+
+    def test_saved_times(self):
+        """Only the saved times are returned."""
+        sim = _make_simulation(times_to_save=[DT * 3, DT * 7])
+        expected = _ftcs_reference(_make_simulation(), 1.0)[:, [3, 7]]
+        out = heat_ftcs(sim, use_numba=False)
+        assert list(out.columns) == pytest.approx([DT * 3, DT * 7])
+        np.testing.assert_allclose(out.values, expected, atol=1e-14)
+
+    def test_loop_kernel(self, conductivity):
+        """The loop kernel numba compiles matches the numpy step."""
+        temp = gaussian(np.arange(21.0))
+        coefs = heat_fdif._get_ftcs_coefficients(temp, DT, 1, 1, 1, conductivity)
+        expected = temp.copy()
+        buffer, scratch = np.empty_like(temp), np.empty(19)
+        for _ in range(5):
+            heat_fdif._ftcs_step(expected, buffer, *coefs, scratch)
+            expected, buffer = buffer, expected
+        heat_fdif._ftcs_advance(temp, np.empty_like(temp), *coefs, 5)
+        np.testing.assert_allclose(temp, expected, atol=1e-14)
+
+    @pytest.mark.parametrize("bc_func", [None, zero_ends])
+    def test_numba(self, conductivity, bc_func):
+        """The compiled kernel gives what the numpy path does."""
+        pytest.importorskip("numba")
+        sims = [_make_simulation(bc_func=bc_func) for _ in range(2)]
+        kwargs = dict(thermal_conductivity=conductivity)
+        out = heat_ftcs(sims[0], use_numba=True, **kwargs)
+        expected = heat_ftcs(sims[1], use_numba=False, **kwargs)
+        np.testing.assert_allclose(out.values, expected.values, atol=1e-14)
+
+    def test_bc_func(self):
+        """The boundary conditions are applied after each step."""
+
+        def hot_end(array):
+            array[-1] = 2.0
+            return array
+
+        out = heat_ftcs(_make_simulation(bc_func=hot_end), use_numba=False)
+        np.testing.assert_allclose(out.iloc[-1, 1:], 2.0)
+        assert out.iloc[-2, -1] > out.iloc[-2, 1]
+
+    def test_numba_missing(self, monkeypatch):
+        """Asking for the compiled kernel without numba raises."""
+        monkeypatch.setattr(heat_fdif, "_ftcs_advance_jit", None)
+        with pytest.raises(ImportError, match="numba"):
+            heat_ftcs(_make_simulation(), use_numba=True)
+        assert len(heat_ftcs(_make_simulation()).columns) == 11
+
+
+class TestSnapshotStorage:
+    """Tests for saving the snapshots of a simulation."""
+
+    def test_save_steps(self):
+        """Saved times are rounded to steps, deduplicated, and sorted."""
+        times = [DT * 3 + 1e-9, DT * 3, DT * 2 - 1e-9, 100, -1]
+        sim = _make_simulation(times_to_save=times)
+        np.testing.assert_array_equal(sim.save_steps, [2, 3])
+        out = heat_btcs(sim)
+        np.testing.assert_allclose(out.columns, sim.t_grid[[2, 3]])
+
+    def test_all(self):
+        """All time steps are saved by default."""
+        sim = _make_simulation()
+        np.testing.assert_array_equal(sim.save_steps, np.arange(11))
+
+    def test_dtype(self):
+        """The snapshots are stored with the simulation's dtype."""
+        out = heat_btcs(_make_simulation(dtype="float32"))
+        expected = heat_btcs(_make_simulation())
+        assert set(out.dtypes) == {np.dtype("float32")}
+        np.testing.assert_allclose(out.values, expected.values, rtol=1e-6)
+
+    def test_memmap(self, tmp_path):
+        """The snapshots are written to a .npy file the results view."""
+        path = tmp_path / "snapshots.npy"
+        out = heat_btcs(_make_simulation(memmap_path=path, times_to_save=[0, 2]))
+        np.testing.assert_array_equal(np.load(path), out.values.T)
+        base = out.values
+        while not isinstance(base, np.memmap) and base.base is not None:
+            base = base.base
+        assert isinstance(base, np.memmap)
+
+    def test_memmap_new_file(self, tmp_path):
+        """Running again writes a new file, leaving earlier results alone."""
+        path = tmp_path / "snapshots.npy"
+        sim = _make_simulation(memmap_path=path, times_to_save=[0, 2])
+        first = heat_btcs(sim)
+        expected = first.values.copy()
+        second = heat_btcs(sim, thermal_conductivity=0.5)
+        assert sim.snapshot_path_ == tmp_path / "snapshots_1.npy"
+        np.testing.assert_array_equal(first.values, expected)
+        np.testing.assert_array_equal(np.load(path), expected.T)
+        np.testing.assert_array_equal(np.load(sim.snapshot_path_), second.values.T)
+        assert not np.allclose(first.values, second.values)
+
+    def test_results_reset(self):
+        """Getting the results clears them for the next run."""
+        sim = _make_simulation()
+        first = heat_btcs(sim)
+        assert sim.results_.shape == (21, 0)
+        np.testing.assert_array_equal(heat_btcs(sim).values, first.values)
+
+
+class TestRunEnsemble:
+    """Tests for running many simulations together."""
+
+    solvers = {
+        "ftcs": heat_ftcs,
+        "btcs": heat_btcs,
+        "crank_nicolson": heat_crank_nicolson,
+    }
+    parameters = [
+        {"thermal_conductivity": 0.5},
+        {"thermal_conductivity": np.linspace(0.5, 1.0, 21), "density": 2.0},
+        {},
+    ]
+
+    @pytest.mark.parametrize("solver", list(solvers))
+    def test_matches_single(self, solver):
+        """Each member gets what running it alone does."""
+        sims = [_make_simulation(bc_func=zero_ends) for _ in self.parameters]
+        out = run_ensemble(sims, solver=solver, parameters=self.parameters)
+        assert list(out.index.names) == ["member", "x"]
+        for num, params in enumerate(self.parameters):
+            sim = _make_simulation(bc_func=zero_ends)
+            expected = self.solvers[solver](sim, **params)
+            np.testing.assert_allclose(out.loc[num].values, expected.values)
+
+    def test_memmap(self, tmp_path):
+        """Members with a memmap path write their own files."""
+        path = tmp_path / "snapshots.npy"
+        sim = _make_simulation(bc_func=zero_ends, memmap_path=path)
+        out = run_ensemble([sim] * 3, solver="btcs", parameters=self.parameters)
+        sims = [_make_simulation(bc_func=zero_ends) for _ in self.parameters]
+        expected = run_ensemble(sims, solver="btcs", parameters=self.parameters)
+        np.testing.assert_allclose(out.values, expected.values)
+        assert not path.exists()
+        for num in range(3):
+            member = np.load(tmp_path / f"snapshots_member{num}.npy")
+            np.testing.assert_allclose(member, expected.loc[num].values.T)
+
+    @pytest.mark.parametrize("max_workers", [1, 2])
+    def test_groups(self, max_workers):
+        """Members with other grids or saved times are run separately."""
+        sims = [
+            _make_simulation(times_to_save=[0, DT * 4]),
+            _make_simulation(points=11, times_to_save=[0, DT * 2]),
+            _make_simulation(times_to_save=[0, DT * 4]),
+        ]
+        out = run_ensemble(sims, solver="btcs", max_workers=max_workers)
+        np.testing.assert_allclose(out.columns, [0, DT * 2, DT * 4])
+        assert out.loc[1].shape == (11, 3)
+        assert out.loc[1].iloc[:, 2].isna().all()
+        expected = heat_btcs(_make_simulation(points=11, times_to_save=[DT * 2]))
+        np.testing.assert_allclose(out.loc[1].iloc[:, 1], expected.iloc[:, 0])
+
+    def test_labels(self):
+        """Tuple labels give one index level per item."""
+        sim = _make_simulation(times_to_save=[DT * 10])
+        labels = [(0.5, "a"), (1.0, "b")]
+        params = [{"thermal_conductivity": x} for x, _ in labels]
+        out = run_ensemble(
+            [sim, sim], parameters=params, labels=labels, names=("k", "name")
+        )
+        assert list(out.index.names) == ["k", "name", "x"]
+        assert out.loc[(1.0, "b")].iloc[10, 0] < out.loc[(0.5, "a")].iloc[10, 0]
+        # the same simulation can be used for several members
+        assert sim.results_.shape == (21, 0)
+
+    def test_bad_solver(self):
+        """Unknown solvers raise."""
+        with pytest.raises(ValueError, match="solver"):
+            run_ensemble([_make_simulation()], solver="leapfrog")
+
+    def test_bad_lengths(self):
+        """The parameters must match the simulations."""
+        with pytest.raises(ValueError, match="same length"):
+            run_ensemble([_make_simulation()], parameters=[{}, {}])
+
+
+class TestHeatFastForward:
+    """Tests for jumping to the saved times with the sine transform."""
+
+    @pytest.mark.parametrize(
+        "scheme, solver",
+        [("btcs", heat_btcs), ("crank_nicolson", heat_crank_nicolson)],
+    )
+    def test_matches_steps(self, scheme, solver):
+        """The implicit schemes match stepping through every time."""
+        times = [0, DT * 3, DT * 400]
+        out = heat_fast_forward(
+            _make_simulation(steps=401, times_to_save=times), scheme=scheme
+        )
+        expected = solver(_make_simulation(steps=401, times_to_save=times))
+        np.testing.assert_allclose(out.values, expected.values, atol=1e-12)
+        np.testing.assert_allclose(out.columns, expected.columns)
+
+    def test_ftcs(self):
+        """The ftcs ends are held while the interior evolves."""
+
+        def ramp(x):
+            return x / x.max() + gaussian(x)
+
+        sims = [_make_simulation(initial_func=ramp) for _ in range(2)]
+        out = heat_fast_forward(sims[0], thermal_conductivity=0.8, scheme="ftcs")
+        expected = heat_ftcs(sims[1], thermal_conductivity=0.8, use_numba=False)
+        np.testing.assert_allclose(out.values, expected.values, atol=1e-12)
+
+    def test_varying_conductivity(self):
+        """The conductivity must be constant."""
+        with pytest.raises(ValueError, match="constant"):
+            heat_fast_forward(
+                _make_simulation(), thermal_conductivity=np.linspace(1, 2, 21)
+            )
+
+    def test_bad_scheme(self):
+        """Unknown schemes raise."""
+        with pytest.raises(ValueError, match="scheme"):
+            heat_fast_forward(_make_simulation(), scheme="leapfrog")
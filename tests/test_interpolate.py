@@ -0,0 +1,166 @@
+"""
+Tests for interpolating mesh values to grids.
+"""
+import numpy as np
+import pytest
+from scipy.interpolate import griddata
+
+from fullwave import ElementInterpolator, MeshInterpolator, get_interpolator, mesh2grid
+from fullwave.interpolate import (
+    _INTERPOLATOR_CACHE,
+    INTERPOLATOR_CACHE_SIZE,
+    clear_interpolators,
+    get_gll_points,
+)
+
+
+@pytest.fixture()
+def points():
+    """Scattered mesh points covering a rectangle."""
+    rng = np.random.default_rng(0)
+    x = np.concatenate([rng.uniform(0, 4000, 2000), [0, 4000, 0, 4000]])
+    z = np.concatenate([rng.uniform(0, 2000, 2000), [0, 0, 2000, 2000]])
+    return x, z
+
+
+def _get_element_coordinates(nx, nz, ngll=5, xmax=4000.0, zmax=2000.0):
+    """Get the GLL points of a regular mesh in specfem's element order."""
+    gll = (get_gll_points(ngll) + 1) / 2
+    x_el = (np.arange(nx)[:, None] + gll[None, :]) * (xmax / nx)
+    z_el = (np.arange(nz)[:, None] + gll[None, :]) * (zmax / nz)
+    # index (element z, element x, gll z, gll x)
+    x = np.broadcast_to(x_el[None, :, None, :], (nz, nx, ngll, ngll))
+    z = np.broadcast_to(z_el[:, None, :, None], (nz, nx, ngll, ngll))
+    return x.ravel(), z.ravel()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start each test with an empty interpolator cache."""
+    clear_interpolators()
+    yield
+    clear_interpolators()
+
+
+class TestMeshInterpolator:
+    """Tests for the cached linear interpolation."""
+
+    def test_linear_field(self, points):
+        """A linear field is interpolated exactly."""
+        x, z = points
+        interp = MeshInterpolator(x, z, nx=40, nz=20)
+        out = interp(2 * x - 3 * z + 1)
+        X, Z = np.meshgrid(interp.x, interp.z)
+        assert out.shape == (20, 40)
+        np.testing.assert_allclose(out, 2 * X - 3 * Z + 1, rtol=1e-9, atol=1e-6)
+
+    def test_matches_griddata(self, points):
+        """The weights give what scipy's griddata does."""
+        x, z = points
+        values = np.sin(x / 500) * np.cos(z / 300)
+        interp = MeshInterpolator(x, z, nx=30, nz=15)
+        X, Z = np.meshgrid(interp.x, interp.z)
+        expected = griddata((x, z), values, (X, Z), method="linear")
+        inside = ~np.isnan(expected)
+        np.testing.assert_allclose(interp(values)[inside], expected[inside])
+
+    def test_several_fields(self, points):
+        """Several fields are interpolated at once."""
+        x, z = points
+        interp = MeshInterpolator(x, z, nx=10, nz=5)
+        out = interp(np.column_stack([x, z]))
+        assert out.shape == (5, 10, 2)
+        np.testing.assert_allclose(out[..., 0], interp(x))
+
+    def test_wrong_size(self, points):
+        """Values must have one value per mesh point."""
+        x, z = points
+        with pytest.raises(ValueError, match="points"):
+            MeshInterpolator(x, z)(x[:-1])
+
+    def test_default_shape(self, points):
+        """The grid has about as many points as the mesh."""
+        x, z = points
+        nz, nx = MeshInterpolator(x, z).shape
+        assert nx == pytest.approx(2 * nz, abs=1)
+        assert nx * nz == pytest.approx(len(x), rel=0.05)
+
+
+class TestGetInterpolator:
+    """Tests for reusing interpolators."""
+
+    def test_reused(self, points):
+        """The same coordinates give the same interpolator."""
+        x, z = points
+        first = get_interpolator(x, z)
+        assert get_interpolator(x.copy(), z.copy()) is first
+        assert get_interpolator(x, z, nx=10, nz=10) is not first
+
+    def test_lru(self, points):
+        """The cache only keeps the most recently used interpolators."""
+        x, z = points
+        first = get_interpolator(x, z, nx=5, nz=5)
+        for num in range(INTERPOLATOR_CACHE_SIZE):
+            get_interpolator(x, z, nx=6 + num, nz=5)
+        assert len(_INTERPOLATOR_CACHE) == INTERPOLATOR_CACHE_SIZE
+        assert get_interpolator(x, z, nx=5, nz=5) is not first
+
+    def test_mesh2grid(self, points):
+        """mesh2grid uses the cached interpolator."""
+        x, z = points
+        out = mesh2grid(x, x, z)
+        np.testing.assert_allclose(out, get_interpolator(x, z)(x))
+        assert len(_INTERPOLATOR_CACHE) == 1
+
+
+class TestElementInterpolator:
+    """Tests for interpolating with the elements' GLL basis."""
+
+    @pytest.fixture()
+    def elements(self):
+        """The GLL points of a 6 x 3 element mesh."""
+        return _get_element_coordinates(6, 3)
+
+    def test_polynomial_field(self, elements):
+        """Polynomials of the basis' degree are interpolated exactly."""
+        x, z = (v / 1000 for v in elements)
+        interp = ElementInterpolator(x, z, nx=37, nz=19)
+        X, Z = np.meshgrid(interp.x, interp.z)
+        out = interp(x**4 - 2 * x * z**3 + z**2)
+        np.testing.assert_allclose(out, X**4 - 2 * X * Z**3 + Z**2, atol=1e-8)
+
+    def test_not_smeared(self, elements):
+        """A field which is constant in each element stays so on the grid."""
+        x, z = elements
+        element = np.repeat(np.arange(18), 25).astype(float)
+        interp = ElementInterpolator(x, z, nx=60, nz=30)
+        out = interp(element)
+        np.testing.assert_allclose(out, np.round(out), atol=1e-9)
+        assert len(np.unique(np.round(out))) == 18
+
+    def test_deformed_elements(self, elements):
+        """The isoparametric mapping handles curved elements."""
+        x, z = elements
+        z = z + 100 * np.sin(x / 1000)
+        interp = ElementInterpolator(x, z, nx=40, nz=20)
+        X, Z = np.meshgrid(interp.x, interp.z)
+        out = interp(3 * x + z)
+        # points in the mesh are exact (linear fields are in the basis)
+        mesh_top = 2000 + 100 * np.sin(X / 1000)
+        mesh_bottom = 100 * np.sin(X / 1000)
+        inside = (Z < mesh_top) & (Z > mesh_bottom)
+        np.testing.assert_allclose(out[inside], (3 * X + Z)[inside], rtol=1e-6)
+
+    def test_bad_size(self, elements):
+        """The points must split into whole elements."""
+        x, z = elements
+        with pytest.raises(ValueError, match="elements"):
+            ElementInterpolator(x[:-1], z[:-1])
+
+    def test_get_interpolator(self, elements):
+        """The gll method builds (and caches) an ElementInterpolator."""
+        x, z = elements
+        out = get_interpolator(x, z, method="gll")
+        assert isinstance(out, ElementInterpolator)
+        assert get_interpolator(x, z, method="gll") is out
+        assert not isinstance(get_interpolator(x, z), ElementInterpolator)
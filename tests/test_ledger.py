@@ -0,0 +1,153 @@
+"""
+Tests for recording the runs of the specfem binaries.
+"""
+import dataclasses
+import json
+import math
+from subprocess import CalledProcessError
+
+import pytest
+
+from fullwave import RunLedger, RunRecord, parse_solver_log, run_bin
+from fullwave.ledger import LEDGER_ENV_VAR, get_ledger, parse_log_line
+
+SOLVER_LOG = """\
+ Total number of time steps =         1600
+ Time step number      100   t =    0.1000 s out of   1600
+ Max norm of vector field in solid (elastic) =    1.5E-03
+ Elapsed time in seconds =    2.5000000000000000
+ Time step number      200   t =    0.2000 s out of   1600
+ Max norm of vector field in solid (elastic) =    2.25D-03
+ Elapsed time in seconds =    5.0000000000000000
+ Mean elapsed time per time step in seconds =    2.5000000000000001E-002
+"""
+
+
+def _make_record(name="xspecfem2D", **kwargs):
+    """Make a record with default timings."""
+    kwargs = {"cwd": "run", "started": "now", "wall_time": 1.0, **kwargs}
+    return RunRecord(name=name, **kwargs)
+
+
+@pytest.fixture()
+def ledger(tmp_path):
+    """A ledger with a few records."""
+    out = RunLedger(tmp_path / "runs" / "ledger.jsonl")
+    out.append(_make_record("xmeshfem2D", returncode=0, output_bytes=10))
+    out.append(
+        _make_record(returncode=0, user_time=1.0, system_time=0.5, time_per_step=0.1)
+    )
+    out.append(
+        _make_record(
+            returncode=1, wall_time=2.0, time_per_step=0.3, aborted="NaN in log"
+        )
+    )
+    return out
+
+
+class TestParseSolverLog:
+    """Tests for reading the solver's log."""
+
+    def test_last_values(self, tmp_path):
+        """The last value of each quantity is kept."""
+        path = tmp_path / "solver_log.txt"
+        path.write_text(SOLVER_LOG)
+        out = parse_solver_log(path)
+        assert out["step"] == (200, 1600)
+        assert out["total_steps"] == 1600
+        assert out["max_norm"] == pytest.approx(2.25e-3)
+        assert out["elapsed_time"] == pytest.approx(5.0)
+        assert out["mean_time_per_step"] == pytest.approx(0.025)
+
+    def test_coupled(self, tmp_path):
+        """The largest norm of the last step is kept, NaN if any is NaN."""
+        path = tmp_path / "solver_log.txt"
+        fluid = " Max absolute value of scalar field in fluid (acoustic) =    {}\n"
+        path.write_text(SOLVER_LOG + fluid.format("1.0E-03"))
+        assert parse_solver_log(path)["max_norm"] == pytest.approx(2.25e-3)
+        path.write_text(SOLVER_LOG + fluid.format("NaN") + fluid.format("1.0"))
+        assert math.isnan(parse_solver_log(path)["max_norm"])
+
+    def test_nan(self):
+        """A NaN norm is parsed so a diverged run can be spotted."""
+        name, value = parse_log_line(" Max norm of pressure field = NaN")
+        assert name == "max_norm"
+        assert value != value
+
+    def test_missing(self, tmp_path):
+        """A missing log gives no values."""
+        assert parse_solver_log(tmp_path / "mesher_log.txt") == {}
+
+
+class TestRunLedger:
+    """Tests for storing and summarizing run records."""
+
+    def test_round_trip(self, ledger):
+        """Records are read back as they were appended."""
+        records = ledger.records()
+        assert len(ledger) == 3
+        assert records[1] == _make_record(
+            returncode=0, user_time=1.0, system_time=0.5, time_per_step=0.1
+        )
+        assert records[1].cpu_time == pytest.approx(1.5)
+        assert records[0].cpu_time is None
+
+    def test_query(self, ledger):
+        """Records can be selected by attribute and predicate."""
+        assert len(ledger.query(name="xspecfem2D")) == 2
+        out = ledger.query(predicate=lambda x: x.failed, name="xspecfem2D")
+        assert [x.returncode for x in out] == [1]
+
+    def test_summary(self, ledger):
+        """Runs are totaled by binary."""
+        out = ledger.summary()
+        solver = out["xspecfem2D"]
+        assert (solver["runs"], solver["failures"], solver["aborted"]) == (2, 1, 1)
+        assert solver["wall_time"] == pytest.approx(3.0)
+        assert solver["cpu_time"] == pytest.approx(1.5)
+        assert solver["time_per_step"] == pytest.approx(0.2)
+        assert out["xmeshfem2D"]["output_bytes"] == 10
+        assert out["xmeshfem2D"]["time_per_step"] is None
+
+    def test_unknown_fields(self, ledger):
+        """Fields RunRecord no longer has are skipped when reading."""
+        row = dataclasses.asdict(_make_record())
+        with open(ledger.path, "a") as f:
+            f.write(json.dumps({**row, "max_rss": 1024}) + "\n")
+        assert ledger.records()[-1] == _make_record()
+
+    def test_get_ledger(self, ledger, monkeypatch):
+        """The ledger can be a path or come from the environment."""
+        assert get_ledger(ledger) is ledger
+        assert get_ledger(str(ledger.path)).path == ledger.path
+        monkeypatch.delenv(LEDGER_ENV_VAR, raising=False)
+        assert get_ledger() is None
+        monkeypatch.setenv(LEDGER_ENV_VAR, str(ledger.path))
+        assert len(get_ledger()) == 3
+
+
+class TestRunRecords:
+    """Tests for the records run_bin makes."""
+
+    def test_record(self, run_path, bin_path, tmp_path):
+        """The run's resources and log values are recorded."""
+        ledger = RunLedger(tmp_path / "ledger.jsonl")
+        run_bin(run_path, "xmeshfem2D", bin_path, ledger=ledger)
+        out = run_bin(run_path, "xspecfem2D", bin_path, ledger=ledger)
+        record = out.record
+        assert ledger.records()[-1] == record
+        assert record.returncode == 0 and not record.failed
+        assert record.wall_time > 0
+        assert record.cpu_time is not None
+        assert record.n_steps == 100
+        assert record.time_per_step == pytest.approx(1e-3)
+        written = run_path / "OUTPUT_FILES"
+        sizes = [x.stat().st_size for x in written.iterdir()]
+        assert 0 < record.output_bytes <= sum(sizes)
+
+    def test_failure_recorded(self, run_path, bin_path, tmp_path):
+        """Failed runs are recorded before raising."""
+        ledger = RunLedger(tmp_path / "ledger.jsonl")
+        with pytest.raises(CalledProcessError):
+            run_bin(run_path, "xspecfem2D", bin_path, ledger=ledger)
+        assert [x.returncode for x in ledger.records()] == [1]
@@ -0,0 +1,107 @@
+"""
+Tests for misfit functions and adjoint sources.
+"""
+import numpy as np
+import obspy
+import pytest
+
+from fullwave import WaveformMisfit, waveform_misfit
+
+
+def _make_stream(seed, n_stations=4, npts=500, delta=0.01):
+    rng = np.random.default_rng(seed)
+    traces = []
+    for num in range(n_stations):
+        headers = dict(network="AA", station=f"S{num:04d}", channel="BXY", delta=delta)
+        traces.append(obspy.Trace(rng.normal(size=npts).cumsum(), headers))
+    return obspy.Stream(traces)
+
+
+@pytest.fixture()
+def observed():
+    """Observed data of a few stations."""
+    return _make_stream(0)
+
+
+@pytest.fixture()
+def synthetic():
+    """Synthetics at the same stations."""
+    return _make_stream(1)
+
+
+def _obspy_process(tr, misfit):
+    """Process a trace with obspy as WaveformMisfit should."""
+    tr = tr.copy()
+    tr.data = tr.data.astype(np.float64)
+    tr.detrend("simple")
+    tr.taper(misfit.taper)
+    tr.filter(
+        "bandpass",
+        freqmin=misfit.freqmin,
+        freqmax=misfit.freqmax,
+        corners=misfit.corners,
+        zerophase=misfit.zerophase,
+    )
+    return tr.data
+
+
+class TestWaveformMisfit:
+    """Tests for the batched misfit."""
+
+    @pytest.fixture(params=[False, True])
+    def misfit(self, request):
+        """A misfit with a bandpass filter."""
+        return WaveformMisfit(freqmin=1.0, freqmax=10.0, zerophase=request.param)
+
+    def test_process_matches_obspy(self, misfit, observed):
+        """The batched processing matches obspy trace by trace."""
+        data = np.stack([tr.data for tr in observed])
+        out = misfit.process(data, observed[0].stats.delta)
+        for tr, row in zip(observed, out):
+            np.testing.assert_allclose(row, _obspy_process(tr, misfit), atol=1e-10)
+
+    def test_misfit(self, misfit, observed, synthetic):
+        """The misfit is half the integral of the processed residuals."""
+        total, adjoint = misfit(observed, synthetic)
+        expected = 0.0
+        for obsd, synt in zip(observed, synthetic):
+            residual = _obspy_process(synt, misfit) - _obspy_process(obsd, misfit)
+            expected += 0.5 * np.sum(residual**2) * obsd.stats.delta
+        assert total == pytest.approx(expected)
+        assert [tr.id for tr in adjoint] == [tr.id for tr in synthetic]
+
+    def test_detrend_only(self, observed, synthetic):
+        """Without a taper or filter only the linear trend is removed."""
+        _, adjoint = WaveformMisfit(taper=None)(observed, synthetic)
+        data = synthetic[0].data - observed[0].data
+        expected = data - np.linspace(data[0], data[-1], len(data))
+        np.testing.assert_allclose(adjoint[0].data, expected, atol=1e-12)
+
+    def test_no_matching_traces(self, observed, synthetic):
+        """A clear error is raised if no traces have the same id."""
+        for tr in synthetic:
+            tr.stats.network = "BB"
+        with pytest.raises(ValueError, match="No traces"):
+            WaveformMisfit()(observed, synthetic)
+
+    def test_freqs_together(self):
+        """freqmin and freqmax must both be given."""
+        with pytest.raises(ValueError):
+            WaveformMisfit(freqmin=1.0)
+
+
+class TestWaveformMisfitFunction:
+    """Tests for the simple waveform misfit."""
+
+    def test_misfit(self, observed, synthetic):
+        """The adjoint sources are the residuals."""
+        total, adjoint = waveform_misfit(observed, synthetic)
+        residuals = [s.data - o.data for o, s in zip(observed, synthetic)]
+        expected = sum(0.5 * np.sum(x**2) * 0.01 for x in residuals)
+        assert total == pytest.approx(expected)
+        np.testing.assert_allclose(adjoint[0].data, residuals[0])
+
+    def test_zero(self, observed):
+        """The misfit of data with itself is zero."""
+        total, _ = waveform_misfit(observed, observed.copy())
+        assert total == 0
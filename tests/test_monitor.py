@@ -0,0 +1,179 @@
+"""
+Tests for stopping diverging solver runs.
+"""
+import math
+import time
+from pathlib import Path
+
+import pytest
+
+from fullwave import RunLedger, SolverDivergedError, SolverMonitor, run_bin
+
+# A solver printing its progress every 0.1 s for nblock blocks of 100 steps,
+# with the given norms (the last one is repeated).
+FAKE_SOLVER = """#!/bin/sh
+set -- {norms}
+i=1
+while [ $i -le {nblock} ]; do
+  echo " Time step number     $((i*100))   t =    0.3990 s out of    {nblock}00"
+  echo " Max norm of vector field in solid (elastic) =    $1"
+  echo " Elapsed time in seconds =    $i.0"
+  echo " Estimated remaining time in seconds =    $(({nblock}-i)).0"
+  [ $# -gt 1 ] && shift
+  sleep 0.1
+  i=$((i+1))
+done
+"""
+
+
+# An MPI launcher which keeps running while its rank does.
+FAKE_LAUNCHER = """#!/bin/sh
+shift 2
+"$@" &
+echo $! > rank.pid
+wait
+"""
+
+
+def _is_running(pid, timeout=2.0):
+    """Return True if pid is still running (not a zombie) after timeout."""
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            state = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        except FileNotFoundError:
+            return False
+        if state[0] in "ZX":
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def _make_solver(path, norms, nblock=50):
+    """Write a fake solver which prints the norms, return its directory."""
+    path.mkdir()
+    exe = path / "xspecfem2D"
+    exe.write_text(FAKE_SOLVER.format(norms=" ".join(norms), nblock=nblock))
+    exe.chmod(0o755)
+    return path
+
+
+class TestFeed:
+    """Tests for parsing the solver's progress."""
+
+    @pytest.fixture()
+    def monitor(self):
+        """A monitor which keeps the lines it is called back for."""
+        calls = []
+        out = SolverMonitor(max_norm=1e10, callback=lambda x: calls.append(x.status()))
+        out.calls = calls
+        return out
+
+    def test_status(self, monitor):
+        """The progress is parsed and reported once per block."""
+        assert monitor.status() == "waiting for the first time step"
+        monitor.feed(" Time step number      200   t =    0.1000 s out of   1000")
+        monitor.feed(" Max norm of vector field in solid (elastic) =    1.5E-03")
+        assert monitor.calls == []
+        monitor.feed(" Estimated remaining time in seconds =    40.0")
+        assert monitor.eta == 40.0
+        assert monitor.calls == ["step 200 of 1000, max norm 1.500e-03, 40 s remaining"]
+
+    def test_eta_extrapolated(self, monitor):
+        """Without the solver's estimate the elapsed time is extrapolated."""
+        assert monitor.eta is None
+        monitor.feed(" Time step number      250   t =    0.1000 s out of   1000")
+        monitor.feed(" Elapsed time in seconds =    5.0")
+        assert monitor.eta == pytest.approx(15.0)
+        # times of an earlier step aren't used for the next one
+        monitor.feed(" Estimated remaining time in seconds =    15.0")
+        monitor.feed(" Time step number      500   t =    0.2000 s out of   1000")
+        assert "remaining_time" not in monitor.state
+
+    @pytest.mark.parametrize("norm", ["NaN", "Infinity", "2.0E+10"])
+    def test_diverged(self, monitor, norm):
+        """NaN, infinite, and too large norms give a reason to stop."""
+        line = f" Max norm of vector field in solid (elastic) =    {norm}"
+        assert "norm of the wavefield" in monitor.feed(line)
+
+    def test_acoustic(self, monitor):
+        """The norm of acoustic runs is checked."""
+        line = " Max absolute value of scalar field in fluid (acoustic) =    NaN"
+        assert "norm of the wavefield" in monitor.feed(line)
+
+    def test_coupled(self, monitor):
+        """The largest of the solid and fluid norms of a step is kept."""
+        monitor.feed(" Time step number      200   t =    0.1000 s out of   1000")
+        monitor.feed(" Max norm of vector field in solid (elastic) =    2.0E-03")
+        line = " Max absolute value of scalar field in fluid (acoustic) =    1.0E-03"
+        assert monitor.feed(line) is None
+        assert monitor.state["max_norm"] == pytest.approx(2e-3)
+        monitor.feed(" Time step number      300   t =    0.1500 s out of   1000")
+        assert "max_norm" not in monitor.state
+        monitor.feed(line)
+        assert monitor.state["max_norm"] == pytest.approx(1e-3)
+
+    def test_no_max_norm(self):
+        """Without max_norm only NaN and infinite norms abort."""
+        monitor = SolverMonitor()
+        assert monitor.check(1e30) is None
+        assert monitor.check(math.nan) is not None
+
+
+class TestMonitoredRun:
+    """Tests for following a running solver."""
+
+    def test_nan_killed(self, tmp_path):
+        """A NaN norm stops the run, which is recorded as aborted."""
+        bin_path = _make_solver(tmp_path / "bin", ["1.0E-03", "NaN"])
+        ledger = RunLedger(tmp_path / "ledger.jsonl")
+        monitor = SolverMonitor(interval=0.05)
+        start = time.perf_counter()
+        with pytest.raises(SolverDivergedError) as error:
+            run_bin(tmp_path, "xspecfem2D", bin_path, ledger=ledger, monitor=monitor)
+        assert time.perf_counter() - start < 3
+        assert error.value.returncode == -9
+        assert "nan" in str(error.value)
+        assert monitor.aborted
+        assert monitor.state["step"] == (200, 5000)
+        record = ledger.records()[0]
+        assert record.aborted == monitor.reason and record.failed
+
+    def test_ranks_killed(self, tmp_path):
+        """The processes started by an MPI launcher are stopped too."""
+        bin_path = _make_solver(tmp_path / "bin", ["NaN"])
+        launcher = bin_path / "mpirun"
+        launcher.write_text(FAKE_LAUNCHER)
+        launcher.chmod(0o755)
+        monitor = SolverMonitor(interval=0.05)
+        with pytest.raises(SolverDivergedError):
+            run_bin(
+                tmp_path,
+                "xspecfem2D",
+                bin_path,
+                monitor=monitor,
+                nproc=2,
+                launcher=f"{launcher} -np {{nproc}}",
+            )
+        rank = int((tmp_path / "rank.pid").read_text())
+        assert not _is_running(rank)
+
+    def test_max_norm(self, tmp_path):
+        """A norm above max_norm stops the run; without check it returns."""
+        bin_path = _make_solver(tmp_path / "bin", ["1.0E+05", "1.0E+12"])
+        monitor = SolverMonitor(max_norm=1e10, interval=0.05)
+        out = run_bin(tmp_path, "xspecfem2D", bin_path, check=False, monitor=monitor)
+        assert out.returncode == -9
+        assert "exceeds" in out.record.aborted
+        assert "aborted" in monitor.status()
+
+    def test_healthy(self, tmp_path):
+        """A stable run finishes with every block reported."""
+        bin_path = _make_solver(tmp_path / "bin", ["1.0E-03"], nblock=3)
+        calls = []
+        monitor = SolverMonitor(max_norm=1e10, interval=0.05, callback=calls.append)
+        out = run_bin(tmp_path, "xspecfem2D", bin_path, monitor=monitor)
+        assert out.returncode == 0 and out.record.aborted is None
+        assert not monitor.aborted
+        assert len(calls) == 3
+        assert monitor.status() == "step 300 of 300, max norm 1.000e-03, 0 s remaining"
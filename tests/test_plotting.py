@@ -0,0 +1,66 @@
+"""
+Tests for rendering figures.
+"""
+import numpy as np
+import pytest
+from matplotlib.colors import to_hex
+
+from fullwave import BatchRenderer, get_continuous_cmap, render_fields
+from fullwave.plotting import HEX_COLORS
+
+
+@pytest.fixture()
+def mesh():
+    """The coordinates of a small mesh."""
+    x, z = np.meshgrid(np.linspace(0, 4000, 20), np.linspace(0, 2000, 10))
+    return x.ravel(), z.ravel()
+
+
+class TestGetContinuousCmap:
+    """Tests for making colormaps."""
+
+    def test_default(self):
+        """The default colormap runs through the plotbin colors."""
+        cmap = get_continuous_cmap()
+        assert to_hex(cmap(0.0)) == HEX_COLORS[0]
+        assert to_hex(cmap(1.0)) == HEX_COLORS[-1]
+
+    def test_lists(self):
+        """Lists can be used as they could in FunctionsPlotBin."""
+        colors = ["#000000", "#ffffff", "#ff0000"]
+        cmap = get_continuous_cmap(colors, [0.0, 0.8, 1.0])
+        assert to_hex(cmap(0.8)) == "#ffffff"
+        assert to_hex(cmap(1.0)) == "#ff0000"
+
+    def test_cached(self):
+        """The same colors give the same colormap."""
+        colors = ["#000000", "#ffffff"]
+        assert get_continuous_cmap(colors) is get_continuous_cmap(tuple(colors))
+        assert get_continuous_cmap(colors) is not get_continuous_cmap()
+
+
+class TestBatchRenderer:
+    """Tests for rendering many fields on the same mesh."""
+
+    @pytest.mark.parametrize("max_workers", [1, 2])
+    def test_render(self, mesh, tmp_path, max_workers):
+        """One PNG is written per frame, in the order of the frames."""
+        x, z = mesh
+        frames = [(x * num, tmp_path / f"{num}.png", "x") for num in range(1, 4)]
+        renderer = BatchRenderer(x, z, dpi=50, max_workers=max_workers)
+        out = renderer.render(frames)
+        assert out == [x[1] for x in frames]
+        for path in out:
+            assert path.read_bytes().startswith(b"\x89PNG")
+
+    def test_constant_field(self, mesh, tmp_path):
+        """A constant field doesn't give an empty colorbar range."""
+        x, z = mesh
+        out = BatchRenderer(x, z, dpi=50).render([(x * 0, tmp_path / "a.png", "")])
+        assert out[0].exists()
+
+    def test_render_fields(self, mesh, tmp_path):
+        """A dict of fields is written to name.png."""
+        x, z = mesh
+        out = render_fields(x, z, {"vs": x, "vp": z}, tmp_path / "figs", dpi=50)
+        assert [x.name for x in out] == ["vs.png", "vp.png"]
@@ -0,0 +1,230 @@
+"""
+Tests for running the simulations of many events.
+"""
+import threading
+import time
+
+import numpy as np
+import obspy
+import pytest
+
+import fullwave.scheduler
+from fullwave import (
+    Event,
+    EventScheduler,
+    ParFile,
+    RunLedger,
+    SolverDivergedError,
+)
+from fullwave.core import MPI_LAUNCHER_ENV_VAR
+from fullwave.scheduler import CoreBudget, sum_kernels
+
+
+@pytest.fixture()
+def observed():
+    """Observed data at the station the fake mesher writes."""
+    headers = dict(network="AA", station="S0001", channel="BXY", delta=0.1)
+    return obspy.Stream([obspy.Trace(np.zeros(3), headers)])
+
+
+@pytest.fixture()
+def events(observed):
+    """Three events with different source positions."""
+    return [Event(f"event_{num}", {"xs": 1000.0 * num}, observed) for num in range(3)]
+
+
+@pytest.fixture()
+def scheduler(tmp_path, data_path, bin_path):
+    """A scheduler with two cores using the fake binaries."""
+    return EventScheduler(data_path, tmp_path / "events", cores=2, bin_path=bin_path)
+
+
+class _Tracker:
+    """Wrap compute_gradient to count calls and the cores in use."""
+
+    def __init__(self, func, nproc=1, fail=None):
+        # fail has the errors to raise, in order, for each workspace name
+        self.func, self.nproc, self.fail = func, nproc, dict(fail or {})
+        self.calls, self.in_use, self.peak = [], 0, 0
+        self._lock = threading.Lock()
+
+    def __call__(self, workspace, *args, **kwargs):
+        with self._lock:
+            self.calls.append(workspace.path.name)
+            self.in_use += self.nproc
+            self.peak = max(self.peak, self.in_use)
+            errors = self.fail.get(workspace.path.name)
+            error = errors.pop(0) if errors else None
+        try:
+            time.sleep(0.1)
+            if error is not None:
+                raise error
+            return self.func(workspace, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.in_use -= self.nproc
+
+
+def _track(monkeypatch, **kwargs):
+    """Track the calls of compute_gradient by the scheduler."""
+    tracker = _Tracker(fullwave.scheduler.compute_gradient, **kwargs)
+    monkeypatch.setattr(fullwave.scheduler, "compute_gradient", tracker)
+    return tracker
+
+
+def _count_calls(monkeypatch, obj, name):
+    """Record the arguments of the calls of a method of obj."""
+    calls, method = [], getattr(obj, name)
+
+    def wrapper(*args):
+        calls.append(args)
+        return method(*args)
+
+    monkeypatch.setattr(obj, name, wrapper)
+    return calls
+
+
+class TestCoreBudget:
+    """Tests for sharing cores between runs."""
+
+    def test_never_exceeded(self):
+        """Runs wait until enough cores are free."""
+        budget = CoreBudget(5)
+        lock, in_use, peak = threading.Lock(), [0], [0]
+
+        def run(count):
+            budget.acquire(count)
+            with lock:
+                in_use[0] += count
+                peak[0] = max(peak[0], in_use[0])
+            time.sleep(0.02)
+            with lock:
+                in_use[0] -= count
+            budget.release(count)
+
+        threads = [threading.Thread(target=run, args=(x % 3 + 1,)) for x in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert 0 < peak[0] <= 5
+        assert budget.free == 5
+
+    def test_too_many(self):
+        """A run needing more cores than the budget raises."""
+        with pytest.raises(ValueError, match="budget"):
+            CoreBudget(2).acquire(3)
+
+
+class TestSumKernels:
+    """Tests for adding the kernels of several events."""
+
+    def test_sum(self):
+        """Kernels are summed and coordinates kept."""
+        first = {"x": np.arange(3.0), "beta": np.ones(3, dtype=np.float32)}
+        second = {"x": np.arange(3.0) + 10, "beta": np.full(3, 2.0)}
+        out = sum_kernels([first, second])
+        np.testing.assert_array_equal(out["x"], [0, 1, 2])
+        np.testing.assert_array_equal(out["beta"], [3, 3, 3])
+        assert out["beta"].dtype == np.float64
+
+    def test_different_meshes(self):
+        """Kernels of different sizes can't be summed."""
+        with pytest.raises(ValueError, match="same mesh"):
+            sum_kernels([{"beta": np.ones(3)}, {"beta": np.ones(4)}])
+
+    def test_empty(self):
+        """No kernels give an empty dict."""
+        assert sum_kernels([]) == {}
+
+
+class TestEventScheduler:
+    """Tests for computing the gradients of many events."""
+
+    def test_run(self, scheduler, events, tmp_path):
+        """Each event gets a workspace and the kernels are summed."""
+        source = tmp_path / "SOURCE"
+        source.write_text("custom source\n")
+        events[2].source = source
+        out = scheduler.run(events)
+        assert set(out.gradients) == {x.name for x in events} and not out.failed
+        assert out.misfit == pytest.approx(3 * 0.5 * 0.1)
+        np.testing.assert_allclose(out.kernels["beta"], [9, 18])
+        np.testing.assert_allclose(out.kernels["x"], [0, 1])
+        sources = [scheduler.path / x.name / "DATA" / "SOURCE" for x in events]
+        assert ParFile.read(sources[1])["xs"] == 1000.0
+        assert sources[2].read_text() == "custom source\n"
+
+    def test_budget(self, scheduler, events, monkeypatch):
+        """No more events run at once than the cores allow."""
+        tracker = _track(monkeypatch)
+        scheduler.run(events)
+        assert tracker.peak == 2
+        assert sorted(tracker.calls) == [x.name for x in events]
+
+    def test_nproc_budget(self, scheduler, events, launcher, monkeypatch):
+        """Events with NPROC=2 run one at a time on two cores through MPI."""
+        ParFile.read(scheduler.data / "Par_file").write(parameters={"NPROC": 2})
+        monkeypatch.setenv(MPI_LAUNCHER_ENV_VAR, launcher)
+        tracker = _track(monkeypatch, nproc=2)
+        out = scheduler.run(events)
+        assert tracker.peak == 2 and len(out.gradients) == 3
+        args = (scheduler.path / "event_0" / "launcher_args.txt").read_text()
+        # the forward and adjoint solver runs, not the (serial) mesher
+        assert [x.split()[:2] for x in args.splitlines()] == [["-np", "2"]] * 2
+
+    def test_nproc_too_large(self, scheduler, events, monkeypatch):
+        """Events needing more cores than the budget fail without running."""
+        ParFile.read(scheduler.data / "Par_file").write(parameters={"NPROC": 3})
+        tracker = _track(monkeypatch)
+        acquire = _count_calls(monkeypatch, scheduler.budget, "acquire")
+        out = scheduler.run(events[:1], raise_on_failure=False)
+        assert isinstance(out.failed["event_0"], ValueError)
+        assert tracker.calls == [] and acquire == []
+
+    def test_shared_data_unchanged(self, scheduler, events):
+        """Concurrent events writing their models leave DATA unchanged."""
+        (scheduler.data / "proc000000_x.bin").write_text("model")
+        par_file = ParFile.read(scheduler.data / "Par_file")
+        par_file.write(parameters={"SAVE_MODEL": "binary"})
+        out = scheduler.run(events)
+        assert len(out.gradients) == 3
+        assert (scheduler.data / "proc000000_x.bin").read_text() == "model"
+        for event in events:
+            path = scheduler.path / event.name / "DATA" / "proc000000_x.bin"
+            assert path.read_text() == "coordinates\n"
+
+    def test_retry(self, scheduler, events, monkeypatch, tmp_path):
+        """A failed event is run again."""
+        scheduler.ledger = RunLedger(tmp_path / "ledger.jsonl")
+        tracker = _track(monkeypatch, fail={"event_0": [OSError("node lost")]})
+        out = scheduler.run(events[:1])
+        assert tracker.calls == ["event_0", "event_0"]
+        assert out.misfit == pytest.approx(0.05)
+        assert len(scheduler.ledger.query(name="xspecfem2D")) == 2
+
+    def test_failure(self, scheduler, events, monkeypatch):
+        """Events failing every attempt are reported after the others ran."""
+        errors = [OSError("first"), OSError("second")]
+        tracker = _track(monkeypatch, fail={"event_0": errors})
+        with pytest.raises(RuntimeError, match="1 events failed: event_0"):
+            scheduler.run(events[:2])
+        assert sorted(tracker.calls) == ["event_0", "event_0", "event_1"]
+        # the next run of the scheduler succeeds
+        out = scheduler.run(events[:2], raise_on_failure=False)
+        assert list(out.gradients) == ["event_0", "event_1"] and not out.failed
+
+    def test_diverged_not_retried(self, scheduler, events, monkeypatch):
+        """Events stopped by a monitor would diverge again so fail at once."""
+        error = SolverDivergedError(-9, ["xspecfem2D"], "the norm is nan")
+        tracker = _track(monkeypatch, fail={"event_0": [error]})
+        out = scheduler.run(events[:1], raise_on_failure=False)
+        assert out.failed["event_0"] is error
+        assert tracker.calls == ["event_0"]
+        assert out.kernels == {}
+
+    def test_unique_names(self, scheduler, observed):
+        """Events need their own workspaces."""
+        events = [Event("same", {}, observed), Event("same", {}, observed)]
+        with pytest.raises(ValueError, match="unique"):
+            scheduler.run(events)
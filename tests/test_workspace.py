@@ -0,0 +1,105 @@
+"""
+Tests for workspaces.
+"""
+import os
+
+import pytest
+
+from fullwave import Workspace
+
+
+@pytest.fixture()
+def data_path_with_model(data_path):
+    """The example DATA with a read-only input and a model file added."""
+    (data_path / "interfaces.dat").write_text("interfaces\n")
+    (data_path / "proc000000_x.bin").write_text("model\n")
+    return data_path
+
+
+@pytest.fixture()
+def workspace(tmp_path, data_path_with_model, bin_path):
+    """A workspace using the fake binaries."""
+    return Workspace.create(tmp_path / "ws", data_path_with_model, bin_path=bin_path)
+
+
+class TestCreate:
+    """Tests for creating workspaces."""
+
+    def test_layout(self, workspace, bin_path):
+        """The run directory has DATA, OUTPUT_FILES, SEM and bin."""
+        assert workspace.output_path.is_dir()
+        assert workspace.sem_path.is_dir()
+        assert workspace.bin_path.is_symlink()
+        assert workspace.bin_path.resolve() == bin_path.resolve()
+
+    def test_links(self, workspace, data_path_with_model):
+        """Read-only inputs are hardlinked, mutable ones are copied."""
+        new = os.stat(workspace.data_path / "interfaces.dat")
+        old = os.stat(data_path_with_model / "interfaces.dat")
+        assert new.st_ino == old.st_ino
+        for name in ("Par_file", "SOURCE", "STATIONS"):
+            new = os.stat(workspace.data_path / name)
+            assert new.st_ino != os.stat(data_path_with_model / name).st_ino
+
+    def test_edit_doesnt_change_source(self, workspace, data_path_with_model):
+        """Editing the Par_file of a workspace leaves the original alone."""
+        text = (data_path_with_model / "Par_file").read_text()
+        workspace.par_file.write(parameters={"NSTEP": 10})
+        assert workspace.par_file["NSTEP"] == 10
+        assert (data_path_with_model / "Par_file").read_text() == text
+
+    def test_exists(self, workspace, data_path_with_model):
+        """Existing workspaces are only reused if exist_ok."""
+        with pytest.raises(FileExistsError):
+            Workspace.create(workspace.path, data_path_with_model)
+        ws = Workspace.create(workspace.path, data_path_with_model, exist_ok=True)
+        assert ws.path == workspace.path
+
+    def test_clone(self, workspace, tmp_path, bin_path):
+        """A clone shares the inputs and binaries of the workspace."""
+        clone = workspace.clone(tmp_path / "clone")
+        assert clone.bin_path.resolve() == bin_path.resolve()
+        new = os.stat(clone.data_path / "interfaces.dat")
+        assert new.st_ino == os.stat(workspace.data_path / "interfaces.dat").st_ino
+
+
+class TestRun:
+    """Tests for running the binaries in a workspace."""
+
+    def test_mesh_and_specfem(self, workspace):
+        """The binaries run in the workspace."""
+        workspace.mesh()
+        workspace.specfem()
+        assert list(workspace.output_path.glob("*.semd"))
+
+    def test_link_forward(self, workspace, tmp_path):
+        """The saved forward wavefield is hardlinked into OUTPUT_FILES."""
+        source = tmp_path / "forward"
+        source.mkdir()
+        (source / "lastframe_elastic000000.bin").write_text("wavefield")
+        (source / "AA.S0001.BXY.semd").write_text("trace")
+        out = workspace.link_forward(source)
+        assert [x.name for x in out] == ["lastframe_elastic000000.bin"]
+        assert not (workspace.output_path / "AA.S0001.BXY.semd").exists()
+
+    def test_clear_outputs(self, workspace):
+        """Clearing the outputs leaves an empty OUTPUT_FILES."""
+        workspace.mesh()
+        workspace.clear_outputs()
+        assert workspace.output_path.is_dir()
+        assert not list(workspace.output_path.iterdir())
+
+    def test_model_unshared(self, workspace, data_path_with_model, tmp_path):
+        """Model files the solver writes don't change DATA or other workspaces."""
+        other = Workspace.create(tmp_path / "other", data_path_with_model)
+        model = workspace.data_path / "proc000000_x.bin"
+        assert os.stat(model).st_nlink == 3
+        workspace.par_file.write(parameters={"SAVE_MODEL": "binary"})
+        workspace.mesh()
+        workspace.specfem()
+        assert model.read_text() == "coordinates\n"
+        assert (data_path_with_model / model.name).read_text() == "model\n"
+        assert (other.data_path / model.name).read_text() == "model\n"
+        # the read-only inputs stay linked
+        assert os.stat(workspace.data_path / "interfaces.dat").st_nlink == 3
+        assert workspace.unshare_data() == []